@@ -0,0 +1,91 @@
+"""
+ASGI middleware: per-route request metrics and opt-in per-request profiling.
+
+Records request count, latency, response size and in-flight requests for every
+HTTP request (services/metrics.py, exposed on GET /metrics). Routes are labelled
+by their path template (e.g. /api/v1/ifrs17/periods/{period}/summary), so
+label cardinality stays bounded.
+
+A request with the header `X-Profile: 1` gets a `Server-Timing` header listing
+the data/engine stages that ran for it, plus `app` (the time until the response
+started) — readable in browser devtools or with curl -i. Stage timings are
+internal, so by default only admins get them (PROFILE_REQUESTS).
+"""
+import os
+import time
+
+from services import metrics
+
+PROFILE_HEADER = b"x-profile"
+# Who may profile with X-Profile: "admin" (Bearer token of an admin), "all" or "off"
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "admin").lower()
+
+
+async def _may_profile(headers: dict[bytes, bytes]) -> bool:
+    if headers.get(PROFILE_HEADER, b"").lower() not in (b"1", b"true", b"yes"):
+        return False
+    if PROFILE_REQUESTS == "all":
+        return True
+    if PROFILE_REQUESTS != "admin":
+        return False
+    from auth.dependencies import admin_user_id_from_header
+
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    return await admin_user_id_from_header(authorization) is not None
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "<unmatched>"
+
+
+def _server_timing(timings: list[tuple[str, float]], total: float) -> bytes:
+    parts = [f"{name.replace(' ', '_')};dur={seconds * 1000:.3f}" for name, seconds in timings]
+    parts.append(f"app;dur={total * 1000:.3f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope.get("method", "")
+        headers = dict(scope.get("headers") or [])
+        token = None
+        if await _may_profile(headers):
+            token = metrics.start_profile()
+        status = 500
+        size = 0
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if token is not None:
+                    timings = metrics.profile_timings() or []
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", _server_timing(timings, time.perf_counter() - start))
+                    ]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.HTTP_IN_FLIGHT.dec()
+            if token is not None:
+                metrics.end_profile(token)
+            route = _route(scope)
+            metrics.HTTP_REQUESTS.inc((method, route, str(status)))
+            metrics.HTTP_LATENCY.observe((method, route), elapsed)
+            metrics.HTTP_RESPONSE_SIZE.observe((method, route), size)
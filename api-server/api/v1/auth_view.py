@@ -4,22 +4,34 @@ from fastapi import APIRouter, HTTPException
 
 from presenters.auth_presenter import AuthPresenter
 from schemas.user_schema import LoginRequest, TokenResponse, UserCreate, UserResponse
-from services.user_service import user_service
+from services.passwords import PasswordHashingBusy
+from services.user_service import async_user_service
 
 router = APIRouter()
 presenter = AuthPresenter()
 
 
+def _busy() -> HTTPException:
+    """503 while the bcrypt pool queue is full (login burst)."""
+    return HTTPException(status_code=503, detail="Too many login requests; retry shortly", headers={"Retry-After": "1"})
+
+
 @router.post("/register", response_model=UserResponse, status_code=201)
-def register(data: UserCreate):
-    if user_service.get_by_email(data.email):
+async def register(data: UserCreate):
+    if await async_user_service.get_by_email(data.email):
         raise HTTPException(status_code=409, detail="Email already registered")
-    return presenter.register(data)
+    try:
+        return await presenter.register(data)
+    except PasswordHashingBusy:
+        raise _busy()
 
 
 @router.post("/login", response_model=TokenResponse)
-def login(data: LoginRequest):
-    result = presenter.login(data)
+async def login(data: LoginRequest):
+    try:
+        result = await presenter.login(data)
+    except PasswordHashingBusy:
+        raise _busy()
     if not result:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     return result
@@ -1,100 +1,498 @@
-# IFRS 17 API — dashboard, reconciliations, and data. No auth required (per plan).
+# IFRS 17 API — dashboard, reconciliations, and data. No auth required (per plan), except appending rows (admin)
+# and scenario runs (any signed-in user; CPU-heavy).
 
-from fastapi import APIRouter, HTTPException, Query
+import hashlib
+import itertools
+import json
+from typing import Any, Callable
 
-from services import ifrs17_engine
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from auth.dependencies import get_current_admin_user_id, get_current_user_id
+from schemas.ifrs17_schema import AppendRowsRequest, QueryRequest, ScenarioRequest
+from services import (
+    ifrs17_data,
+    ifrs17_drilldown,
+    ifrs17_engine,
+    ifrs17_export,
+    ifrs17_measurement,
+    ifrs17_periods,
+    ifrs17_query,
+    ifrs17_scenarios,
+    ifrs17_triangles,
+    ifrs17_validation,
+)
 
 router = APIRouter()
 
+def _etag(request: Request, version: str) -> str:
+    """
+    Weak ETag for this data version, path, query parameters and output format.
+    Weak because GZipMiddleware sends the same body gzip-encoded or not under
+    one tag, and a strong tag may only name one representation.
+    """
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    ndjson = NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    key = f"{version}|{request.url.path}|{query}|{ndjson}"
+    return 'W/"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """True if If-None-Match already names this ETag (or *), compared weakly as RFC 9110 requires."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _conditional(
+    request: Request,
+    build: Callable[[], Any],
+    version_of: Callable[[], str | None] = ifrs17_engine.data_version,
+) -> Any:
+    """
+    Serve build() with an ETag for the current data version. A client that sends
+    a matching If-None-Match gets 304 before build() (the engine) is called.
+    With no data version (SQL backend) responses are not tagged.
+    """
+    version = version_of()
+    if version is None:
+        return build()
+    etag = _etag(request, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = build()
+    if version_of() != version:
+        # Data was swapped mid-request: don't tag the body with either version
+        headers.pop("ETag")
+    if isinstance(body, Response):
+        body.headers.update(headers)
+        return body
+    return JSONResponse(body, headers=headers)
+
 
 @router.get("/metadata")
-def get_metadata():
+def get_metadata(request: Request):
     """Reporting date, currency, portfolios."""
     try:
-        return ifrs17_engine.get_metadata()
+        return _conditional(request, ifrs17_engine.get_metadata)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
 @router.get("/dashboard/summary")
-def get_dashboard_summary():
+def get_dashboard_summary(request: Request):
     """Dashboard summary: totals, trend %, by_portfolio, portfolios list."""
     try:
-        return ifrs17_engine.get_dashboard_summary()
+        return _conditional(request, ifrs17_engine.get_dashboard_summary)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
 @router.get("/dashboard/liability-trend")
-def get_dashboard_liability_trend():
+def get_dashboard_liability_trend(request: Request):
     """Liability by cohort year (labels and values for line chart)."""
     try:
-        return ifrs17_engine.get_dashboard_liability_trend()
+        return _conditional(request, ifrs17_engine.get_dashboard_liability_trend)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
 @router.get("/dashboard/csm-trend")
-def get_dashboard_csm_trend():
+def get_dashboard_csm_trend(request: Request):
     """CSM by cohort year (labels and values for line chart)."""
     try:
-        return ifrs17_engine.get_dashboard_csm_trend()
+        return _conditional(request, ifrs17_engine.get_dashboard_csm_trend)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
 @router.get("/dashboard/portfolio-comparison")
-def get_dashboard_portfolio_comparison():
+def get_dashboard_portfolio_comparison(request: Request):
     """Portfolio comparison table: portfolio, contracts, premium, claims, loss %, liability, CSM."""
     try:
-        return ifrs17_engine.get_dashboard_portfolio_comparison()
+        return _conditional(request, ifrs17_engine.get_dashboard_portfolio_comparison)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
 @router.get("/dashboard")
-def get_dashboard():
+def get_dashboard(request: Request):
     """Single call: summary + liability trend + csm trend + portfolio comparison."""
     try:
-        summary = ifrs17_engine.get_dashboard_summary()
-        liability_trend = ifrs17_engine.get_dashboard_liability_trend()
-        csm_trend = ifrs17_engine.get_dashboard_csm_trend()
-        portfolio_comparison = ifrs17_engine.get_dashboard_portfolio_comparison()
-        return {
-            "summary": summary,
-            "liability_trend": liability_trend,
-            "csm_trend": csm_trend,
-            "portfolio_comparison": portfolio_comparison,
-        }
+        return _conditional(request, ifrs17_engine.get_dashboard)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
 @router.get("/reconciliations/liability")
-def get_reconciliation_liability():
+def get_reconciliation_liability(request: Request):
     """Liability reconciliation: rows by portfolio/cohort and totals."""
     try:
-        return ifrs17_engine.get_reconciliation_liability()
+        return _conditional(request, ifrs17_engine.get_reconciliation_liability)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
 @router.get("/reconciliations/csm")
-def get_reconciliation_csm():
+def get_reconciliation_csm(request: Request):
     """CSM reconciliation: rows by portfolio/cohort, totals, and insurance revenue from CSM release."""
     try:
-        return ifrs17_engine.get_reconciliation_csm()
+        return _conditional(request, ifrs17_engine.get_reconciliation_csm)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
 
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _ndjson_lines(rows):
+    """Serialize (dataset, row) pairs as NDJSON lines."""
+    for dataset, row in rows:
+        yield json.dumps({"dataset": dataset, "row": row}, separators=(",", ":")) + "\n"
+
+
 @router.get("/data")
 def get_data(
+    request: Request,
     portfolio: str | None = Query(None, description="Filter by portfolio"),
     cohort_year: int | None = Query(None, description="Filter by cohort year"),
+    contract_id: str | None = Query(None, description="Filter by contract id"),
+    dataset: str | None = Query(None, description="Return one page of this dataset (e.g. premiums)"),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(
+        ifrs17_engine.DEFAULT_PAGE_SIZE, ge=1, le=ifrs17_engine.MAX_PAGE_SIZE, description="Page size"
+    ),
+    output_format: str | None = Query(
+        None, alias="format", description="ndjson to stream rows as newline-delimited JSON"
+    ),
 ):
-    """Raw IFRS 17 data. Optional query params: portfolio, cohort_year."""
+    """
+    Raw IFRS 17 data. Optional query params: portfolio, cohort_year, contract_id.
+    With dataset or cursor: one page of that dataset plus next_cursor.
+    With format=ndjson (or Accept: application/x-ndjson): rows streamed one per line.
+    """
+    filters = {"portfolio": portfolio, "cohort_year": cohort_year, "contract_id": contract_id}
+
+    def build():
+        if output_format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+            if cursor:
+                raise ValueError("cursor cannot be combined with NDJSON: the stream already returns every row")
+            rows = ifrs17_engine.iter_data_rows(**filters, datasets=[dataset] if dataset else None)
+            # Load (or fail with 503 / 400 for an unknown dataset) before the response starts streaming
+            first = next(rows)
+            return StreamingResponse(
+                _ndjson_lines(itertools.chain([first], rows)), media_type=NDJSON_MEDIA_TYPE
+            )
+        if dataset or cursor:
+            return ifrs17_engine.get_data_page(dataset=dataset, cursor=cursor, limit=limit, **filters)
+        return ifrs17_engine.get_data(**filters)
+
     try:
-        return ifrs17_engine.get_data(portfolio=portfolio, cohort_year=cohort_year)
+        return _conditional(request, build)
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.post("/data/{dataset}")
+def append_data(dataset: str, body: AppendRowsRequest, current_user_id: int = Depends(get_current_admin_user_id)):
+    """
+    Append premiums, claims, acquisition_costs or reinsurance rows (admin only).
+    The rows are validated as a batch and applied incrementally; returns the new data version.
+    """
+    if ifrs17_engine.BACKEND == "sql":
+        raise HTTPException(
+            status_code=400, detail="With IFRS17_BACKEND=sql, append CSV files with python -m services.ifrs17_ingest --append"
+        )
+    try:
+        data = ifrs17_data.append_rows(dataset, body.rows)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return {"dataset": dataset, "appended": len(body.rows), "rows": data.table(dataset).n_rows, "version": data.version}
+
+
+@router.get("/drilldown")
+def get_drilldown(
+    request: Request,
+    figure: str | None = Query(None, description="Summary / by_portfolio figure, e.g. gross_premium, claims, csm"),
+    dataset: str | None = Query(None, description="Or a dataset, e.g. liability_movements"),
+    column: str | None = Query(None, description="Column summed by the figure (with dataset); omit to count rows"),
+    portfolio: str | None = Query(None, description="Only this portfolio's cells"),
+    cohort_year: int | None = Query(None, description="Only this cohort's cells"),
+    offset: int = Query(0, ge=0, description="Rows to skip"),
+    limit: int = Query(
+        ifrs17_drilldown.DEFAULT_LIMIT, ge=1, le=ifrs17_drilldown.MAX_LIMIT, description="Page size"
+    ),
+):
+    """
+    Source rows behind a dashboard or reconciliation figure, one page at a time,
+    with the figure's value (equal to the dashboard's) and the row count.
+    """
+
+    def build():
+        return ifrs17_drilldown.drill_down(
+            figure=figure,
+            dataset=dataset,
+            column=column,
+            portfolio=portfolio,
+            cohort_year=cohort_year,
+            offset=offset,
+            limit=limit,
+        )
+
+    try:
+        return _conditional(request, build)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get("/validation")
+def get_validation(
+    request: Request,
+    check: str | None = Query(None, description="reference, date_range or roll_forward"),
+    dataset: str | None = Query(None, description="Only violations in this dataset"),
+    offset: int = Query(0, ge=0, description="Violations to skip"),
+    limit: int = Query(100, ge=1, le=ifrs17_engine.MAX_PAGE_SIZE, description="Page size"),
+):
+    """
+    Data validation report: violations per rule (reference, date range and
+    roll-forward checks) and one page of the violating rows.
+    """
+
+    def build():
+        data = ifrs17_data.load_data()
+        report = ifrs17_validation.get_validation(data)
+        return report.page(data, check=check, dataset=dataset, offset=offset, limit=limit)
+
+    try:
+        return _conditional(request, build)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get("/export/{report}")
+def export_report(
+    request: Request,
+    report: str,
+    output_format: str = Query("xlsx", alias="format", description="xlsx or csv"),
+    portfolio: str | None = Query(None, description="Filter by portfolio"),
+    cohort_year: int | None = Query(None, description="Filter by cohort year"),
+    contract_id: str | None = Query(None, description="Filter by contract id (data export)"),
+    dataset: list[str] | None = Query(None, description="Datasets to include in a data export (repeatable)"),
+):
+    """
+    Download liability-reconciliation, csm-reconciliation, portfolio-comparison or
+    (filtered) data as an Excel workbook or CSV, streamed as it is written.
+    A CSV data export covers one dataset.
+    """
+
+    def build():
+        if output_format not in ifrs17_export.FORMATS:
+            raise ValueError(f"Unknown format: {output_format} (choose from {', '.join(ifrs17_export.FORMATS)})")
+        sheets = ifrs17_export.build_report(
+            report, portfolio=portfolio, cohort_year=cohort_year, contract_id=contract_id, datasets=dataset
+        )
+        if output_format == "csv":
+            if len(sheets) != 1:
+                raise ValueError("CSV export of data needs exactly one dataset parameter")
+            body = ifrs17_export.stream_csv(sheets[0])
+        else:
+            body = ifrs17_export.stream_xlsx(sheets)
+        filename = f"ifrs17-{report}.{output_format}"
+        return StreamingResponse(
+            body,
+            media_type=ifrs17_export.MEDIA_TYPES[output_format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    try:
+        return _conditional(request, build)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+def _measurement_basis(
+    expected_loss_ratio: float | None = Query(None, ge=0, description="Default expected loss ratio (e.g. 0.65)"),
+    expense_ratio: float | None = Query(None, ge=0, description="Default expense ratio (e.g. 0.05)"),
+    risk_adjustment_pct: float | None = Query(None, ge=0, description="Risk adjustment, % of PV of outflows"),
+) -> ifrs17_measurement.MeasurementBasis:
+    defaults = ifrs17_measurement.MeasurementBasis()
+    return ifrs17_measurement.MeasurementBasis(
+        expected_loss_ratio=defaults.expected_loss_ratio if expected_loss_ratio is None else expected_loss_ratio,
+        expense_ratio=defaults.expense_ratio if expense_ratio is None else expense_ratio,
+        risk_adjustment_pct=defaults.risk_adjustment_pct if risk_adjustment_pct is None else risk_adjustment_pct,
+    )
+
+
+@router.get("/measurement")
+def get_measurement(
+    request: Request,
+    period_start: str | None = Query(None, description="Roll-forward start date (default: 1 Jan of reporting year)"),
+    basis: ifrs17_measurement.MeasurementBasis = Depends(_measurement_basis),
+):
+    """PAA/GMM measurement from cash flows: balances, liability and CSM roll-forwards by portfolio/cohort."""
+    try:
+        return _conditional(request, lambda: ifrs17_measurement.measure(basis=basis, period_start=period_start))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get("/measurement/compare")
+def get_measurement_compare(
+    request: Request,
+    period_start: str | None = Query(None, description="Roll-forward start date (default: 1 Jan of reporting year)"),
+    basis: ifrs17_measurement.MeasurementBasis = Depends(_measurement_basis),
+):
+    """Computed roll-forwards vs the reported liability/CSM reconciliations, per portfolio/cohort."""
+    try:
+        return _conditional(
+            request, lambda: ifrs17_measurement.compare_with_reported(basis=basis, period_start=period_start)
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get("/triangles")
+def get_triangles(
+    request: Request,
+    origin: str = Query("cohort", description="cohort (contract cohort_year) or accident (incurred_date)"),
+    period: str = Query("year", description="Development period: year or quarter"),
+):
+    """Paid and incurred claims triangles from raw claims, with chain-ladder link ratios, ultimates and IBNR."""
+    try:
+        return _conditional(request, lambda: ifrs17_triangles.build_triangles(origin=origin, period=period))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.post("/scenarios")
+def run_scenarios(body: ScenarioRequest, current_user_id: int = Depends(get_current_user_id)):
+    """
+    Sensitivity / scenario run: closing LRC, LIC, RA, CSM and loss component for
+    the base and each scenario, with per-portfolio/cohort deltas against base.
+    Requires a signed-in user, since a run can keep every CPU busy.
+    """
+    scenarios = [
+        ifrs17_scenarios.Scenario(s.name, tuple(ifrs17_measurement.Shock(**k.model_dump()) for k in s.shocks))
+        for s in body.scenarios
+    ]
+    if not scenarios and not body.grid:
+        raise HTTPException(status_code=400, detail="Provide scenarios or grid")
+    basis = _measurement_basis(body.expected_loss_ratio, body.expense_ratio, body.risk_adjustment_pct)
+    try:
+        if body.grid:
+            scenarios += ifrs17_scenarios.scenario_grid(
+                [(ifrs17_measurement.Shock(a.target, 0.0, a.relative, a.portfolio), a.values) for a in body.grid]
+            )
+        return ifrs17_scenarios.run_scenarios(scenarios, basis=basis, period_start=body.period_start)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.post("/query")
+def run_query(body: QueryRequest):
+    """
+    Ad-hoc group-by / pivot: dimensions, measures (sum, count, mean, ratio) and
+    filters over one dataset, optionally joined to contracts. Returns rows plus the query plan.
+    """
+    try:
+        return ifrs17_query.run_query(
+            body.dataset,
+            dimensions=body.dimensions,
+            measures=[ifrs17_query.Measure(**m.model_dump()) for m in body.measures],
+            filters=[ifrs17_query.Filter(**f.model_dump()) for f in body.filters],
+            join=body.join,
+            pivot=body.pivot,
+            order_by=body.order_by,
+            limit=body.limit,
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+def _period_view(request: Request, build: Callable[[], Any]) -> Any:
+    """Serve a reporting-period endpoint (ETag from the period set version)."""
+    try:
+        return _conditional(request, build, ifrs17_periods.periods_version)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0]) from e
+
+
+@router.get("/periods")
+def get_periods(request: Request):
+    """Loaded reporting periods and how many datasets they share."""
+    return _period_view(request, ifrs17_periods.list_periods)
+
+
+@router.get("/periods/compare")
+def compare_periods(
+    request: Request,
+    base: str = Query(..., description="Reporting period to compare from (e.g. 2024-09-30)"),
+    other: str = Query(..., description="Reporting period to compare to (e.g. 2024-12-31)"),
+):
+    """Deltas between two periods: summary, by-portfolio figures and reconciliations."""
+    return _period_view(request, lambda: ifrs17_periods.compare_periods(base, other))
+
+
+@router.get("/periods/{period}/summary")
+def get_period_summary(request: Request, period: str):
+    """Dashboard summary for one reporting period."""
+    return _period_view(
+        request, lambda: ifrs17_engine.get_dashboard_summary(data=ifrs17_periods.get_period(period))
+    )
+
+
+@router.get("/periods/{period}/dashboard")
+def get_period_dashboard(request: Request, period: str):
+    """Summary + trends + portfolio comparison for one reporting period."""
+    return _period_view(request, lambda: ifrs17_engine.get_dashboard(data=ifrs17_periods.get_period(period)))
+
+
+@router.get("/periods/{period}/portfolio-comparison")
+def get_period_portfolio_comparison(request: Request, period: str):
+    """Portfolio comparison table for one reporting period."""
+    return _period_view(
+        request,
+        lambda: ifrs17_engine.get_dashboard_portfolio_comparison(data=ifrs17_periods.get_period(period)),
+    )
+
+
+@router.get("/periods/{period}/reconciliations/liability")
+def get_period_reconciliation_liability(request: Request, period: str):
+    """Liability reconciliation for one reporting period."""
+    return _period_view(
+        request, lambda: ifrs17_engine.get_reconciliation_liability(data=ifrs17_periods.get_period(period))
+    )
+
+
+@router.get("/periods/{period}/reconciliations/csm")
+def get_period_reconciliation_csm(request: Request, period: str):
+    """CSM reconciliation for one reporting period."""
+    return _period_view(
+        request, lambda: ifrs17_engine.get_reconciliation_csm(data=ifrs17_periods.get_period(period))
+    )
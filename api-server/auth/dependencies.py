@@ -1,18 +1,28 @@
 """FastAPI dependencies for auth (require valid JWT)."""
+import hmac
+import os
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
-from auth.jwt import verify_token
+from auth.jwt import verify_token_cached
 
 security = HTTPBearer(auto_error=False)
 
+# Who may read GET /metrics: "admin" (an admin's JWT), "token" (Bearer METRICS_TOKEN,
+# for a Prometheus scrape config) or "public" (anyone; only behind a private network)
+METRICS_ACCESS = os.environ.get("METRICS_ACCESS", "admin").lower()
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 
-def get_current_user_id(
+async def get_current_user_id(
     credentials: HTTPAuthorizationCredentials | None = Depends(security),
 ) -> int:
     """
     Require a valid Bearer JWT. Returns the subject (user id) from the token.
     Use as a dependency on routes that require authentication.
+    Async so it runs on the event loop rather than taking a threadpool worker;
+    verified tokens are cached until their exp (auth/jwt.py).
     """
     if credentials is None:
         raise HTTPException(
@@ -31,7 +41,7 @@ def get_current_user_id(
             headers={"WWW-Authenticate": "Bearer"},
         )
     try:
-        payload = verify_token(token)
+        payload = verify_token_cached(token)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,20 +65,54 @@ def get_current_user_id(
         )
 
 
-def get_current_admin_user_id(
+async def get_current_admin_user_id(
     current_user_id: int = Depends(get_current_user_id),
 ) -> int:
     """
     Require a valid JWT and that the user has role ADMIN.
     Use for routes that only admins can access (e.g. list all users).
+    The role comes from the user cache, so repeat calls skip the DB.
     """
     from models.user_model import Role
-    from services.user_service import user_service
+    from services.user_service import async_user_service
 
-    user = user_service.get_by_id(current_user_id)
+    user = await async_user_service.get_by_id(current_user_id)
     if not user or user.role != Role.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required",
         )
     return current_user_id
+
+
+async def admin_user_id_from_header(authorization: str | None) -> int | None:
+    """
+    User id of an admin's Bearer token in an Authorization header value, or None
+    (missing, invalid or expired token, or not an admin). Never raises; for checks
+    outside route dependencies such as the X-Profile middleware.
+    """
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        user_id = await get_current_user_id(HTTPAuthorizationCredentials(scheme="Bearer", credentials=authorization[7:]))
+        return await get_current_admin_user_id(user_id)
+    except HTTPException:
+        return None
+
+
+async def require_metrics_access(
+    credentials: HTTPAuthorizationCredentials | None = Depends(security),
+) -> None:
+    """Gate GET /metrics as configured by METRICS_ACCESS (401/403 otherwise)."""
+    if METRICS_ACCESS == "public":
+        return
+    if METRICS_ACCESS == "token":
+        given = credentials.credentials.strip() if credentials else ""
+        if not METRICS_TOKEN or not hmac.compare_digest(given.encode("utf-8"), METRICS_TOKEN.encode("utf-8")):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid metrics token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return
+    await get_current_admin_user_id(await get_current_user_id(credentials))
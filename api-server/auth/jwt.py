@@ -1,8 +1,11 @@
 import os
+import time
 from datetime import datetime, timedelta, timezone
 
 import jwt
 
+from auth.cache import TTLCache
+
 # Use env in production; default for dev only
 SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-change-in-production")
 ALGORITHM = "HS256"
@@ -23,3 +26,33 @@ def verify_token(token: str | bytes) -> dict:
         token = token.decode("utf-8")
     token = token.strip()
     return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+# Verified tokens -> claims. Entries never outlive the token's exp, so expiry is still enforced.
+TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.environ.get("AUTH_TOKEN_CACHE_TTL", "300"))
+_token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+
+def verify_token_cached(token: str | bytes) -> dict:
+    """
+    verify_token() with a bounded LRU/TTL cache of verified tokens. A cached entry
+    lives at most until the token's exp; invalid tokens are never cached.
+    Raises jwt.InvalidTokenError if invalid.
+    """
+    if isinstance(token, bytes):
+        token = token.decode("utf-8")
+    token = token.strip()
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = verify_token(token)
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        _token_cache.set(token, payload, ttl=exp - time.time())
+    return payload
+
+
+def clear_token_cache() -> None:
+    """Forget verified tokens (e.g. after rotating SECRET_KEY, or for tests)."""
+    _token_cache.clear()
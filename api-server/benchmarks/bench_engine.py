@@ -0,0 +1,212 @@
+"""
+IFRS 17 engine micro-benchmarks across a ladder of dataset sizes.
+
+For each size, a synthetic dataset (tools/generate_ifrs17_data.py) is loaded
+into a snapshot, then every public entry point of services/ifrs17_engine.py is
+timed: dashboard figures, by-portfolio aggregates, cohort trends,
+reconciliations, and get_data / get_data_page / iter_data_rows with each filter
+mix. Per case it records:
+- cold_s: best of --repeat runs with the snapshot's derived results (aggregates) cleared first
+- warm_s: best of --repeat runs with derived results cached (what most requests see)
+- peak_mb: peak Python/NumPy allocation of one cold run (tracemalloc)
+
+Results are saved as JSON and, with --baseline, compared case by case; the run
+exits non-zero if any case is more than --threshold times slower than the
+baseline (ignoring differences under --min-delta-ms).
+
+Usage (from api-server):
+    python -m benchmarks.bench_engine --sizes 1000,10000,100000 --save-baseline benchmarks/baseline_engine.json
+    python -m benchmarks.bench_engine --sizes 1000,10000,100000 --baseline benchmarks/baseline_engine.json
+"""
+import argparse
+from datetime import datetime, timezone
+import gc
+import json
+from pathlib import Path
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import numpy as np
+
+from services import ifrs17_data, ifrs17_engine
+from services.ifrs17_store import IFRS17Store
+from tools.generate_ifrs17_data import generate
+
+DEFAULT_SIZES = "1000,10000,100000"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _consume(rows) -> int:
+    return sum(1 for _ in rows)
+
+
+def cases(data: IFRS17Store) -> dict[str, Callable[[], Any]]:
+    """Named engine calls against one snapshot."""
+    e = ifrs17_engine
+    portfolio = (data.metadata.get("portfolios") or ["Motor"])[0]
+    cohort = data.dimension("contracts", "cohort_year")
+    cohort_year = int(np.max(cohort)) if len(cohort) else None
+    ids = data.dictionaries.get("contract_id")
+    contract_id = ids.values[len(ids) // 2] if ids is not None and len(ids) else None
+    filter_mixes = {
+        "none": {},
+        "portfolio": {"portfolio": portfolio},
+        "cohort": {"cohort_year": cohort_year},
+        "portfolio+cohort": {"portfolio": portfolio, "cohort_year": cohort_year},
+        "contract": {"contract_id": contract_id},
+    }
+    out: dict[str, Callable[[], Any]] = {
+        "get_metadata": lambda: e.get_metadata(data=data),
+        "get_dashboard_summary": lambda: e.get_dashboard_summary(data=data),
+        "_build_by_portfolio": lambda: e._build_by_portfolio(data),
+        "get_dashboard_liability_trend": lambda: e.get_dashboard_liability_trend(data=data),
+        "get_dashboard_csm_trend": lambda: e.get_dashboard_csm_trend(data=data),
+        "get_dashboard_portfolio_comparison": lambda: e.get_dashboard_portfolio_comparison(data=data),
+        "get_dashboard": lambda: e.get_dashboard(data=data),
+        "get_reconciliation_liability": lambda: e.get_reconciliation_liability(data=data),
+        "get_reconciliation_csm": lambda: e.get_reconciliation_csm(data=data),
+    }
+    for mix, filters in filter_mixes.items():
+        out[f"get_data[{mix}]"] = lambda f=filters: e.get_data(**f, data=data)
+        out[f"get_data_page[{mix}]"] = lambda f=filters: e.get_data_page("claims", **f, data=data)
+        out[f"iter_data_rows[{mix}]"] = lambda f=filters: _consume(e.iter_data_rows(**f, data=data))
+    return out
+
+
+def _best(fn: Callable[[], Any], repeat: int, before: Callable[[], None] | None = None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if before:
+            before()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_mb(fn: Callable[[], Any]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20
+
+
+def _dataset(size: int, seed: int, data_dir: Path) -> Path:
+    """Generated JSON for (size, seed), reused if already in data_dir."""
+    path = data_dir / f"ifrs17_{size}_seed{seed}.json"
+    if not path.exists():
+        generate(size, seed, json_path=path)
+    return path
+
+
+def run(sizes: list[int], repeat: int, seed: int, data_dir: Path, only: str | None = None) -> dict[str, Any]:
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for size in sizes:
+        path = _dataset(size, seed, data_dir)
+        ifrs17_data.clear_cache()
+        load_s = _best(lambda: ifrs17_data.build_snapshot(path), 1)
+        load_mb = _peak_mb(lambda: ifrs17_data.build_snapshot(path))
+        data, _ = ifrs17_data.build_snapshot(path)
+        size_results = {"load": {"cold_s": load_s, "warm_s": load_s, "peak_mb": load_mb}}
+        print(f"\n{size} contracts ({path.stat().st_size / 2**20:.1f} MB JSON): load {load_s * 1000:.1f} ms")
+        for name, fn in cases(data).items():
+            if only and only not in name:
+                continue
+            cold = _best(fn, repeat, before=data.derived.clear)
+            peak = _peak_mb(lambda: (data.derived.clear(), fn()))
+            fn()
+            warm = _best(fn, repeat)
+            size_results[name] = {"cold_s": cold, "warm_s": warm, "peak_mb": peak}
+            print(f"  {name:<40} cold {cold * 1000:>9.2f} ms  warm {warm * 1000:>9.2f} ms  peak {peak:>8.1f} MB")
+        results[str(size)] = size_results
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float, min_delta_ms: float) -> list[str]:
+    """Cases slower than baseline by more than `threshold`x and `min_delta_ms`; prints the comparison."""
+    regressions = []
+    print(f"\nComparison with baseline from {baseline.get('meta', {}).get('timestamp')} (cold times)")
+    for size, size_results in current["results"].items():
+        base_size = baseline.get("results", {}).get(size)
+        if base_size is None:
+            continue
+        for name, r in size_results.items():
+            b = base_size.get(name)
+            if b is None or not b.get("cold_s"):
+                continue
+            ratio = r["cold_s"] / b["cold_s"]
+            delta_ms = (r["cold_s"] - b["cold_s"]) * 1000
+            flag = ""
+            if ratio > threshold and delta_ms > min_delta_ms:
+                flag = "  REGRESSION"
+                regressions.append(f"{size}/{name}")
+            print(f"  {size:>8} {name:<40} {b['cold_s'] * 1000:>9.2f} -> {r['cold_s'] * 1000:>9.2f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark IFRS 17 engine functions across dataset sizes.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated contract counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (best is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", type=Path, help="Keep generated datasets here (reused between runs)")
+    parser.add_argument("--only", help="Run only cases whose name contains this text")
+    parser.add_argument("--output", type=Path, help="Results JSON (default: benchmarks/results/engine-<time>.json)")
+    parser.add_argument("--baseline", type=Path, help="Compare against this results JSON")
+    parser.add_argument("--save-baseline", type=Path, help="Also write the results here as the new baseline")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    tmp = None
+    data_dir = args.data_dir
+    if data_dir is None:
+        tmp = tempfile.TemporaryDirectory()
+        data_dir = Path(tmp.name)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        current = run(sizes, args.repeat, args.seed, data_dir, args.only)
+    finally:
+        ifrs17_data.clear_cache()
+        if tmp is not None:
+            tmp.cleanup()
+
+    output = args.output or RESULTS_DIR / f"engine-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(current, indent=2))
+    print(f"\nResults written to {output}")
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(current, indent=2))
+        print(f"Baseline written to {args.save_baseline}")
+    if args.baseline:
+        regressions = compare(current, json.loads(args.baseline.read_text()), args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Login throughput benchmark, for sizing the bcrypt pool (services/passwords.py).
+
+Fires bursts of concurrent POST /api/v1/login requests through the ASGI app
+(in-process, httpx ASGITransport) for each pool size in --workers, on a
+throwaway SQLite database. Reports logins/s, latency percentiles, 503s from a
+full queue, and the worst event-loop stall seen meanwhile (what an unrelated
+dashboard request would have waited).
+
+Usage (from api-server; needs httpx):
+    python -m benchmarks.bench_login
+    python -m benchmarks.bench_login --logins 400 --concurrency 100 --workers 1,2,4,8
+"""
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from benchmarks.common import percentile
+
+
+async def _loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Largest delay between when a sleep should end and when the loop resumed it."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def _burst(app, logins: int, concurrency: int, password: str) -> dict:
+    import httpx
+
+    from services.user_service import DEFAULT_ADMIN_EMAIL
+
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    gate = asyncio.Semaphore(concurrency)
+    body = {"email": DEFAULT_ADMIN_EMAIL, "password": password}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+
+        async def one() -> None:
+            async with gate:
+                start = time.perf_counter()
+                r = await client.post("/api/v1/login", json=body)
+                latencies.append(time.perf_counter() - start)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+        stop = asyncio.Event()
+        lag = asyncio.create_task(_loop_lag(stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        worst_lag = await lag
+    ok = statuses.get(200, 0)
+    return {
+        "logins_per_s": ok / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "ok": ok,
+        "busy_503": statuses.get(503, 0),
+        "max_loop_stall_ms": worst_lag * 1000,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark login throughput per bcrypt pool size.")
+    parser.add_argument("--logins", type=int, default=200, help="Logins per pool size")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated bcrypt pool sizes to try")
+    parser.add_argument("--executor", choices=("process", "thread"), default="process")
+    args = parser.parse_args(argv)
+
+    # Throwaway database; must be set before database.py is imported
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DB_PATH"] = str(Path(tmp.name) / "bench.db")
+    os.environ.setdefault("IFRS17_WATCH_INTERVAL", "0")
+
+    from database import init_db
+    from main import app
+    from services import passwords
+    from services.user_service import DEFAULT_ADMIN_PASSWORD, user_service
+
+    # ASGITransport does not run startup events
+    init_db()
+    user_service.ensure_default_admin()
+    passwords.BCRYPT_EXECUTOR = args.executor
+
+    print(f"{args.logins} logins, {args.concurrency} concurrent, {args.executor} pool")
+    print(f"{'workers':>7} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'503s':>5} {'loop stall ms':>14}")
+    try:
+        for workers in (int(w) for w in args.workers.split(",")):
+            passwords.shutdown_pool()
+            passwords.BCRYPT_WORKERS = passwords.BCRYPT_MAX_CONCURRENCY = workers
+            passwords.start_pool()
+            r = asyncio.run(_burst(app, args.logins, args.concurrency, DEFAULT_ADMIN_PASSWORD))
+            print(
+                f"{workers:>7} {r['logins_per_s']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}"
+                f" {r['p99_ms']:>8.1f} {r['busy_503']:>5} {r['max_loop_stall_ms']:>14.1f}"
+            )
+    finally:
+        passwords.shutdown_pool()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""Helpers shared by the benchmarks."""
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile (0-100) of values; 0.0 if empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
@@ -0,0 +1,240 @@
+"""
+In-process end-to-end load test of main.app (no network: httpx ASGITransport).
+
+Concurrent clients send a weighted mix of requests:
+- authenticated login
+- GET /api/v1/users
+- the IFRS 17 dashboard
+- the liability and CSM reconciliations
+- filtered /data calls (portfolio, cohort, portfolio+cohort, contract)
+
+Every request goes through the full stack: middleware, auth dependencies, the
+presenter/engine and JSON serialization with gzip. The report gives overall
+throughput plus p50/p95/p99 latency per route, so auth, serialization and
+engine changes can be measured together.
+
+Runs on a throwaway SQLite database. IFRS 17 data is the sample file, the file
+given by --data, or a generated dataset of --contracts contracts.
+
+Usage (from api-server; needs httpx):
+    python -m benchmarks.load_test --requests 2000 --concurrency 32
+    python -m benchmarks.load_test --duration 30 --contracts 100000 --mix dashboard=5,data=3,login=0
+"""
+import argparse
+import asyncio
+import json
+import os
+from pathlib import Path
+import random
+import tempfile
+import time
+from typing import Any
+
+from benchmarks.common import percentile
+
+# Route -> relative weight in the default mix
+DEFAULT_MIX = {
+    "login": 1,
+    "users": 2,
+    "dashboard": 5,
+    "reconciliation_liability": 2,
+    "reconciliation_csm": 2,
+    "data": 3,
+}
+
+
+def _parse_mix(spec: str | None) -> dict[str, float]:
+    mix = dict(DEFAULT_MIX)
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown route in --mix: {name} (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name.strip()] = float(weight)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.bytes = 0
+        self.statuses: dict[int, int] = {}
+
+    def add(self, seconds: float, status: int, size: int) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes += size
+        if status >= 400:
+            self.errors += 1
+
+
+def _data_queries(rng: random.Random, data) -> list[dict[str, Any]]:
+    """Filter mixes for /data, drawn from values present in the loaded snapshot."""
+    portfolios = data.metadata.get("portfolios") or ["Motor"]
+    cohorts = sorted({int(c) for c in data.dimension("contracts", "cohort_year").tolist() if c >= 0}) or [2024]
+    ids = data.dictionaries.get("contract_id")
+    contract_ids = ids.values if ids is not None and len(ids) else ["MTR-2023-001"]
+    queries = []
+    for _ in range(64):
+        kind = rng.randrange(4)
+        if kind == 0:
+            queries.append({"portfolio": rng.choice(portfolios)})
+        elif kind == 1:
+            queries.append({"cohort_year": rng.choice(cohorts)})
+        elif kind == 2:
+            queries.append({"portfolio": rng.choice(portfolios), "cohort_year": rng.choice(cohorts)})
+        else:
+            queries.append({"contract_id": rng.choice(contract_ids)})
+    return queries
+
+
+async def _run(
+    app, mix: dict[str, float], concurrency: int, total: int | None, duration: float | None, seed: int, data
+) -> tuple[dict[str, _Stats], float]:
+    import httpx
+
+    from services.user_service import DEFAULT_ADMIN_EMAIL, DEFAULT_ADMIN_PASSWORD
+
+    login_body = {"email": DEFAULT_ADMIN_EMAIL, "password": DEFAULT_ADMIN_PASSWORD}
+    stats = {name: _Stats() for name in mix}
+    names, weights = list(mix), list(mix.values())
+    rng = random.Random(seed)
+    data_queries = _data_queries(rng, data)
+    issued = 0
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=None
+    ) as client:
+        r = await client.post("/api/v1/login", json=login_body)
+        r.raise_for_status()
+        auth = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        def request(name: str):
+            if name == "login":
+                return client.post("/api/v1/login", json=login_body)
+            if name == "users":
+                return client.get("/api/v1/users", headers=auth)
+            if name == "dashboard":
+                return client.get("/api/v1/ifrs17/dashboard", headers=auth)
+            if name == "reconciliation_liability":
+                return client.get("/api/v1/ifrs17/reconciliations/liability", headers=auth)
+            if name == "reconciliation_csm":
+                return client.get("/api/v1/ifrs17/reconciliations/csm", headers=auth)
+            return client.get("/api/v1/ifrs17/data", params=rng.choice(data_queries), headers=auth)
+
+        deadline = time.perf_counter() + duration if duration else None
+
+        async def client_loop() -> None:
+            nonlocal issued
+            while True:
+                if total is not None and issued >= total:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                issued += 1
+                name = rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                response = await request(name)
+                stats[name].add(time.perf_counter() - start, response.status_code, len(response.content))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return stats, elapsed
+
+
+def _report(stats: dict[str, _Stats], elapsed: float, concurrency: int) -> dict[str, Any]:
+    routes = {}
+    for name, s in stats.items():
+        n = len(s.latencies)
+        routes[name] = {
+            "requests": n,
+            "errors": s.errors,
+            "statuses": s.statuses,
+            "rps": n / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(s.latencies, 50) * 1000,
+            "p95_ms": percentile(s.latencies, 95) * 1000,
+            "p99_ms": percentile(s.latencies, 99) * 1000,
+            "max_ms": max(s.latencies, default=0.0) * 1000,
+            "avg_bytes": s.bytes / n if n else 0,
+        }
+    total = sum(r["requests"] for r in routes.values())
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "requests": total,
+        "errors": sum(r["errors"] for r in routes.values()),
+        "rps": total / elapsed if elapsed else 0.0,
+        "routes": routes,
+    }
+
+
+def _print(report: dict[str, Any]) -> None:
+    print(
+        f"{report['requests']} requests in {report['elapsed_s']:.2f}s at concurrency {report['concurrency']}:"
+        f" {report['rps']:.1f} req/s, {report['errors']} errors"
+    )
+    print(
+        f"{'route':<26} {'n':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        f" {'max ms':>8} {'avg KB':>8}"
+    )
+    for name, r in report["routes"].items():
+        print(
+            f"{name:<26} {r['requests']:>6} {r['errors']:>4} {r['rps']:>8.1f} {r['p50_ms']:>8.1f}"
+            f" {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['avg_bytes'] / 1024:>8.1f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="In-process load test of the FastAPI app.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, help="Total requests (default 1000 unless --duration)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a request count")
+    parser.add_argument("--mix", help=f"Route weights, e.g. dashboard=5,login=0 (routes: {', '.join(DEFAULT_MIX)})")
+    parser.add_argument("--data", type=Path, help="IFRS 17 JSON data file (default: the sample file)")
+    parser.add_argument("--contracts", type=int, help="Generate a synthetic dataset of this many contracts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+    total = args.requests if args.requests or args.duration else 1000
+
+    # Throwaway database and data; must be set before database.py / ifrs17_data are imported
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DB_PATH"] = str(Path(tmp.name) / "loadtest.db")
+    os.environ.setdefault("IFRS17_WATCH_INTERVAL", "0")
+    if args.contracts:
+        from tools.generate_ifrs17_data import generate
+
+        args.data = Path(tmp.name) / "ifrs17.json"
+        generate(args.contracts, args.seed, json_path=args.data)
+    if args.data:
+        os.environ["IFRS17_DATA_PATH"] = str(args.data)
+
+    from database import init_db
+    from main import app
+    from services import ifrs17_data, passwords
+    from services.user_service import user_service
+
+    # ASGITransport does not run startup events
+    init_db()
+    user_service.ensure_default_admin()
+    passwords.start_pool()
+    data = ifrs17_data.load_data()
+    try:
+        stats, elapsed = asyncio.run(
+            _run(app, _parse_mix(args.mix), args.concurrency, total, args.duration, args.seed, data)
+        )
+    finally:
+        passwords.shutdown_pool()
+        tmp.cleanup()
+    report = _report(stats, elapsed, args.concurrency)
+    _print(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
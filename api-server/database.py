@@ -1,26 +1,71 @@
 """
 SQLite connection and session. Database file: db/data.db
+
+Two engines share the file:
+- `engine` / SessionLocal (sync): startup, init_db and the IFRS 17 SQL backend.
+- `async_engine` / AsyncSessionLocal (aiosqlite): the user and auth path, so login
+  bursts wait on the event loop instead of holding threadpool workers.
+
+Every connection runs in WAL mode (readers do not block the writer) with
+synchronous=NORMAL and a busy timeout, so concurrent logins and registrations
+queue on the write lock instead of failing with "database is locked".
 """
 import os
 from pathlib import Path
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 # Path to db/data.db relative to this file (api-server root)
 DB_DIR = Path(__file__).resolve().parent / "db"
 DB_DIR.mkdir(parents=True, exist_ok=True)
-DATABASE_URL = f"sqlite:///{DB_DIR / 'data.db'}"
+DB_PATH = Path(os.environ.get("DB_PATH", DB_DIR / "data.db"))
+DATABASE_URL = f"sqlite:///{DB_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
+
+SQL_ECHO = os.environ.get("SQL_ECHO", "").lower() in ("1", "true")
+# Async pool: connections kept open, extra connections under bursts, seconds to wait for one
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# Milliseconds a connection waits for the SQLite write lock
+DB_BUSY_TIMEOUT = int(os.environ.get("DB_BUSY_TIMEOUT", "5000"))
 
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False},
-    echo=os.environ.get("SQL_ECHO", "").lower() in ("1", "true"),
+    echo=SQL_ECHO,
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=SQL_ECHO,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 Base = declarative_base()
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """WAL journal, NORMAL sync and a busy timeout on every new connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+    finally:
+        cursor.close()
+
+
+event.listen(engine, "connect", _set_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+
 def get_db():
     """Yield a DB session (for FastAPI Depends)."""
     db = SessionLocal()
@@ -30,7 +75,18 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Yield an async DB session (for FastAPI Depends)."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """Create all tables. Call on app startup."""
     from models import db_models  # noqa: F401
     Base.metadata.create_all(bind=engine)
+
+
+async def dispose_async_engine() -> None:
+    """Close pooled async connections. Call on app shutdown."""
+    await async_engine.dispose()
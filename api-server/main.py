@@ -2,9 +2,13 @@
 
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 
+from api.middleware import MetricsMiddleware
 from api.v1 import auth_view, ifrs17_view, user_view
-from auth.dependencies import get_current_user_id
+from auth.dependencies import get_current_user_id, require_metrics_access
+from services import metrics
 
 app = FastAPI(
     title="Insurance API",
@@ -22,6 +26,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON / NDJSON payloads (e.g. /ifrs17/data, reconciliations) for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Outermost: per-route latency/size/in-flight metrics (sizes as sent, i.e. after gzip) and X-Profile timings
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(user_view.router, prefix="/api/v1/users", tags=["users"])
 app.include_router(auth_view.router, prefix="/api/v1", tags=["auth"])
 # Also mount at /api/v1 so /api/v1/register and /api/v1/login work
@@ -33,8 +43,31 @@ app.include_router(ifrs17_view.router, prefix="/api/v1/ifrs17", tags=["ifrs17"])
 def on_startup():
     from database import init_db
     from services.user_service import user_service
+    from services import ifrs17_data, ifrs17_engine, passwords
     init_db()
     user_service.ensure_default_admin()
+    # Start the bcrypt workers now so the first logins do not pay for process start-up
+    passwords.start_pool()
+    # With the SQL backend the in-memory snapshot is only loaded if an endpoint
+    # that needs it (validation, drill-down, query, measurement, export) is called
+    if ifrs17_engine.BACKEND == "sql":
+        return
+    # Build the IFRS 17 snapshot up front; the watcher swaps in new versions of the file
+    try:
+        ifrs17_data.load_data()
+    except FileNotFoundError:
+        pass
+    ifrs17_data.start_watcher()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    from database import dispose_async_engine
+    from services import ifrs17_data, ifrs17_scenarios, passwords
+    ifrs17_data.stop_watcher()
+    ifrs17_scenarios.shutdown_pool()
+    passwords.shutdown_pool()
+    await dispose_async_engine()
 
 
 @app.get("/")
@@ -45,3 +78,9 @@ def root(_: int = Depends(get_current_user_id)):
 @app.get("/health")
 def health(_: int = Depends(get_current_user_id)):
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics(_: None = Depends(require_metrics_access)):
+    """Prometheus scrape endpoint: request metrics and IFRS 17 stage timings (access: METRICS_ACCESS)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,5 +1,5 @@
 """SQLAlchemy ORM models (db layer)."""
-from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String
 from sqlalchemy.sql import func
 
 from database import Base
@@ -14,3 +14,148 @@ class UserTable(Base):
     password_hash = Column(String(255), nullable=False)
     role = Column(String(20), nullable=False, default="USER")
     created_at = Column(DateTime, server_default=func.now())
+
+
+# IFRS 17 datasets (loaded from the IFRS17_sample_data_*.csv files by
+# services/ifrs17_ingest.py). Dates are ISO strings (YYYY-MM-DD), as in the CSVs.
+
+
+class ContractTable(Base):
+    __tablename__ = "ifrs17_contracts"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    contract_id = Column(String(64), nullable=False, unique=True, index=True)
+    portfolio = Column(String(64), nullable=False, index=True)
+    product = Column(String(128))
+    inception_date = Column(String(10))
+    coverage_end_date = Column(String(10))
+    measurement_model = Column(String(8))
+    cohort_year = Column(Integer, index=True)
+    currency = Column(String(3))
+
+    __table_args__ = (Index("ix_ifrs17_contracts_portfolio_cohort", "portfolio", "cohort_year"),)
+
+
+class PremiumTable(Base):
+    __tablename__ = "ifrs17_premiums"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    contract_id = Column(String(64), nullable=False, index=True)
+    period = Column(String(16))
+    gross_premium = Column(Float)
+    ceded_premium = Column(Float)
+    net_premium = Column(Float)
+    received_date = Column(String(10))
+
+
+class ClaimTable(Base):
+    __tablename__ = "ifrs17_claims"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    contract_id = Column(String(64), nullable=False, index=True)
+    claim_id = Column(String(64))
+    incurred_date = Column(String(10))
+    paid_date = Column(String(10))
+    incurred_amount = Column(Float)
+    paid_amount = Column(Float)
+    outstanding_reserve = Column(Float)
+
+
+class AcquisitionCostTable(Base):
+    __tablename__ = "ifrs17_acquisition_costs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    contract_id = Column(String(64), nullable=False, index=True)
+    period = Column(String(16))
+    commission = Column(Float)
+    underwriting_cost = Column(Float)
+    total = Column(Float)
+
+
+class AssumptionTable(Base):
+    __tablename__ = "ifrs17_assumptions"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    portfolio = Column(String(64), nullable=False, index=True)
+    assumption_type = Column(String(64), nullable=False)
+    value_pct = Column(Float)
+    effective_date = Column(String(10))
+    description = Column(String(255))
+
+
+class DiscountRateTable(Base):
+    __tablename__ = "ifrs17_discount_rates"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    term_years = Column(Integer, nullable=False)
+    rate_pct = Column(Float)
+    as_at_date = Column(String(10), index=True)
+
+
+class ReinsuranceTable(Base):
+    __tablename__ = "ifrs17_reinsurance"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    contract_id = Column(String(64), nullable=False, index=True)
+    reinsurer = Column(String(128))
+    ceded_premium_ytd = Column(Float)
+    recoveries_ytd = Column(Float)
+    reinsurance_asset_balance = Column(Float)
+
+
+class LiabilityMovementTable(Base):
+    __tablename__ = "ifrs17_liability_movements"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    portfolio = Column(String(64), nullable=False, index=True)
+    cohort_year = Column(Integer, nullable=False, index=True)
+    opening_balance = Column(Float)
+    new_contracts = Column(Float)
+    premiums_received = Column(Float)
+    claims_incurred = Column(Float)
+    csm_release = Column(Float)
+    experience_variance = Column(Float)
+    closing_balance = Column(Float)
+
+    __table_args__ = (Index("ix_ifrs17_liability_movements_portfolio_cohort", "portfolio", "cohort_year"),)
+
+
+class CSMMovementTable(Base):
+    __tablename__ = "ifrs17_csm_movements"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    portfolio = Column(String(64), nullable=False, index=True)
+    cohort_year = Column(Integer, nullable=False, index=True)
+    opening_csm = Column(Float)
+    initial_recognition = Column(Float)
+    changes_in_estimates = Column(Float)
+    csm_release_to_pl = Column(Float)
+    closing_csm = Column(Float)
+
+    __table_args__ = (Index("ix_ifrs17_csm_movements_portfolio_cohort", "portfolio", "cohort_year"),)
+
+
+class ClaimsDevelopmentTable(Base):
+    __tablename__ = "ifrs17_claims_development"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    cohort_year = Column(Integer, nullable=False, index=True)
+    development_year_1 = Column(Float)
+    development_year_2 = Column(Float)
+    development_year_3 = Column(Float)
+    incremental_claims = Column(Float)
+
+
+# Dataset name (JSON key / CSV suffix) -> table
+IFRS17_TABLES: dict[str, type[Base]] = {
+    "contracts": ContractTable,
+    "premiums": PremiumTable,
+    "claims": ClaimTable,
+    "acquisition_costs": AcquisitionCostTable,
+    "assumptions": AssumptionTable,
+    "discount_rates": DiscountRateTable,
+    "reinsurance": ReinsuranceTable,
+    "liability_movements": LiabilityMovementTable,
+    "csm_movements": CSMMovementTable,
+    "claims_development": ClaimsDevelopmentTable,
+}
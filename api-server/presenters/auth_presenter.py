@@ -1,7 +1,7 @@
 # PRESENTER Layer — auth (register, login)
 
 from schemas.user_schema import LoginRequest, TokenResponse, UserCreate, UserResponse
-from services.user_service import user_service
+from services.user_service import async_user_service
 
 from auth.jwt import create_access_token
 
@@ -10,8 +10,8 @@ class AuthPresenter:
     """Coordinates auth view with user service and JWT."""
 
     @staticmethod
-    def register(data: UserCreate) -> UserResponse:
-        user = user_service.create(data)
+    async def register(data: UserCreate) -> UserResponse:
+        user = await async_user_service.create(data)
         return UserResponse(
             id=user.id,
             email=user.email,
@@ -21,8 +21,8 @@ class AuthPresenter:
         )
 
     @staticmethod
-    def login(data: LoginRequest) -> TokenResponse | None:
-        user = user_service.authenticate(data.email, data.password)
+    async def login(data: LoginRequest) -> TokenResponse | None:
+        user = await async_user_service.authenticate(data.email, data.password)
         if not user:
             return None
         token = create_access_token(sub=user.id)
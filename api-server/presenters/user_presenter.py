@@ -1,15 +1,15 @@
 # PRESENTER Layer — coordination between view and service
 
 from schemas.user_schema import UserCreate, UserResponse
-from services.user_service import user_service
+from services.user_service import async_user_service
 
 
 class UserPresenter:
     """Coordinates user view (API) with user service and shapes responses."""
 
     @staticmethod
-    def create_user(data: UserCreate) -> UserResponse:
-        user = user_service.create(data)
+    async def create_user(data: UserCreate) -> UserResponse:
+        user = await async_user_service.create(data)
         return UserResponse(
             id=user.id,
             email=user.email,
@@ -19,8 +19,8 @@ class UserPresenter:
         )
 
     @staticmethod
-    def get_user(user_id: int) -> UserResponse | None:
-        user = user_service.get_by_id(user_id)
+    async def get_user(user_id: int) -> UserResponse | None:
+        user = await async_user_service.get_by_id(user_id)
         if not user:
             return None
         return UserResponse(
@@ -32,8 +32,8 @@ class UserPresenter:
         )
 
     @staticmethod
-    def list_users() -> list[UserResponse]:
-        users = user_service.list_all()
+    async def list_users() -> list[UserResponse]:
+        users = await async_user_service.list_all()
         return [
             UserResponse(
                 id=u.id,
@@ -1,6 +1,11 @@
 # IFRS 17 API response schemas (for documentation and optional validation)
 
-from pydantic import BaseModel
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+# Values per scenario grid axis (the grid is the product of its axes)
+MAX_GRID_VALUES = 100
 
 
 class MetadataResponse(BaseModel):
@@ -36,3 +41,75 @@ class CSMReconciliationRow(BaseModel):
     changes_in_estimates: float
     csm_release_to_pl: float
     closing_csm: float
+
+
+class ShockSpec(BaseModel):
+    """One shock: target is discount_rate or an assumption_type (lapse_rate, claim_inflation, ...)."""
+
+    target: str
+    value: float
+    relative: bool = False
+    portfolio: str | None = None
+
+
+class ScenarioSpec(BaseModel):
+    """Named scenario: shocks applied together."""
+
+    name: str
+    shocks: list[ShockSpec] = []
+
+
+class GridAxis(BaseModel):
+    """Grid axis: one shock target tried at each value (scenarios are the cartesian product of axes)."""
+
+    target: str
+    values: list[float] = Field(max_length=MAX_GRID_VALUES)
+    relative: bool = False
+    portfolio: str | None = None
+
+
+class ScenarioRequest(BaseModel):
+    """Scenario run: explicit scenarios and/or a grid, plus optional measurement basis overrides."""
+
+    scenarios: list[ScenarioSpec] = []
+    grid: list[GridAxis] = []
+    period_start: str | None = None
+    expected_loss_ratio: float | None = None
+    expense_ratio: float | None = None
+    risk_adjustment_pct: float | None = None
+
+
+class AppendRowsRequest(BaseModel):
+    """Rows to append to premiums, claims, acquisition_costs or reinsurance (column name -> value)."""
+
+    rows: list[dict[str, Any]]
+
+
+class MeasureSpec(BaseModel):
+    """Query measure: op is sum, count, mean or ratio (column / denominator)."""
+
+    op: str
+    column: str | None = None
+    denominator: str | None = None
+    name: str | None = None
+
+
+class FilterSpec(BaseModel):
+    """Query filter: op is eq, in (value is a list), gt, gte, lt or lte."""
+
+    column: str
+    op: str = "eq"
+    value: Any
+
+
+class QueryRequest(BaseModel):
+    """Group-by / pivot query over one dataset, optionally joined to contracts."""
+
+    dataset: str
+    join: str | None = None
+    dimensions: list[str] = []
+    measures: list[MeasureSpec] = []
+    filters: list[FilterSpec] = []
+    pivot: str | None = None
+    order_by: str | None = None
+    limit: int = 1000
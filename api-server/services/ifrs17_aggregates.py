@@ -0,0 +1,308 @@
+"""
+IFRS 17 aggregation stage. Builds every dashboard figure (totals, trends,
+by-portfolio, by-cohort) from one grouping pass per dataset and keeps the
+result on the data snapshot (one per data version), so dashboard endpoints do no
+per-request scans.
+
+The same pass keeps a lineage index per dataset: the row ids of each
+(portfolio, cohort) cell as a posting list (CSR, see services/ifrs17_index.py),
+so the rows behind any figure can be listed without a scan
+(services/ifrs17_drilldown.py).
+"""
+from dataclasses import dataclass, field
+import threading
+from typing import Any
+
+import numpy as np
+
+from services import metrics
+from services.ifrs17_index import PostingIndex, SegmentedIndex, append_to_index
+from services.ifrs17_store import FLOAT, IFRS17Store
+
+# Numeric columns summed per (portfolio, cohort) cell for each dataset
+MEASURES: dict[str, tuple[str, ...]] = {
+    "contracts": (),
+    "premiums": ("gross_premium", "ceded_premium", "net_premium"),
+    "claims": ("incurred_amount", "paid_amount", "outstanding_reserve"),
+    "acquisition_costs": ("commission", "underwriting_cost", "total"),
+    "reinsurance": ("ceded_premium_ytd", "recoveries_ytd", "reinsurance_asset_balance"),
+    "liability_movements": (
+        "opening_balance",
+        "new_contracts",
+        "premiums_received",
+        "claims_incurred",
+        "csm_release",
+        "experience_variance",
+        "closing_balance",
+    ),
+    "csm_movements": (
+        "opening_csm",
+        "initial_recognition",
+        "changes_in_estimates",
+        "csm_release_to_pl",
+        "closing_csm",
+    ),
+}
+
+
+@dataclass
+class CellGrid:
+    """
+    Row counts and column sums per (portfolio, cohort) cell for one dataset.
+    Arrays have shape (n_portfolios + 1, n_cohorts + 1); the last row/column
+    collects rows with an unknown portfolio/cohort (e.g. orphan contract_id).
+    """
+
+    count: np.ndarray
+    sums: dict[str, np.ndarray]
+    # Columns whose sums are reported as int (all source values were integers)
+    integer: set[str] = field(default_factory=set)
+
+    def number(self, column: str, x: Any) -> int | float:
+        return int(round(float(x))) if column in self.integer else float(x)
+
+    def total(self, column: str) -> int | float:
+        return self.number(column, self.sums[column].sum())
+
+
+@dataclass
+class Aggregates:
+    """All dashboard figures for one data version."""
+
+    version: str
+    portfolios: list[str]
+    cohorts: list[int]
+    grids: dict[str, CellGrid]
+    by_portfolio: dict[str, dict[str, Any]]
+    summary: dict[str, Any]
+    liability_trend: dict[str, Any]
+    csm_trend: dict[str, Any]
+    portfolio_comparison: list[dict[str, Any]]
+    # dataset -> row ids per flat (portfolio, cohort) cell (see cell_index)
+    lineage: dict[str, PostingIndex | SegmentedIndex] = field(default_factory=dict)
+
+
+# by_portfolio key -> (dataset, column summed; None counts rows)
+_BY_PORTFOLIO = (
+    ("premium", "premiums", "gross_premium"),
+    ("claims", "claims", "incurred_amount"),
+    ("liability", "liability_movements", "closing_balance"),
+    ("csm", "csm_movements", "closing_csm"),
+    ("count", "contracts", None),
+    ("opening", "liability_movements", "opening_balance"),
+)
+
+
+def trend_pct(current: float, opening: float) -> float | None:
+    """Return percentage change (current vs opening); None if opening is 0."""
+    if opening == 0:
+        return None
+    return round((current - opening) / opening * 100, 1)
+
+
+def empty_portfolio() -> dict[str, Any]:
+    return {"premium": 0, "claims": 0, "liability": 0, "csm": 0, "count": 0, "opening": 0}
+
+
+def portfolio_order(data: IFRS17Store) -> list[str]:
+    """Portfolios present in contracts (first-seen order), else metadata portfolios."""
+    contracts = data.table("contracts")
+    if "portfolio" in contracts:
+        codes = contracts.values("portfolio")
+        codes = codes[codes >= 0]
+        _, first = np.unique(codes, return_index=True)
+        present = codes[np.sort(first)]
+        names = data.categories("portfolio")
+        if len(present):
+            return [names[c] for c in present.tolist()]
+    return list(data.metadata.get("portfolios", []))
+
+
+def cohort_axis(data: IFRS17Store) -> np.ndarray:
+    """Sorted cohort years seen in any dataset."""
+    parts = [data.dimension(name, "cohort_year") for name in MEASURES]
+    years = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+    return np.unique(years[years >= 0])
+
+
+def cell_index(data: IFRS17Store, dataset: str, cohorts: np.ndarray) -> np.ndarray:
+    """Flat (portfolio, cohort) cell index per row of a dataset; unknowns go to the last slot."""
+    n_ports = len(data.categories("portfolio"))
+    ports = data.dimension(dataset, "portfolio")
+    ports = np.where(ports >= 0, ports, n_ports)
+    years = data.dimension(dataset, "cohort_year")
+    n_cohorts = len(cohorts)
+    if n_cohorts:
+        pos = np.minimum(np.searchsorted(cohorts, years), n_cohorts - 1)
+        pos = np.where(cohorts[pos] == years, pos, n_cohorts)
+    else:
+        pos = np.zeros(len(years), dtype=np.int64)
+    return ports * (len(cohorts) + 1) + pos
+
+
+def build_grid(data: IFRS17Store, dataset: str, cohorts: np.ndarray, cells: np.ndarray | None = None) -> CellGrid:
+    """One grouping pass: cell index per row (unless given), then bincount every measure column."""
+    table = data.table(dataset)
+    shape = (len(data.categories("portfolio")) + 1, len(cohorts) + 1)
+    size = shape[0] * shape[1]
+    if cells is None:
+        cells = cell_index(data, dataset, cohorts)
+    count = np.bincount(cells, minlength=size).reshape(shape)
+    sums: dict[str, np.ndarray] = {}
+    integer: set[str] = set()
+    for column in MEASURES.get(dataset, ()):
+        sums[column] = np.bincount(cells, weights=table.numeric(column), minlength=size).reshape(shape)
+        col = table.columns.get(column)
+        if col is None or col.kind != FLOAT:
+            integer.add(column)
+    return CellGrid(count, sums, integer)
+
+
+def build_aggregates(data: IFRS17Store) -> Aggregates:
+    """Compute every dashboard figure from one grid per dataset."""
+    cohorts = cohort_axis(data)
+    cells = {name: cell_index(data, name, cohorts) for name in MEASURES}
+    grids = {name: build_grid(data, name, cohorts, cells[name]) for name in MEASURES}
+    lineage = {name: PostingIndex.build(c) for name, c in cells.items()}
+    return assemble(data, cohorts, grids, portfolio_order(data), lineage)
+
+
+def add_rows(aggregates: Aggregates, data: IFRS17Store, batch: IFRS17Store, dataset: str) -> Aggregates:
+    """
+    Aggregates of `data` (the previous snapshot plus appended rows of one dataset)
+    from the previous aggregates and a store `batch` holding only the appended
+    rows: the batch is grouped into a grid of its own and added cell by cell, so
+    the cost depends on the batch and the grid size, not on the whole dataset.
+    The lineage index gets a delta segment for the new rows.
+    """
+    cohorts = np.asarray(aggregates.cohorts, dtype=np.int64)
+    cells = cell_index(batch, dataset, cohorts)
+    old, delta = aggregates.grids[dataset], build_grid(batch, dataset, cohorts, cells)
+    grid = CellGrid(
+        old.count + delta.count,
+        {c: old.sums[c] + delta.sums[c] for c in old.sums},
+        old.integer & delta.integer,
+    )
+    lineage = dict(aggregates.lineage)
+    if dataset in lineage:
+        start = len(data.table(dataset)) - len(batch.table(dataset))
+        lineage[dataset] = append_to_index(lineage[dataset], cells, start)
+    return assemble(data, cohorts, {**aggregates.grids, dataset: grid}, list(aggregates.by_portfolio), lineage)
+
+
+def assemble(
+    data: IFRS17Store,
+    cohorts: np.ndarray,
+    grids: dict[str, CellGrid],
+    ports: list[str],
+    lineage: dict[str, PostingIndex | SegmentedIndex],
+) -> Aggregates:
+    """Every dashboard figure from the per-dataset grids (`ports`: portfolio order of by_portfolio)."""
+    names = data.categories("portfolio")
+    code_of = {p: i for i, p in enumerate(names)}
+    by_portfolio = {
+        p: (
+            {key: _portfolio_figure(grids[ds], column, code_of[p]) for key, ds, column in _BY_PORTFOLIO}
+            if p in code_of
+            else empty_portfolio()
+        )
+        for p in ports
+    }
+
+    lm, cm = grids["liability_movements"], grids["csm_movements"]
+    prem, cl = grids["premiums"], grids["claims"]
+    total_liability_close = lm.total("closing_balance")
+    total_liability_open = lm.total("opening_balance")
+    total_csm_close = cm.total("closing_csm")
+    total_csm_open = cm.total("opening_csm")
+    total_net = prem.total("net_premium")
+    total_incurred = cl.total("incurred_amount")
+    summary_ports = data.metadata.get("portfolios", list(by_portfolio.keys()))
+    summary = {
+        "insurance_liability": total_liability_close,
+        "insurance_liability_opening": total_liability_open,
+        "liability_trend_pct": trend_pct(total_liability_close, total_liability_open),
+        "reinsurance_asset": grids["reinsurance"].total("reinsurance_asset_balance"),
+        "closing_csm": total_csm_close,
+        "csm_trend_pct": trend_pct(total_csm_close, total_csm_open),
+        "gross_premium": prem.total("gross_premium"),
+        "net_premium": total_net,
+        "claims_incurred": total_incurred,
+        "loss_ratio_pct": round(total_incurred / total_net * 100, 1) if total_net else None,
+        "contracts_count": len(data.table("contracts")),
+        "insurance_revenue_csm_release": cm.total("csm_release_to_pl"),
+        "acquisition_costs_total": grids["acquisition_costs"].total("total"),
+        "claims_paid": cl.total("paid_amount"),
+        "claims_outstanding_reserve": cl.total("outstanding_reserve"),
+        "by_portfolio": {p: by_portfolio.get(p, empty_portfolio()) for p in summary_ports},
+        "portfolios": summary_ports,
+    }
+
+    return Aggregates(
+        version=data.version,
+        portfolios=list(names),
+        cohorts=cohorts.tolist(),
+        grids=grids,
+        by_portfolio=by_portfolio,
+        summary=summary,
+        liability_trend=_cohort_trend(lm, "closing_balance", cohorts),
+        csm_trend=_cohort_trend(cm, "closing_csm", cohorts),
+        portfolio_comparison=portfolio_comparison(summary),
+        lineage=lineage,
+    )
+
+
+def _portfolio_figure(grid: CellGrid, column: str | None, code: int) -> int | float:
+    """Row count (column None) or column sum over all cohorts of one portfolio."""
+    if column is None:
+        return int(grid.count[code].sum())
+    return grid.number(column, grid.sums[column][code].sum())
+
+
+def _cohort_trend(grid: CellGrid, column: str, cohorts: np.ndarray) -> dict[str, Any]:
+    """Sum of `column` per cohort year that has rows, sorted by year."""
+    present = grid.count[:, :-1].sum(axis=0) > 0
+    values = grid.sums[column][:, :-1].sum(axis=0)
+    return {
+        "labels": [str(y) for y in cohorts[present].tolist()],
+        "values": [grid.number(column, x) for x in values[present].tolist()],
+    }
+
+
+def portfolio_comparison(summary: dict[str, Any]) -> list[dict[str, Any]]:
+    """Table rows: portfolio, contracts, gross premium, claims, loss %, closing liability, closing CSM."""
+    rows = []
+    for p in summary["portfolios"]:
+        bp = summary["by_portfolio"].get(p, {})
+        premium = bp.get("premium", 0) or 0
+        claims = bp.get("claims", 0) or 0
+        loss_pct = round(claims / premium * 100, 1) if premium else None
+        rows.append({
+            "portfolio": p,
+            "contracts": bp.get("count", 0),
+            "gross_premium": premium,
+            "claims": claims,
+            "loss_ratio_pct": loss_pct,
+            "closing_liability": bp.get("liability", 0),
+            "closing_csm": bp.get("csm", 0),
+        })
+    return rows
+
+
+_aggregates_lock = threading.Lock()
+
+
+def get_aggregates(data: IFRS17Store) -> Aggregates:
+    """
+    Aggregates for this data snapshot; built once and kept on the snapshot, so a
+    request that started on an older snapshot keeps reading that snapshot's figures.
+    """
+    cached = data.derived.get("aggregates")
+    if cached is not None:
+        return cached
+    with _aggregates_lock:
+        cached = data.derived.get("aggregates")
+        if cached is None:
+            with metrics.stage("ifrs17_aggregates.build"):
+                cached = data.derived["aggregates"] = build_aggregates(data)
+        return cached
@@ -1,31 +1,271 @@
 """
-IFRS 17 data loader. Loads sample data from project-root ifrs17_sample_data.json.
+IFRS 17 data loader. Loads sample data from project-root ifrs17_sample_data.json
+(or IFRS17_DATA_PATH) into a columnar store (see services/ifrs17_store.py).
+IFRS17_DATA_PATH may also name a compiled snapshot directory
+(services/ifrs17_snapshot.py), which is memory-mapped instead of parsed.
+
+Each load produces an immutable snapshot whose version is the file's content hash.
+A background watcher polls the file's mtime/size; when it changes, the next
+snapshot (store, indexes, dashboard aggregates, validation report; see
+services/ifrs17_validation.py) is built off the request path and
+swapped in with one reference assignment. Requests keep the snapshot they started
+with, so in-flight work finishes on consistent data.
+
+Rows appended with append_rows() are written to a delta log next to the data
+file (IFRS17_DELTA_LOG) and applied incrementally (services/ifrs17_delta.py). Each
+worker replays new log lines on append and on every watcher tick, and after
+(re)loading the data file; lines written against an older data file are skipped.
 """
 from pathlib import Path
+import hashlib
 import json
-from typing import Any
+import logging
+import os
+import threading
+
+from services import metrics
+from services.ifrs17_aggregates import get_aggregates
+from services.ifrs17_delta import DeltaLog, apply_batch, next_version, prepare_batch
+from services.ifrs17_index import build_indexes
+from services.ifrs17_snapshot import MANIFEST, is_snapshot, open_snapshot, read_manifest
+from services.ifrs17_store import IFRS17Store, build_store
+from services.ifrs17_validation import get_validation
+
+logger = logging.getLogger(__name__)
 
 # Project root (parent of api-server) for ifrs17_sample_data.json
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-_DEFAULT_DATA_PATH = _PROJECT_ROOT / "ifrs17_sample_data.json"
+_DEFAULT_DATA_PATH = Path(os.environ.get("IFRS17_DATA_PATH", _PROJECT_ROOT / "ifrs17_sample_data.json"))
+# Seconds between file checks; 0 disables the watcher
+WATCH_INTERVAL = float(os.environ.get("IFRS17_WATCH_INTERVAL", "5"))
+# Log of appended row batches (default: <data file>.delta.ndjson, or delta.ndjson in a snapshot directory)
+DELTA_LOG_PATH = os.environ.get("IFRS17_DELTA_LOG")
+
+_data_cache: IFRS17Store | None = None
+# (path, mtime_ns, size) of the file behind _data_cache
+_fingerprint: tuple[str, int, int] | None = None
+# Version of the snapshot built from the file (before appends), and how far the delta log was applied
+_base_version: str | None = None
+_delta_offset = 0
+_load_lock = threading.Lock()
+_watcher: threading.Thread | None = None
+_watcher_stop = threading.Event()
+
+
+def _file_fingerprint(path: Path) -> tuple[str, int, int]:
+    # A compiled snapshot changes when its manifest is replaced
+    st = (path / MANIFEST).stat() if path.is_dir() else path.stat()
+    return str(path), st.st_mtime_ns, st.st_size
+
+
+def _map_snapshot(path: Path, fingerprint: tuple[str, int, int]) -> tuple[IFRS17Store, tuple[str, int, int]]:
+    """Open a compiled snapshot directory (columns and indexes memory-mapped, aggregates precomputed)."""
+    manifest = read_manifest(path)
+    if _data_cache is not None and manifest["version"] in (_data_cache.version, _base_version):
+        return _data_cache, fingerprint
+    with metrics.stage("ifrs17_data.open_snapshot"):
+        store = open_snapshot(path, manifest)
+    _validate(store)
+    return store, fingerprint
 
-_data_cache: dict[str, Any] | None = None
 
+def build_snapshot(path: Path) -> tuple[IFRS17Store, tuple[str, int, int]]:
+    """Read the file and build a complete snapshot: store, indexes, aggregates and validation report."""
+    if not path.exists():
+        raise FileNotFoundError(f"IFRS 17 data file not found: {path}")
+    fingerprint = _file_fingerprint(path)
+    if is_snapshot(path):
+        return _map_snapshot(path, fingerprint)
+    with metrics.stage("ifrs17_data.read"):
+        content = path.read_bytes()
+        version = hashlib.sha256(content).hexdigest()[:16]
+    if _data_cache is not None and version in (_data_cache.version, _base_version):
+        # Touched but unchanged: keep the current snapshot (with any appended rows)
+        return _data_cache, fingerprint
+    with metrics.stage("ifrs17_data.parse"):
+        raw = json.loads(content)
+    with metrics.stage("ifrs17_data.build_store"):
+        store = build_store(raw, version=version)
+    with metrics.stage("ifrs17_data.indexes"):
+        store.indexes = build_indexes(store)
+    with metrics.stage("ifrs17_data.aggregates"):
+        get_aggregates(store)
+    _validate(store)
+    return store, fingerprint
 
-def load_data(path: Path | None = None) -> dict[str, Any]:
-    """Load IFRS 17 JSON data. Uses cached copy if already loaded."""
-    global _data_cache
-    if _data_cache is not None:
+
+def _validate(store: IFRS17Store) -> None:
+    """Run the validation stage; violations are logged (and served by /validation), not fatal."""
+    with metrics.stage("ifrs17_data.validation"):
+        report = get_validation(store)
+    if report.violations:
+        failed = ", ".join(f"{r.dataset}: {r.rule} ({len(r)})" for r in report.results if len(r))
+        logger.warning("IFRS 17 data %s has %d validation violation(s): %s", store.version, report.violations, failed)
+
+
+def load_data(path: Path | None = None) -> IFRS17Store:
+    """Current IFRS 17 snapshot (columnar store with indexes). Loads it on first use."""
+    store = _data_cache
+    if store is not None:
+        return store
+    with _load_lock:
+        if _data_cache is None:
+            with metrics.stage("ifrs17_data.load_data"):
+                data_path = path or _DEFAULT_DATA_PATH
+                _install(*build_snapshot(data_path), data_path)
         return _data_cache
+
+
+def current_version(path: Path | None = None) -> str:
+    """Version (content hash) of the current snapshot; loads it on first use."""
+    return load_data(path).version
+
+
+def _swap(store: IFRS17Store, fingerprint: tuple[str, int, int]) -> None:
+    global _data_cache, _fingerprint
+    _fingerprint = fingerprint
+    _data_cache = store
+
+
+def _install(store: IFRS17Store, fingerprint: tuple[str, int, int], path: Path) -> None:
+    """Swap in a snapshot built from the data file, with the delta log replayed on top (under _load_lock)."""
+    global _base_version, _delta_offset
+    if store is not _data_cache:
+        _base_version, _delta_offset = store.version, 0
+        store = _apply_delta_log(store, path)
+    _swap(store, fingerprint)
+
+
+def _delta_log(path: Path) -> DeltaLog:
+    if DELTA_LOG_PATH:
+        return DeltaLog(Path(DELTA_LOG_PATH))
+    return DeltaLog(path / "delta.ndjson" if path.is_dir() else path.with_suffix(".delta.ndjson"))
+
+
+def _apply_delta_log(store: IFRS17Store, path: Path) -> IFRS17Store:
+    """store plus every batch logged since _delta_offset for the current data file (under _load_lock)."""
+    global _delta_offset
+    lines, _delta_offset = _delta_log(path).read(_delta_offset)
+    with metrics.stage("ifrs17_data.apply_deltas"):
+        for line in lines:
+            entry = json.loads(line)
+            if entry.get("base") != _base_version:
+                continue
+            try:
+                batch, links = prepare_batch(store, entry["dataset"], entry["rows"])
+            except ValueError as e:
+                logger.warning("Skipping IFRS 17 delta batch for %s: %s", entry.get("dataset"), e)
+                continue
+            store = apply_batch(store, batch, links, next_version(store.version, line))
+    return store
+
+
+def sync_deltas(path: Path | None = None) -> bool:
+    """Apply batches other workers (or this one) appended to the delta log. True if any were applied."""
+    global _delta_offset
+    data_path = path or _DEFAULT_DATA_PATH
+    if _data_cache is None or _delta_log(data_path).size() == _delta_offset:
+        return False
+    with _load_lock:
+        if _data_cache is None:
+            return False
+        size = _delta_log(data_path).size()
+        if size < _delta_offset:
+            # Log truncated by hand: keep the rows already applied and follow the file from here
+            logger.warning("IFRS 17 delta log shrank; appended rows stay in memory until the next data reload")
+            _delta_offset = size
+            return False
+        store = _apply_delta_log(_data_cache, data_path)
+        if store is _data_cache:
+            return False
+        _swap(store, _fingerprint)
+        return True
+
+
+def append_rows(dataset: str, rows: list[dict], path: Path | None = None) -> IFRS17Store:
+    """
+    Validate a batch of premiums, claims, acquisition_costs or reinsurance rows,
+    log it for every worker and apply it here. Returns the new snapshot.
+    Raises ValueError (naming the offending rows) if the batch is invalid.
+    """
     data_path = path or _DEFAULT_DATA_PATH
-    if not data_path.exists():
-        raise FileNotFoundError(f"IFRS 17 data file not found: {data_path}")
-    with open(data_path, encoding="utf-8") as f:
-        _data_cache = json.load(f)
+    with metrics.stage("ifrs17_data.append_rows"):
+        prepare_batch(load_data(data_path), dataset, rows)
+        _delta_log(data_path).write(_base_version, dataset, rows)
+        sync_deltas(data_path)
     return _data_cache
 
 
+def reload_if_changed(path: Path | None = None) -> bool:
+    """
+    Rebuild and swap the snapshot if the data file changed since it was loaded.
+    Returns True if a new version was swapped in.
+    """
+    data_path = path or _DEFAULT_DATA_PATH
+    try:
+        if _data_cache is not None and _file_fingerprint(data_path) == _fingerprint:
+            return False
+    except FileNotFoundError:
+        return False
+    # Build off the lock so appends and delta syncs keep going meanwhile; take it only to swap
+    previous = _data_cache
+    store, fingerprint = build_snapshot(data_path)
+    with _load_lock:
+        if fingerprint == _fingerprint:
+            # Another thread installed this file while we were building
+            return False
+        if store is previous and previous is not None:
+            # Touched but unchanged: keep the current snapshot, with any rows appended meanwhile
+            _swap(_data_cache, fingerprint)
+            return False
+        _install(store, fingerprint, data_path)
+    logger.info("IFRS 17 data reloaded: version %s", store.version)
+    return True
+
+
+def _watch(path: Path, interval: float) -> None:
+    failed = None
+    while not _watcher_stop.wait(interval):
+        try:
+            if failed is not None and _file_fingerprint(path) == failed:
+                continue
+            reload_if_changed(path)
+            sync_deltas(path)
+            failed = None
+        except FileNotFoundError:
+            continue
+        except Exception:
+            # Bad file (e.g. half-written): keep serving the current snapshot; retry once it changes again
+            failed = _file_fingerprint(path)
+            logger.exception("IFRS 17 data reload failed; keeping version %s", getattr(_data_cache, "version", None))
+
+
+def start_watcher(path: Path | None = None, interval: float | None = None) -> None:
+    """Start the background file watcher (no-op if disabled or already running)."""
+    global _watcher
+    interval = WATCH_INTERVAL if interval is None else interval
+    if interval <= 0 or (_watcher is not None and _watcher.is_alive()):
+        return
+    _watcher_stop.clear()
+    _watcher = threading.Thread(
+        target=_watch, args=(path or _DEFAULT_DATA_PATH, interval), name="ifrs17-data-watcher", daemon=True
+    )
+    _watcher.start()
+
+
+def stop_watcher() -> None:
+    """Stop the background file watcher."""
+    global _watcher
+    _watcher_stop.set()
+    if _watcher is not None:
+        _watcher.join(timeout=5)
+    _watcher = None
+
+
 def clear_cache() -> None:
     """Clear cached data (e.g. for tests or reload)."""
-    global _data_cache
+    global _data_cache, _fingerprint, _base_version, _delta_offset
     _data_cache = None
+    _fingerprint = None
+    _base_version = None
+    _delta_offset = 0
@@ -0,0 +1,252 @@
+"""
+Incremental appends of premiums, claims, acquisition costs and reinsurance rows.
+
+apply_batch() turns a snapshot plus one validated batch into the next snapshot
+without touching the rows already loaded:
+- columns and contract links grow in place into spare capacity (copy-on-write,
+  see ifrs17_store.append_values), so older snapshots still in use by requests
+  keep seeing exactly their rows;
+- filter indexes get a delta segment over the new rows (ifrs17_index.append_to_index);
+- dashboard aggregates are updated from a grid of the batch alone
+  (ifrs17_aggregates.add_rows).
+The cost is proportional to the batch, not to the book.
+
+Batches are also written to an append-only NDJSON log (DeltaLog), one line per
+batch tagged with the version of the data file it applies to. Every uvicorn
+worker replays new lines (services/ifrs17_data.py), so all workers converge on
+the same rows and versions. Lines for another base version (the data file has
+since been replaced) are ignored.
+"""
+import fcntl
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from services.ifrs17_aggregates import add_rows
+from services.ifrs17_index import PostingIndex, SegmentedIndex, append_to_index, index_keys
+from services.ifrs17_store import (
+    CATEGORY,
+    CONTRACT_KEYED,
+    DATE,
+    FLOAT,
+    INT,
+    Column,
+    IFRS17Store,
+    Table,
+    append_values,
+)
+
+APPENDABLE = CONTRACT_KEYED
+MAX_BATCH_ROWS = int(os.environ.get("IFRS17_MAX_APPEND_ROWS", "100000"))
+# Measure and date columns every appended row must give (non-null); claims'
+# paid_date stays optional for open claims
+REQUIRED: dict[str, tuple[str, ...]] = {
+    "premiums": ("gross_premium", "net_premium", "received_date"),
+    "claims": ("incurred_date", "incurred_amount", "paid_amount", "outstanding_reserve"),
+    "acquisition_costs": ("commission", "underwriting_cost", "total"),
+    "reinsurance": ("ceded_premium_ytd", "recoveries_ytd", "reinsurance_asset_balance"),
+}
+# Row numbers listed in a validation error
+_MAX_REPORTED = 10
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _bad_rows(name: str, problem: str, rows: list[int]) -> ValueError:
+    shown = ", ".join(str(r) for r in rows[:_MAX_REPORTED])
+    more = f" (+{len(rows) - _MAX_REPORTED} more)" if len(rows) > _MAX_REPORTED else ""
+    return ValueError(f"{name}: {problem} in row(s) {shown}{more}")
+
+
+def _check_strings(name: str, raw: list[Any], problem: str) -> None:
+    bad = [i for i, v in enumerate(raw) if v is not None and not isinstance(v, str)]
+    if bad:
+        raise _bad_rows(name, problem, bad)
+
+
+def _encode_column(name: str, col: Column, raw: list[Any]) -> Column:
+    """Batch values of one column as a column matching `col` (its kind may widen INT to FLOAT)."""
+    if col.kind == CATEGORY:
+        _check_strings(name, raw, "expected a string")
+        return Column(CATEGORY, col.dictionary.encode(raw), col.dictionary)
+    if col.kind == DATE:
+        _check_strings(name, raw, "expected a YYYY-MM-DD date")
+        try:
+            return Column(DATE, np.array(["NaT" if v is None else v for v in raw], dtype="datetime64[D]"))
+        except ValueError:
+            bad = [i for i, v in enumerate(raw) if v is not None and not _is_date(v)]
+            raise _bad_rows(name, "expected a YYYY-MM-DD date", bad) from None
+    bad = [i for i, v in enumerate(raw) if v is not None and not _is_number(v)]
+    if bad:
+        raise _bad_rows(name, "expected a number", bad)
+    present = [v for v in raw if v is not None]
+    # A float in an integer column makes it a float column, as it would at load time
+    if col.kind == INT and all(isinstance(v, int) for v in present):
+        if len(present) == len(raw) and col.values.dtype.kind == "i":
+            return Column(INT, np.array(raw, dtype=np.int64))
+        return Column(INT, np.array([np.nan if v is None else v for v in raw], dtype=np.float64))
+    # Ints in a float column keep decoding as ints (Column.ints)
+    ints = np.fromiter((isinstance(v, int) for v in raw), dtype=bool, count=len(raw))
+    values = np.array([np.nan if v is None else v for v in raw], dtype=np.float64)
+    return Column(FLOAT, values, ints=ints if ints.any() else None)
+
+
+def _is_date(value: str) -> bool:
+    try:
+        np.datetime64(value, "D")
+        return True
+    except ValueError:
+        return False
+
+
+def _contract_rows(data: IFRS17Store, codes: np.ndarray) -> np.ndarray:
+    """Row in contracts for each contract_id code (-1 if unknown), via the contracts index."""
+    index = data.indexes.get("contracts", {}).get("contract_id")
+    if index is None:
+        index = PostingIndex.build(data.table("contracts").values("contract_id"))
+    if isinstance(index, SegmentedIndex):
+        index = index.merged()
+    rows = np.full(len(codes), -1, dtype=np.int64)
+    if not len(index.keys):
+        return rows
+    pos = np.minimum(np.searchsorted(index.keys, codes), len(index.keys) - 1)
+    found = (codes >= 0) & (index.keys[pos] == codes)
+    rows[found] = index.order[index.offsets[pos[found]]]
+    return rows
+
+
+def prepare_batch(data: IFRS17Store, dataset: str, rows: list[dict[str, Any]]) -> tuple[Table, np.ndarray]:
+    """
+    Validate rows for `dataset` against the snapshot and encode them as a Table
+    (plus each row's contract row). Raises ValueError naming the offending rows:
+    unknown dataset or columns, missing required values (REQUIRED), wrong value
+    types, bad dates, unknown contract_id.
+    """
+    if dataset not in APPENDABLE:
+        raise ValueError(f"Rows can only be appended to: {', '.join(APPENDABLE)}")
+    if not rows:
+        raise ValueError("No rows to append")
+    if len(rows) > MAX_BATCH_ROWS:
+        raise ValueError(f"At most {MAX_BATCH_ROWS} rows per batch")
+    table = data.table(dataset)
+    if not table.columns:
+        raise ValueError(f"Dataset {dataset} is not loaded")
+    unknown = sorted({k for r in rows for k in r} - set(table.columns))
+    if unknown:
+        raise ValueError(f"Unknown column(s) for {dataset}: {', '.join(unknown)}")
+
+    for name in REQUIRED[dataset]:
+        if name in table.columns:
+            missing = [i for i, r in enumerate(rows) if r.get(name) is None]
+            if missing:
+                raise _bad_rows(name, "missing", missing)
+
+    ids = [r.get("contract_id") for r in rows]
+    missing = [i for i, v in enumerate(ids) if not isinstance(v, str)]
+    if missing:
+        raise _bad_rows("contract_id", "missing", missing)
+    id_dict = data.dictionaries["contract_id"]
+    codes = np.fromiter((id_dict.code(v) for v in ids), dtype=np.int64, count=len(ids))
+    links = _contract_rows(data, codes)
+    orphans = np.flatnonzero(links < 0).tolist()
+    if orphans:
+        raise _bad_rows("contract_id", "no such contract", orphans)
+
+    # Check every column before encoding any, so a rejected batch adds nothing to the dictionaries
+    for name, col in table.columns.items():
+        raw = [r.get(name) for r in rows]
+        if col.kind == CATEGORY:
+            _check_strings(name, raw, "expected a string")
+        else:
+            _encode_column(name, col, raw)
+    columns = {name: _encode_column(name, col, [r.get(name) for r in rows]) for name, col in table.columns.items()}
+    return Table(dataset, columns, len(rows)), links
+
+
+def apply_batch(data: IFRS17Store, batch: Table, links: np.ndarray, version: str) -> IFRS17Store:
+    """Next snapshot: `data` plus the prepared batch (from prepare_batch). `data` is unchanged."""
+    dataset = batch.name
+    table = data.table(dataset)
+    n = table.n_rows
+    columns = {
+        name: col.append(b.values, kind=b.kind, extra_ints=b.ints)
+        for name, col in table.columns.items()
+        for b in [batch.columns[name]]
+    }
+    tables = {**data.tables, dataset: Table(dataset, columns, n + batch.n_rows)}
+    old_links = data.contract_rows.get(dataset, np.full(n, -1, dtype=np.int64))
+    new_links, spare = append_values(old_links, links, data.link_spare.get(dataset))
+
+    # The batch on its own, for index keys and the aggregate grid
+    batch_store = IFRS17Store(
+        metadata=data.metadata,
+        tables={dataset: batch, "contracts": data.table("contracts")},
+        dictionaries=data.dictionaries,
+        contract_rows={dataset: links},
+    )
+    indexes = dict(data.indexes)
+    if dataset in indexes:
+        indexes[dataset] = {
+            key: append_to_index(indexes[dataset][key], values, n)
+            for key, values in index_keys(batch_store, dataset).items()
+        }
+    store = IFRS17Store(
+        metadata=data.metadata,
+        tables=tables,
+        dictionaries=data.dictionaries,
+        contract_rows={**data.contract_rows, dataset: new_links},
+        version=version,
+        indexes=indexes,
+        link_spare={**data.link_spare, dataset: spare},
+    )
+    aggregates = data.derived.get("aggregates")
+    if aggregates is not None:
+        store.derived["aggregates"] = add_rows(aggregates, store, batch_store, dataset)
+    return store
+
+
+def next_version(version: str, line: bytes) -> str:
+    """Version after applying one log line (the same in every worker)."""
+    return hashlib.sha256(version.encode("utf-8") + line).hexdigest()[:16]
+
+
+class DeltaLog:
+    """Append-only NDJSON file of batches: {"base": <data version>, "dataset": ..., "rows": [...]}."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def write(self, base: str, dataset: str, rows: list[dict[str, Any]]) -> None:
+        line = json.dumps({"base": base, "dataset": dataset, "rows": rows}, separators=(",", ":")) + "\n"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            # One locked write per batch, so lines from concurrent workers never interleave
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(line.encode("utf-8"))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read(self, offset: int) -> tuple[list[bytes], int]:
+        """Complete lines after byte `offset` and the offset after the last one."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = chunk.rfind(b"\n") + 1
+        return chunk[:end].splitlines(), offset + end
@@ -0,0 +1,137 @@
+"""
+Drill-down from dashboard and reconciliation figures to the source rows behind them.
+
+The aggregation stage keeps a lineage index per dataset (Aggregates.lineage):
+the row ids of every (portfolio, cohort) cell in CSR form. A figure for one
+portfolio, one cohort, both, or the whole book covers a set of cells; its rows
+are read straight from those cells' posting lists, and the cell row counts in
+the aggregate grid give the cell where a page starts. A page costs
+O(cells + rows returned), whatever the size of the dataset.
+"""
+from typing import Any
+
+import numpy as np
+
+from services import metrics
+from services.ifrs17_aggregates import MEASURES, get_aggregates
+from services.ifrs17_data import load_data
+from services.ifrs17_store import IFRS17Store
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+# Summary and by_portfolio keys -> (dataset, column summed; None counts rows)
+FIGURES: dict[str, tuple[str, str | None]] = {
+    "gross_premium": ("premiums", "gross_premium"),
+    "premium": ("premiums", "gross_premium"),
+    "net_premium": ("premiums", "net_premium"),
+    "claims_incurred": ("claims", "incurred_amount"),
+    "claims": ("claims", "incurred_amount"),
+    "claims_paid": ("claims", "paid_amount"),
+    "claims_outstanding_reserve": ("claims", "outstanding_reserve"),
+    "insurance_liability": ("liability_movements", "closing_balance"),
+    "liability": ("liability_movements", "closing_balance"),
+    "insurance_liability_opening": ("liability_movements", "opening_balance"),
+    "opening": ("liability_movements", "opening_balance"),
+    "closing_csm": ("csm_movements", "closing_csm"),
+    "csm": ("csm_movements", "closing_csm"),
+    "insurance_revenue_csm_release": ("csm_movements", "csm_release_to_pl"),
+    "reinsurance_asset": ("reinsurance", "reinsurance_asset_balance"),
+    "acquisition_costs_total": ("acquisition_costs", "total"),
+    "contracts_count": ("contracts", None),
+    "count": ("contracts", None),
+}
+
+
+def _figure(figure: str | None, dataset: str | None, column: str | None) -> tuple[str, str | None]:
+    """(dataset, column) of a named figure, or of an explicit dataset and column."""
+    if figure is not None:
+        if dataset is not None or column is not None:
+            raise ValueError("Give either figure or dataset (and column), not both")
+        if figure not in FIGURES:
+            raise ValueError(f"Unknown figure: {figure} (choose from {', '.join(FIGURES)})")
+        return FIGURES[figure]
+    if dataset is None:
+        raise ValueError("Give a figure or a dataset")
+    if dataset not in MEASURES:
+        raise ValueError(f"No figures are aggregated from {dataset} (choose from {', '.join(MEASURES)})")
+    if column is not None and column not in MEASURES[dataset]:
+        raise ValueError(f"{column} is not aggregated for {dataset} (choose from {', '.join(MEASURES[dataset])})")
+    return dataset, column
+
+
+@metrics.timed()
+def drill_down(
+    figure: str | None = None,
+    dataset: str | None = None,
+    column: str | None = None,
+    portfolio: str | None = None,
+    cohort_year: int | None = None,
+    offset: int = 0,
+    limit: int = DEFAULT_LIMIT,
+    data: IFRS17Store | None = None,
+) -> dict[str, Any]:
+    """
+    Source rows behind one figure: a summary / by_portfolio key (`figure`) or a
+    dataset column as in the reconciliations (`dataset`, `column`; no column
+    counts rows), for one portfolio and/or cohort year or the whole book.
+    Returns {"figure", "dataset", "column", "portfolio", "cohort_year", "value",
+    "total", "offset", "rows"}; `value` equals the dashboard figure and each row
+    is the source record plus its row id, portfolio and cohort_year.
+    """
+    data = load_data() if data is None else data
+    dataset, column = _figure(figure, dataset, column)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    aggregates = get_aggregates(data)
+    grid = aggregates.grids[dataset]
+    n_ports, n_cohorts = grid.count.shape
+
+    # Cells of the figure, in (portfolio, cohort) order; the last slot on each axis holds unknowns
+    ports = np.arange(n_ports)
+    if portfolio is not None:
+        known = portfolio in aggregates.portfolios
+        ports = np.array([aggregates.portfolios.index(portfolio)] if known else [], dtype=np.int64)
+    years = np.arange(n_cohorts)
+    if cohort_year is not None:
+        known = cohort_year in aggregates.cohorts
+        years = np.array([aggregates.cohorts.index(cohort_year)] if known else [], dtype=np.int64)
+    cells = (ports[:, None] * n_cohorts + years[None, :]).ravel()
+    counts = grid.count.ravel()[cells]
+    total = int(counts.sum())
+    value = total if column is None else grid.number(column, grid.sums[column].ravel()[cells].sum())
+
+    # First cell of the page, then whole or partial posting lists until the page is full
+    ends = np.cumsum(counts)
+    i = int(np.searchsorted(ends, offset, side="right"))
+    skip = offset - (int(ends[i - 1]) if i else 0)
+    lineage = aggregates.lineage[dataset]
+    ids, row_cells = [], []
+    want = limit
+    while want > 0 and i < len(cells):
+        part = lineage.rows(int(cells[i]))[skip:skip + want]
+        ids.append(part)
+        row_cells.append(np.full(len(part), cells[i]))
+        want -= len(part)
+        skip = 0
+        i += 1
+    ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+    row_cells = np.concatenate(row_cells) if row_cells else np.zeros(0, dtype=np.int64)
+
+    names = aggregates.portfolios + [None]
+    years_of = aggregates.cohorts + [None]
+    rows = [
+        {"row": row, "portfolio": names[cell // n_cohorts], "cohort_year": years_of[cell % n_cohorts], **record}
+        for row, cell, record in zip(ids.tolist(), row_cells.tolist(), data.table(dataset).to_records(ids))
+    ]
+    return {
+        "figure": figure,
+        "dataset": dataset,
+        "column": column,
+        "portfolio": portfolio,
+        "cohort_year": cohort_year,
+        "value": value,
+        "total": total,
+        "offset": offset,
+        "rows": rows,
+    }
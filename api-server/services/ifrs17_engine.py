@@ -1,22 +1,69 @@
 """
 IFRS 17 calculation engine. Aggregations, reconciliations, and dashboard metrics.
+Reads the columnar store from services/ifrs17_data.py. Dashboard figures come from
+the cached aggregation stage (services/ifrs17_aggregates.py).
+
+Backend is chosen with env IFRS17_BACKEND: "memory" (default, this module) or
+"sql" (services/ifrs17_sql.py: GROUP BY queries in the SQLite database).
+Every public function is timed as stage ifrs17_engine.<name> (services/metrics.py).
 """
-from typing import Any
+import base64
+import functools
+import json
+import os
+from typing import Any, Callable, Iterator
+
+import numpy as np
+
+from services import metrics
+from services.ifrs17_aggregates import get_aggregates
+from services.ifrs17_data import current_version, load_data
+from services.ifrs17_index import select_rows
+from services.ifrs17_store import IFRS17Store
+
+BACKEND = os.environ.get("IFRS17_BACKEND", "memory").strip().lower()
+
+
+def _sql_pushdown(fn: Callable) -> Callable:
+    """
+    Delegate to the SQL backend's function of the same name when IFRS17_BACKEND=sql.
+    The in-memory implementation stays reachable as `<function>._memory_impl`
+    (copied onto outer decorators by functools.wraps), e.g. for backend comparisons.
+    """
 
-from services.ifrs17_data import load_data
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # An explicit store (e.g. one reporting period) is always served from memory
+        if BACKEND == "sql" and kwargs.get("data") is None:
+            from services import ifrs17_sql
+            return getattr(ifrs17_sql, fn.__name__)(*args, **kwargs)
+        return fn(*args, **kwargs)
 
+    wrapper._memory_impl = fn
+    return wrapper
 
-def _trend_pct(current: float, opening: float) -> float | None:
-    """Return percentage change (current vs opening); None if opening is 0."""
-    if opening == 0:
+
+def _store(data: IFRS17Store | None) -> IFRS17Store:
+    """The given store (e.g. one reporting period, see ifrs17_periods) or the current snapshot."""
+    return load_data() if data is None else data
+
+
+def data_version() -> str | None:
+    """
+    Version of the data behind every response (for ETags). None with the SQL
+    backend, where tables can change between requests without a version.
+    """
+    if BACKEND == "sql":
         return None
-    return round((current - opening) / opening * 100, 1)
+    return current_version()
 
 
-def get_metadata() -> dict[str, Any]:
+@metrics.timed()
+@_sql_pushdown
+def get_metadata(data: IFRS17Store | None = None) -> dict[str, Any]:
     """Reporting metadata: date, currency, portfolios."""
-    data = load_data()
-    meta = data.get("metadata", {})
+    data = _store(data)
+    meta = data.metadata
     return {
         "reporting_date": meta.get("reporting_date"),
         "currency": meta.get("currency"),
@@ -25,225 +72,222 @@ def get_metadata() -> dict[str, Any]:
     }
 
 
-def _build_by_portfolio(data: dict[str, Any]) -> dict[str, dict[str, Any]]:
-    """Build by-portfolio aggregates: count, premium, claims, liability, csm, opening."""
-    contracts = data.get("contracts", [])
-    premiums = data.get("premiums", [])
-    claims = data.get("claims", [])
-    lm = data.get("liability_movements", [])
-    cm = data.get("csm_movements", [])
-    contract_by_id = {c["contract_id"]: c for c in contracts}
-    ports = list({c["portfolio"] for c in contracts}) or data.get("metadata", {}).get("portfolios", [])
-    by_portfolio: dict[str, dict[str, Any]] = {
-        p: {"premium": 0, "claims": 0, "liability": 0, "csm": 0, "count": 0, "opening": 0}
-        for p in ports
-    }
-    for c in contracts:
-        p = c["portfolio"]
-        if p not in by_portfolio:
-            by_portfolio[p] = {"premium": 0, "claims": 0, "liability": 0, "csm": 0, "count": 0, "opening": 0}
-        by_portfolio[p]["count"] += 1
-    for r in premiums:
-        c = contract_by_id.get(r["contract_id"])
-        if c and c["portfolio"] in by_portfolio:
-            by_portfolio[c["portfolio"]]["premium"] += r.get("gross_premium", 0)
-    for r in claims:
-        c = contract_by_id.get(r["contract_id"])
-        if c and c["portfolio"] in by_portfolio:
-            by_portfolio[c["portfolio"]]["claims"] += r.get("incurred_amount", 0)
-    for r in lm:
-        if r["portfolio"] in by_portfolio:
-            by_portfolio[r["portfolio"]]["liability"] += r.get("closing_balance", 0)
-            by_portfolio[r["portfolio"]]["opening"] += r.get("opening_balance", 0)
-    for r in cm:
-        if r["portfolio"] in by_portfolio:
-            by_portfolio[r["portfolio"]]["csm"] += r.get("closing_csm", 0)
-    return by_portfolio
-
-
-def get_dashboard_summary() -> dict[str, Any]:
-    """Totals and trend percentages for dashboard cards."""
-    data = load_data()
-    lm = data.get("liability_movements", [])
-    cm = data.get("csm_movements", [])
-    prem = data.get("premiums", [])
-    cl = data.get("claims", [])
-    ac = data.get("acquisition_costs", [])
-    rein = data.get("reinsurance", [])
-
-    total_liability_close = sum(r.get("closing_balance", 0) for r in lm)
-    total_liability_open = sum(r.get("opening_balance", 0) for r in lm)
-    total_csm_close = sum(r.get("closing_csm", 0) for r in cm)
-    total_csm_open = sum(r.get("opening_csm", 0) for r in cm)
-    total_csm_release = sum(r.get("csm_release_to_pl", 0) or 0 for r in cm)
-    total_gross = sum(r.get("gross_premium", 0) for r in prem)
-    total_net = sum(r.get("net_premium", 0) for r in prem)
-    total_incurred = sum(r.get("incurred_amount", 0) for r in cl)
-    total_paid = sum(r.get("paid_amount", 0) or 0 for r in cl)
-    total_outstanding = sum(r.get("outstanding_reserve", 0) or 0 for r in cl)
-    total_acq = sum(r.get("total", 0) for r in ac)
-    total_rein_asset = sum(r.get("reinsurance_asset_balance", 0) for r in rein)
-    contracts_count = len(data.get("contracts", []))
-
-    loss_ratio_pct = round(total_incurred / total_net * 100, 1) if total_net else None
-    liability_trend = _trend_pct(total_liability_close, total_liability_open)
-    csm_trend = _trend_pct(total_csm_close, total_csm_open)
-
-    by_portfolio = _build_by_portfolio(data)
-    # Portfolio order from metadata
-    ports = data.get("metadata", {}).get("portfolios", list(by_portfolio.keys()))
+@metrics.timed()
+def _build_by_portfolio(data: IFRS17Store) -> dict[str, dict[str, Any]]:
+    """By-portfolio aggregates: count, premium, claims, liability, csm, opening."""
+    return get_aggregates(data).by_portfolio
 
-    return {
-        "insurance_liability": total_liability_close,
-        "insurance_liability_opening": total_liability_open,
-        "liability_trend_pct": liability_trend,
-        "reinsurance_asset": total_rein_asset,
-        "closing_csm": total_csm_close,
-        "csm_trend_pct": csm_trend,
-        "gross_premium": total_gross,
-        "net_premium": total_net,
-        "claims_incurred": total_incurred,
-        "loss_ratio_pct": loss_ratio_pct,
-        "contracts_count": contracts_count,
-        "insurance_revenue_csm_release": total_csm_release,
-        "acquisition_costs_total": total_acq,
-        "claims_paid": total_paid,
-        "claims_outstanding_reserve": total_outstanding,
-        "by_portfolio": {
-            p: by_portfolio.get(p, {"premium": 0, "claims": 0, "liability": 0, "csm": 0, "count": 0, "opening": 0})
-            for p in ports
-        },
-        "portfolios": ports,
-    }
+
+@metrics.timed()
+@_sql_pushdown
+def get_dashboard_summary(data: IFRS17Store | None = None) -> dict[str, Any]:
+    """Totals and trend percentages for dashboard cards."""
+    return get_aggregates(_store(data)).summary
 
 
-def get_dashboard_liability_trend() -> dict[str, Any]:
+@metrics.timed()
+@_sql_pushdown
+def get_dashboard_liability_trend(data: IFRS17Store | None = None) -> dict[str, Any]:
     """Liability by cohort year for line chart. Labels and values."""
-    data = load_data()
-    lm = data.get("liability_movements", [])
-    cohort_years = sorted({r["cohort_year"] for r in lm})
-    values = [
-        sum(r["closing_balance"] for r in lm if r["cohort_year"] == y)
-        for y in cohort_years
-    ]
-    return {"labels": [str(y) for y in cohort_years], "values": values}
+    return get_aggregates(_store(data)).liability_trend
 
 
-def get_dashboard_csm_trend() -> dict[str, Any]:
+@metrics.timed()
+@_sql_pushdown
+def get_dashboard_csm_trend(data: IFRS17Store | None = None) -> dict[str, Any]:
     """CSM by cohort year for line chart."""
-    data = load_data()
-    cm = data.get("csm_movements", [])
-    cohort_years = sorted({r["cohort_year"] for r in cm})
-    values = [
-        sum(r["closing_csm"] for r in cm if r["cohort_year"] == y)
-        for y in cohort_years
-    ]
-    return {"labels": [str(y) for y in cohort_years], "values": values}
+    return get_aggregates(_store(data)).csm_trend
 
 
-def get_dashboard_portfolio_comparison() -> list[dict[str, Any]]:
+@metrics.timed()
+@_sql_pushdown
+def get_dashboard_portfolio_comparison(data: IFRS17Store | None = None) -> list[dict[str, Any]]:
     """Table rows: portfolio, contracts, gross premium, claims, loss %, closing liability, closing CSM."""
-    summary = get_dashboard_summary()
-    rows = []
-    for p in summary["portfolios"]:
-        bp = summary["by_portfolio"].get(p, {})
-        premium = bp.get("premium", 0) or 0
-        claims = bp.get("claims", 0) or 0
-        loss_pct = round(claims / premium * 100, 1) if premium else None
-        rows.append({
-            "portfolio": p,
-            "contracts": bp.get("count", 0),
-            "gross_premium": premium,
-            "claims": claims,
-            "loss_ratio_pct": loss_pct,
-            "closing_liability": bp.get("liability", 0),
-            "closing_csm": bp.get("csm", 0),
-        })
-    return rows
-
-
-def get_reconciliation_liability() -> dict[str, Any]:
-    """Liability reconciliation: rows by portfolio/cohort plus totals."""
-    data = load_data()
-    lm = data.get("liability_movements", [])
-    rows = [
-        {
-            "portfolio": r["portfolio"],
-            "cohort_year": r["cohort_year"],
-            "opening_balance": r.get("opening_balance", 0),
-            "new_contracts": r.get("new_contracts", 0),
-            "premiums_received": r.get("premiums_received", 0),
-            "claims_incurred": r.get("claims_incurred", 0),
-            "csm_release": r.get("csm_release", 0),
-            "experience_variance": r.get("experience_variance", 0),
-            "closing_balance": r.get("closing_balance", 0),
-        }
-        for r in lm
-    ]
-    totals = {
-        "opening_balance": sum(r["opening_balance"] for r in rows),
-        "new_contracts": sum(r["new_contracts"] for r in rows),
-        "premiums_received": sum(r["premiums_received"] for r in rows),
-        "claims_incurred": sum(r["claims_incurred"] for r in rows),
-        "csm_release": sum(r["csm_release"] for r in rows),
-        "experience_variance": sum(r["experience_variance"] for r in rows),
-        "closing_balance": sum(r["closing_balance"] for r in rows),
+    return get_aggregates(_store(data)).portfolio_comparison
+
+
+@metrics.timed()
+@_sql_pushdown
+def get_dashboard(data: IFRS17Store | None = None) -> dict[str, Any]:
+    """Summary, liability trend, CSM trend and portfolio comparison from one aggregation."""
+    agg = get_aggregates(_store(data))
+    return {
+        "summary": agg.summary,
+        "liability_trend": agg.liability_trend,
+        "csm_trend": agg.csm_trend,
+        "portfolio_comparison": agg.portfolio_comparison,
     }
+
+
+# Dataset order of the filtered get_data() response
+DATA_KEYS = (
+    "contracts",
+    "premiums",
+    "claims",
+    "acquisition_costs",
+    "reinsurance",
+    "assumptions",
+    "discount_rates",
+    "liability_movements",
+    "csm_movements",
+    "claims_development",
+)
+
+LIABILITY_COLUMNS = (
+    "opening_balance",
+    "new_contracts",
+    "premiums_received",
+    "claims_incurred",
+    "csm_release",
+    "experience_variance",
+    "closing_balance",
+)
+
+CSM_COLUMNS = (
+    "opening_csm",
+    "initial_recognition",
+    "changes_in_estimates",
+    "csm_release_to_pl",
+    "closing_csm",
+)
+
+
+@metrics.timed()
+@_sql_pushdown
+def get_reconciliation_liability(data: IFRS17Store | None = None) -> dict[str, Any]:
+    """Liability reconciliation: rows by portfolio/cohort plus totals."""
+    data = _store(data)
+    lm = data.table("liability_movements")
+    rows = lm.select_records(("portfolio", "cohort_year") + LIABILITY_COLUMNS)
+    grid = get_aggregates(data).grids["liability_movements"]
+    totals = {c: grid.total(c) for c in LIABILITY_COLUMNS}
     return {"rows": rows, "totals": totals}
 
 
-def get_reconciliation_csm() -> dict[str, Any]:
+@metrics.timed()
+@_sql_pushdown
+def get_reconciliation_csm(data: IFRS17Store | None = None) -> dict[str, Any]:
     """CSM reconciliation: rows by portfolio/cohort plus totals."""
-    data = load_data()
-    cm = data.get("csm_movements", [])
-    rows = [
-        {
-            "portfolio": r["portfolio"],
-            "cohort_year": r["cohort_year"],
-            "opening_csm": r.get("opening_csm", 0),
-            "initial_recognition": r.get("initial_recognition", 0),
-            "changes_in_estimates": r.get("changes_in_estimates", 0),
-            "csm_release_to_pl": r.get("csm_release_to_pl", 0),
-            "closing_csm": r.get("closing_csm", 0),
-        }
-        for r in cm
-    ]
-    total_release = sum(r["csm_release_to_pl"] for r in rows)
-    totals = {
-        "opening_csm": sum(r["opening_csm"] for r in rows),
-        "initial_recognition": sum(r["initial_recognition"] for r in rows),
-        "changes_in_estimates": sum(r["changes_in_estimates"] for r in rows),
-        "csm_release_to_pl": total_release,
-        "closing_csm": sum(r["closing_csm"] for r in rows),
-    }
-    return {"rows": rows, "totals": totals, "insurance_revenue_from_csm_release": total_release}
+    data = _store(data)
+    cm = data.table("csm_movements")
+    rows = cm.select_records(("portfolio", "cohort_year") + CSM_COLUMNS)
+    grid = get_aggregates(data).grids["csm_movements"]
+    totals = {c: grid.total(c) for c in CSM_COLUMNS}
+    return {"rows": rows, "totals": totals, "insurance_revenue_from_csm_release": totals["csm_release_to_pl"]}
 
 
+@metrics.timed()
+@_sql_pushdown
 def get_data(
     portfolio: str | None = None,
     cohort_year: int | None = None,
+    contract_id: str | None = None,
+    data: IFRS17Store | None = None,
 ) -> dict[str, Any]:
-    """Raw IFRS 17 data, optionally filtered by portfolio or cohort."""
-    data = load_data()
-    if not portfolio and cohort_year is None:
-        return data
-    contracts = data.get("contracts", [])
-    if portfolio:
-        contract_ids = {c["contract_id"] for c in contracts if c["portfolio"] == portfolio}
-    else:
-        contract_ids = {c["contract_id"] for c in contracts}
-    if cohort_year is not None:
-        contract_ids &= {c["contract_id"] for c in contracts if c.get("cohort_year") == cohort_year}
-    out = {"metadata": data.get("metadata"), "contracts": [c for c in contracts if c["contract_id"] in contract_ids]}
-    for key in ("premiums", "claims", "acquisition_costs", "reinsurance"):
-        out[key] = [r for r in data.get(key, []) if r.get("contract_id") in contract_ids]
-    for key in ("assumptions", "discount_rates", "liability_movements", "csm_movements", "claims_development"):
-        items = data.get(key, [])
-        if key == "liability_movements" or key == "csm_movements":
-            items = [r for r in items if (portfolio is None or r.get("portfolio") == portfolio) and (cohort_year is None or r.get("cohort_year") == cohort_year)]
-        elif key == "claims_development" and cohort_year is not None:
-            items = [r for r in items if r.get("cohort_year") == cohort_year]
-        elif key == "assumptions" and portfolio:
-            items = [r for r in items if r.get("portfolio") == portfolio]
-        out[key] = items
+    """Raw IFRS 17 data, optionally filtered by portfolio, cohort or contract (via load-time indexes)."""
+    data = _store(data)
+    filters = data_filters(portfolio, cohort_year, contract_id)
+    if all(v is None for v in filters.values()):
+        return data.to_dict()
+    out: dict[str, Any] = {"metadata": data.metadata}
+    for key in DATA_KEYS:
+        out[key] = data.table(key).to_records(select_rows(data, key, filters))
     return out
+
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+def data_filters(portfolio: str | None, cohort_year: int | None, contract_id: str | None) -> dict[str, Any]:
+    return {"portfolio": portfolio or None, "cohort_year": cohort_year, "contract_id": contract_id or None}
+
+
+def selected_datasets(datasets: list[str] | None) -> tuple[str, ...]:
+    """The requested datasets in DATA_KEYS order (all when none); unknown names raise ValueError."""
+    if not datasets:
+        return DATA_KEYS
+    unknown = [d for d in datasets if d not in DATA_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown dataset: {', '.join(unknown)}")
+    return tuple(d for d in DATA_KEYS if d in datasets)
+
+
+def encode_cursor(dataset: str, offset: int, version: str) -> str:
+    raw = json.dumps({"d": dataset, "o": offset, "v": version}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int, str]:
+    """Return (dataset, offset, version). Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        obj = json.loads(raw)
+        return str(obj["d"]), int(obj["o"]), str(obj["v"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+@metrics.timed()
+@_sql_pushdown
+def get_data_page(
+    dataset: str | None = None,
+    portfolio: str | None = None,
+    cohort_year: int | None = None,
+    contract_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    data: IFRS17Store | None = None,
+) -> dict[str, Any]:
+    """
+    One page of a dataset's rows (same filters as get_data). Pass `next_cursor`
+    back as `cursor` with the same filters to get the next page. Only the
+    requested page is decoded, so memory is bounded by `limit`.
+    Raises ValueError for an unknown dataset or an invalid/expired cursor.
+    """
+    data = _store(data)
+    offset = 0
+    if cursor:
+        cursor_dataset, offset, version = decode_cursor(cursor)
+        if dataset and dataset != cursor_dataset:
+            raise ValueError("Cursor belongs to a different dataset")
+        if version != data.version:
+            raise ValueError("Cursor expired: data has changed")
+        dataset = cursor_dataset
+    if dataset not in DATA_KEYS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    table = data.table(dataset)
+    rows = select_rows(data, dataset, data_filters(portfolio, cohort_year, contract_id))
+    total = len(table) if rows is None else len(rows)
+    end = min(offset + limit, total)
+    page = np.arange(offset, end) if rows is None else rows[offset:end]
+    return {
+        "dataset": dataset,
+        "total": total,
+        "rows": table.to_records(page),
+        "next_cursor": encode_cursor(dataset, end, data.version) if end < total else None,
+    }
+
+
+@metrics.timed()
+@_sql_pushdown
+def iter_data_rows(
+    portfolio: str | None = None,
+    cohort_year: int | None = None,
+    contract_id: str | None = None,
+    datasets: list[str] | None = None,
+    data: IFRS17Store | None = None,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """
+    Lazily yield (dataset, row) for metadata and every (or each selected) dataset.
+    Rows are decoded in small batches, so a consumer streaming them out holds
+    only one batch at a time. Unknown datasets raise ValueError before anything is yielded.
+    """
+    selected = selected_datasets(datasets)
+    data = _store(data)
+    filters = data_filters(portfolio, cohort_year, contract_id)
+    yield "metadata", data.metadata
+    for key in selected:
+        for row in data.table(key).iter_records(select_rows(data, key, filters)):
+            yield key, row
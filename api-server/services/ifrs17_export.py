@@ -0,0 +1,157 @@
+"""
+Excel (.xlsx) and CSV export of the reconciliations, the portfolio comparison
+and filtered raw data.
+
+An export is a list of Sheets: a header and a lazy row iterator read from the
+columnar store a batch at a time, so memory does not grow with the row count.
+- CSV: rows are written to a small buffer that is yielded every CSV_CHUNK_BYTES,
+  so the response streams while rows are still being produced.
+- Excel: openpyxl write-only mode appends each row straight to a temporary
+  sheet file; the finished workbook (a zip) is then streamed from a temporary
+  file in XLSX_CHUNK_BYTES pieces. Neither step holds the workbook in memory.
+
+Exports always read the in-memory snapshot (services/ifrs17_data.py), whatever
+the engine backend.
+"""
+import csv
+from dataclasses import dataclass
+import io
+import tempfile
+from typing import Any, Iterable, Iterator
+
+from services import metrics
+from services.ifrs17_data import load_data
+from services.ifrs17_engine import (
+    CSM_COLUMNS,
+    DATA_KEYS,
+    LIABILITY_COLUMNS,
+    data_filters,
+    get_dashboard_portfolio_comparison,
+)
+from services.ifrs17_index import select_rows
+from services.ifrs17_store import IFRS17Store
+
+FORMATS = ("csv", "xlsx")
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+REPORTS = ("liability-reconciliation", "csm-reconciliation", "portfolio-comparison", "data")
+
+CSV_CHUNK_BYTES = 64 * 1024
+XLSX_CHUNK_BYTES = 256 * 1024
+# Excel limit on sheet name length
+_SHEET_NAME_MAX = 31
+
+_PORTFOLIO_COMPARISON_COLUMNS = (
+    "portfolio",
+    "contracts",
+    "gross_premium",
+    "claims",
+    "loss_ratio_pct",
+    "closing_liability",
+    "closing_csm",
+)
+
+
+@dataclass
+class Sheet:
+    """One table of an export: sheet name, header row and lazily produced rows."""
+
+    name: str
+    header: tuple[str, ...]
+    rows: Iterable[tuple[Any, ...]]
+
+
+def _reconciliation(data: IFRS17Store, dataset: str, columns: tuple[str, ...], filters: dict[str, Any]) -> Sheet:
+    """Rows by portfolio/cohort followed by a Total row."""
+    table = data.table(dataset)
+    rows = select_rows(data, dataset, filters)
+    header = ("portfolio", "cohort_year") + columns
+
+    def produce() -> Iterator[tuple[Any, ...]]:
+        yield from table.iter_rows(header, rows)
+        yield ("Total", None) + tuple(table.sum(c, rows) for c in columns)
+
+    return Sheet(dataset, header, produce())
+
+
+def build_report(
+    report: str,
+    portfolio: str | None = None,
+    cohort_year: int | None = None,
+    contract_id: str | None = None,
+    datasets: list[str] | None = None,
+    data: IFRS17Store | None = None,
+) -> list[Sheet]:
+    """
+    Sheets for one export. The snapshot is loaded here (errors surface before any
+    streaming); rows are only read as the sheets are consumed.
+    report: liability-reconciliation, csm-reconciliation, portfolio-comparison or data.
+    """
+    data = load_data() if data is None else data
+    filters = data_filters(portfolio, cohort_year, contract_id)
+    if report == "liability-reconciliation":
+        return [_reconciliation(data, "liability_movements", LIABILITY_COLUMNS, filters)]
+    if report == "csm-reconciliation":
+        return [_reconciliation(data, "csm_movements", CSM_COLUMNS, filters)]
+    if report == "portfolio-comparison":
+        rows = get_dashboard_portfolio_comparison(data=data)
+        if portfolio is not None:
+            rows = [r for r in rows if r.get("portfolio") == portfolio]
+        header = _PORTFOLIO_COMPARISON_COLUMNS
+        return [Sheet("portfolio_comparison", header, (tuple(r.get(c) for c in header) for r in rows))]
+    if report == "data":
+        unknown = sorted(set(datasets or ()) - set(DATA_KEYS))
+        if unknown:
+            raise ValueError(f"Unknown dataset: {', '.join(unknown)}")
+        sheets = []
+        for key in DATA_KEYS if not datasets else tuple(d for d in DATA_KEYS if d in datasets):
+            table = data.table(key)
+            header = tuple(table.columns)
+            sheets.append(Sheet(key, header, table.iter_rows(header, select_rows(data, key, filters))))
+        return sheets
+    raise ValueError(f"Unknown report: {report} (choose from {', '.join(REPORTS)})")
+
+
+@metrics.timed()
+def stream_csv(sheet: Sheet) -> Iterator[bytes]:
+    """One sheet as UTF-8 CSV, yielded in chunks of about CSV_CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(sheet.header)
+    for row in sheet.rows:
+        writer.writerow(row)
+        if buffer.tell() >= CSV_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+@metrics.timed()
+def stream_xlsx(sheets: list[Sheet]) -> Iterator[bytes]:
+    """Sheets as one .xlsx workbook (openpyxl write-only), yielded in XLSX_CHUNK_BYTES chunks."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    bold = Font(bold=True)
+    with tempfile.TemporaryFile() as out:
+        workbook = Workbook(write_only=True)
+        for sheet in sheets:
+            ws = workbook.create_sheet(sheet.name[:_SHEET_NAME_MAX])
+            ws.freeze_panes = "A2"
+            header = []
+            for name in sheet.header:
+                cell = WriteOnlyCell(ws, value=name)
+                cell.font = bold
+                header.append(cell)
+            ws.append(header)
+            for row in sheet.rows:
+                ws.append(row)
+        workbook.save(out)
+        out.seek(0)
+        while chunk := out.read(XLSX_CHUNK_BYTES):
+            yield chunk
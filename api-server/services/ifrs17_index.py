@@ -0,0 +1,178 @@
+"""
+Secondary indexes for IFRS 17 filtering. Built once at load time.
+
+Each index is a posting list per key stored as sorted row offsets (CSR): rows
+with key k are `order[offsets[i]:offsets[i + 1]]`, ascending, where
+`keys[i] == k`. A lookup costs O(log keys + matching rows); multi-filter
+queries intersect posting lists or use a composite (portfolio, cohort_year) index.
+
+Rows appended after load (services/ifrs17_delta.py) go to small delta segments
+(SegmentedIndex) instead of rebuilding the index; segments are merged once there
+are more than MAX_SEGMENTS, and folded into the base once they hold more than a
+quarter of its rows, so an append costs O(batch) amortized.
+"""
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from services.ifrs17_store import IFRS17Store
+
+# Columns that can filter each dataset. For contract-keyed datasets the
+# portfolio / cohort_year / contract_id come from the owning contract.
+FILTERS: dict[str, tuple[str, ...]] = {
+    "contracts": ("portfolio", "cohort_year", "contract_id"),
+    "premiums": ("portfolio", "cohort_year", "contract_id"),
+    "claims": ("portfolio", "cohort_year", "contract_id"),
+    "acquisition_costs": ("portfolio", "cohort_year", "contract_id"),
+    "reinsurance": ("portfolio", "cohort_year", "contract_id"),
+    "assumptions": ("portfolio",),
+    "discount_rates": (),
+    "liability_movements": ("portfolio", "cohort_year"),
+    "csm_movements": ("portfolio", "cohort_year"),
+    "claims_development": ("cohort_year",),
+}
+
+# Delta segments kept before they are merged into one
+MAX_SEGMENTS = 8
+
+# Datasets that also get a composite (portfolio, cohort_year) index
+COMPOSITE = ("liability_movements", "csm_movements")
+PORTFOLIO_COHORT = "portfolio+cohort_year"
+
+
+@dataclass
+class PostingIndex:
+    """Row ids grouped by integer key (CSR layout)."""
+
+    keys: np.ndarray
+    offsets: np.ndarray
+    order: np.ndarray
+
+    @classmethod
+    def build(cls, values: np.ndarray) -> "PostingIndex":
+        """Index rows by `values`; negative keys (unknown/null) are left out."""
+        values = np.asarray(values, dtype=np.int64)
+        rows = np.flatnonzero(values >= 0)
+        keys = values[rows]
+        if len(keys) and keys.max() <= np.iinfo(np.int16).max:
+            # Few distinct keys (portfolio, cohort, aggregate cell): NumPy radix-sorts 16-bit ints
+            keys = keys.astype(np.int16)
+        order = rows[np.argsort(keys, kind="stable")]
+        keys, starts = np.unique(values[order], return_index=True)
+        offsets = np.append(starts, len(order)).astype(np.int64)
+        return cls(keys, offsets, order)
+
+    def rows(self, key: int) -> np.ndarray:
+        """Sorted row ids for one key (empty if absent)."""
+        i = int(np.searchsorted(self.keys, key))
+        if i >= len(self.keys) or self.keys[i] != key:
+            return np.zeros(0, dtype=np.int64)
+        return self.order[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    @classmethod
+    def merge(cls, indexes: list["PostingIndex"]) -> "PostingIndex":
+        """One index over the rows of several (rows within a key stay ascending if the inputs are in row order)."""
+        keys = np.concatenate([np.repeat(i.keys, np.diff(i.offsets)) for i in indexes])
+        rows = np.concatenate([i.order for i in indexes])
+        by_key = np.argsort(keys, kind="stable")
+        unique, starts = np.unique(keys[by_key], return_index=True)
+        return cls(unique, np.append(starts, len(rows)).astype(np.int64), rows[by_key])
+
+
+@dataclass
+class SegmentedIndex:
+    """A load-time PostingIndex plus delta segments over rows appended since."""
+
+    base: PostingIndex
+    segments: tuple[PostingIndex, ...] = ()
+
+    def rows(self, key: int) -> np.ndarray:
+        """Sorted row ids for one key (segments hold later rows than the base)."""
+        parts = [p for p in (self.base.rows(key), *(s.rows(key) for s in self.segments)) if len(p)]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def merged(self) -> PostingIndex:
+        return PostingIndex.merge([self.base, *self.segments]) if self.segments else self.base
+
+
+def append_to_index(index: PostingIndex | SegmentedIndex, values: np.ndarray, start: int) -> SegmentedIndex:
+    """New index that also covers rows start.. with keys `values`; `index` is unchanged."""
+    segment = PostingIndex.build(values)
+    segment.order += start
+    base, segments = (index.base, index.segments) if isinstance(index, SegmentedIndex) else (index, ())
+    segments = segments + (segment,)
+    if sum(len(s) for s in segments) > len(base) // 4:
+        return SegmentedIndex(PostingIndex.merge([base, *segments]))
+    if len(segments) > MAX_SEGMENTS:
+        segments = (PostingIndex.merge(list(segments)),)
+    return SegmentedIndex(base, segments)
+
+
+def pair_key(a: np.ndarray | int, b: np.ndarray | int) -> np.ndarray | int:
+    """Combine two non-negative int keys into one int64 key (-1 if either is unknown)."""
+    a64 = np.asarray(a, dtype=np.int64)
+    b64 = np.asarray(b, dtype=np.int64)
+    key = np.where((a64 >= 0) & (b64 >= 0), (a64 << 32) | (b64 & 0xFFFFFFFF), -1)
+    return key if key.ndim else int(key)
+
+
+def index_keys(data: IFRS17Store, dataset: str) -> dict[str, np.ndarray]:
+    """Key per row for every index of a dataset (filter columns, plus the composite key)."""
+    keys = {c: data.dimension(dataset, c) for c in FILTERS.get(dataset, ())}
+    if dataset in COMPOSITE:
+        keys[PORTFOLIO_COHORT] = pair_key(keys["portfolio"], keys["cohort_year"])
+    return keys
+
+
+def build_table_indexes(data: IFRS17Store, dataset: str) -> dict[str, PostingIndex]:
+    """Filter indexes of one dataset."""
+    return {c: PostingIndex.build(v) for c, v in index_keys(data, dataset).items()}
+
+
+def build_indexes(data: IFRS17Store) -> dict[str, dict[str, PostingIndex]]:
+    """Build every filter index for all datasets."""
+    return {dataset: build_table_indexes(data, dataset) for dataset in FILTERS if dataset in data.tables}
+
+
+def _key_of(data: IFRS17Store, column: str, value: Any) -> int:
+    """Index key for a filter value (dictionary code for string columns)."""
+    if column in data.dictionaries:
+        return data.code(column, value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def select_rows(data: IFRS17Store, dataset: str, filters: dict[str, Any]) -> np.ndarray | None:
+    """
+    Sorted row ids of dataset matching all applicable filters (None values ignored).
+    Returns None when no filter applies to this dataset (all rows).
+    """
+    applicable = {c: v for c, v in filters.items() if v is not None and c in FILTERS.get(dataset, ())}
+    if not applicable:
+        return None
+    table_indexes = data.indexes.get(dataset)
+    if table_indexes is None:
+        return np.zeros(0, dtype=np.int64)
+    keys = {c: _key_of(data, c, v) for c, v in applicable.items()}
+    if any(k < 0 for k in keys.values()):
+        return np.zeros(0, dtype=np.int64)
+    lists = []
+    if PORTFOLIO_COHORT in table_indexes and "portfolio" in keys and "cohort_year" in keys:
+        lists.append(table_indexes[PORTFOLIO_COHORT].rows(pair_key(keys.pop("portfolio"), keys.pop("cohort_year"))))
+    lists += [table_indexes[c].rows(k) for c, k in keys.items()]
+    # Intersect shortest posting lists first
+    lists.sort(key=len)
+    rows = lists[0]
+    for other in lists[1:]:
+        if not len(rows):
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
@@ -0,0 +1,148 @@
+"""
+Bulk CSV ingestion of IFRS 17 datasets into the SQLite tables in models/db_models.py.
+
+Each CSV is read in fixed-size chunks and inserted with executemany inside one
+transaction, so memory stays constant regardless of file size. In replace mode
+the table's secondary indexes are dropped before the load and rebuilt once at
+the end, which is much faster than maintaining them row by row.
+
+Usage (from api-server):
+    python -m services.ifrs17_ingest                  # all IFRS17_sample_data_*.csv in project root
+    python -m services.ifrs17_ingest --dir /data/2025-01 --append
+    python -m services.ifrs17_ingest --file premiums=/data/premiums_2025_01.csv --append
+"""
+import argparse
+import csv
+import itertools
+import operator
+from pathlib import Path
+import time
+from typing import Any, Iterator
+
+from sqlalchemy.engine import Connection, Engine
+
+from database import engine as default_engine
+from database import init_db
+from models.db_models import IFRS17_TABLES
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+CSV_PREFIX = "IFRS17_sample_data_"
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def csv_path(directory: Path, dataset: str) -> Path:
+    """Expected CSV file for a dataset, e.g. IFRS17_sample_data_premiums.csv."""
+    return directory / f"{CSV_PREFIX}{dataset}.csv"
+
+
+def _read_chunks(f, table, chunk_size: int) -> tuple[list[str], Iterator[list[tuple]]]:
+    """
+    Read a CSV file object; return (column names, iterator of row chunks).
+    Rows are passed to SQLite as the raw CSV strings: column affinity (INTEGER,
+    REAL) converts numbers inside SQLite, so no per-cell Python conversion is
+    needed. CSV columns that are not in the table are ignored.
+    """
+    reader = csv.reader(f)
+    header = next(reader, [])
+    known = [(i, name) for i, name in enumerate(header) if name in table.c and name != "id"]
+    names = [name for _, name in known]
+    if len(known) == len(header):
+        rows: Iterator[Any] = map(tuple, reader)
+    else:
+        pick = operator.itemgetter(*(i for i, _ in known))
+        rows = (pick(r) if len(known) > 1 else (pick(r),) for r in reader)
+
+    def chunks() -> Iterator[list[tuple]]:
+        while True:
+            batch = list(itertools.islice(rows, chunk_size))
+            if not batch:
+                return
+            yield batch
+
+    return names, chunks()
+
+
+def _insert_chunks(conn: Connection, table, names: list[str], chunks: Iterator[list[tuple]]) -> int:
+    """executemany each chunk with a plain INSERT (empty cells -> NULL); returns rows inserted."""
+    placeholders = ", ".join("NULLIF(?, '')" for _ in names)
+    sql = f"INSERT INTO {table.name} ({', '.join(names)}) VALUES ({placeholders})"
+    count = 0
+    for batch in chunks:
+        conn.exec_driver_sql(sql, batch)
+        count += len(batch)
+    return count
+
+
+def load_csv(
+    dataset: str,
+    path: Path,
+    append: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    engine: Engine | None = None,
+) -> int:
+    """
+    Load one CSV into its IFRS 17 table in a single transaction; returns rows inserted.
+    Replace mode (default) empties the table first and rebuilds its indexes after the load.
+    """
+    if dataset not in IFRS17_TABLES:
+        raise ValueError(f"Unknown IFRS 17 dataset: {dataset}")
+    table = IFRS17_TABLES[dataset].__table__
+    with open(path, newline="", encoding="utf-8") as f, (engine or default_engine).begin() as conn:
+        names, chunks = _read_chunks(f, table, chunk_size)
+        if append:
+            return _insert_chunks(conn, table, names, chunks)
+        conn.execute(table.delete())
+        for index in table.indexes:
+            index.drop(conn, checkfirst=True)
+        count = _insert_chunks(conn, table, names, chunks)
+        for index in table.indexes:
+            index.create(conn)
+        return count
+
+
+def ingest_directory(
+    directory: Path = _PROJECT_ROOT,
+    append: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    engine: Engine | None = None,
+) -> dict[str, int]:
+    """Load every IFRS17_sample_data_<dataset>.csv found in directory; returns rows per dataset."""
+    counts = {}
+    for dataset in IFRS17_TABLES:
+        path = csv_path(directory, dataset)
+        if path.exists():
+            counts[dataset] = load_csv(dataset, path, append=append, chunk_size=chunk_size, engine=engine)
+    return counts
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load IFRS 17 CSV files into SQLite (db/data.db).")
+    parser.add_argument("--dir", type=Path, default=_PROJECT_ROOT, help="Directory with IFRS17_sample_data_*.csv")
+    parser.add_argument(
+        "--file",
+        action="append",
+        default=[],
+        metavar="DATASET=PATH",
+        help="Load a single file into a dataset table (repeatable); skips --dir",
+    )
+    parser.add_argument("--append", action="store_true", help="Append instead of replacing table contents")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    init_db()
+    start = time.perf_counter()
+    if args.file:
+        counts = {}
+        for spec in args.file:
+            dataset, _, path = spec.partition("=")
+            counts[dataset] = load_csv(dataset, Path(path), append=args.append, chunk_size=args.chunk_size)
+    else:
+        counts = ingest_directory(args.dir, append=args.append, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+    for dataset, n in counts.items():
+        print(f"{dataset}: {n} rows")
+    print(f"Loaded {sum(counts.values())} rows in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
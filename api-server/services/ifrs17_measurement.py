@@ -0,0 +1,614 @@
+"""
+IFRS 17 measurement engine. Derives LRC, LIC and the CSM roll-forward from
+contracts, premiums, claims, acquisition_costs, assumptions and discount_rates,
+instead of reading the pre-computed movement tables.
+
+Every quantity is a NumPy array over all contracts; per-contract cash flows come
+from bincount over contract rows, and GMM present values are looked up in
+per-portfolio annuity tables (portfolio x remaining policy years), so cost is
+O(contracts + cash-flow rows) with no per-contract Python loop.
+
+Model (one reporting period, period_start .. reporting_date):
+- PAA: LRC(d) = premiums received to d - acquisition cash flows to d
+  - (premiums - acquisition costs) x coverage elapsed at d (straight line).
+- GMM: fulfilment cash flows (FCF) = PV(expected claims + expenses) - PV(premiums)
+  + risk adjustment, over the premiums still to come (one per policy year, in
+  advance) with lapse/mortality decrements, claim inflation and the discount curve.
+  At inception CSM = max(0, -(FCF + acquisition costs)); it accretes at the 1-year
+  rate and is released by coverage units. LRC(d) = FCF(d) + CSM(d).
+- LIC (both): incurred claims not yet paid at d, undiscounted.
+Opening balances use the assumptions effective at period start, closing balances
+those effective at the reporting date. Liability roll-forwards are on total
+insurance contract liability (LRC + LIC) and every line is computed, not solved for:
+- the GMM FCF move under opening assumptions splits into expected premiums, expected
+  claims and expenses plus risk adjustment released (insurance revenue) and the
+  unwind of discounting and decrements (insurance_finance);
+- experience_variance is expected less actual premiums (the FCF expected the former,
+  premiums_received has the latter); claims experience is claims_incurred (actual)
+  against the expected claims in insurance_revenue;
+- the change in FCF from opening to closing assumptions adjusts the CSM (changes in
+  estimates); what the CSM cannot absorb is an onerous loss (onerous_changes).
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Sequence
+
+import numpy as np
+
+from services.ifrs17_aggregates import cell_index, cohort_axis
+from services.ifrs17_data import load_data
+from services.ifrs17_engine import CSM_COLUMNS, LIABILITY_COLUMNS, get_reconciliation_csm, get_reconciliation_liability
+from services.ifrs17_store import DATE, IFRS17Store, Table
+
+DAYS_PER_YEAR = 365.25
+MAX_HORIZON = 100
+# Day number for a null date (before any real date)
+_NO_DAY = np.iinfo(np.int64).min
+
+LIABILITY_FLOWS = (
+    "opening_balance",
+    "new_contracts",
+    "premiums_received",
+    "claims_incurred",
+    "claims_paid",
+    "insurance_revenue",
+    "acquisition_amortization",
+    "csm_accretion",
+    "csm_release",
+    "onerous_changes",
+    "insurance_finance",
+    "experience_variance",
+    "closing_balance",
+)
+
+CSM_FLOWS = (
+    "opening_csm",
+    "initial_recognition",
+    "interest_accretion",
+    "changes_in_estimates",
+    "csm_release_to_pl",
+    "closing_csm",
+)
+
+BALANCES = ("lrc", "lic", "risk_adjustment", "csm", "loss_component", "total_liability")
+
+
+@dataclass(frozen=True)
+class MeasurementBasis:
+    """Assumptions the data feed does not carry. Portfolio assumptions rows override the ratios."""
+
+    expected_loss_ratio: float = 0.65
+    expense_ratio: float = 0.05
+    # Risk adjustment as % of PV of future outflows
+    risk_adjustment_pct: float = 5.0
+
+
+# assumption_type -> (model input, divisor from the data's units to a fraction)
+ASSUMPTION_INPUTS = {
+    "lapse_rate": ("lapse", 100.0),
+    "mortality_rate_base": ("mortality", 1000.0),
+    "claim_inflation": ("inflation", 100.0),
+    "expected_loss_ratio": ("loss_ratio", 100.0),
+    "expense_ratio": ("expense_ratio", 100.0),
+}
+DISCOUNT_RATE = "discount_rate"
+
+
+@dataclass(frozen=True)
+class Shock:
+    """
+    One change to the measurement inputs: `target` is "discount_rate" or an
+    assumption_type. Additive shocks are in the data's units (percentage points,
+    mortality per 1000); relative shocks multiply by (1 + value).
+    """
+
+    target: str
+    value: float
+    relative: bool = False
+    # Only this portfolio (assumptions only); None shocks all portfolios
+    portfolio: str | None = None
+
+
+def _days(table: Table, column: str, fill: int) -> np.ndarray:
+    """Date column as int64 days since epoch; `fill` where null or missing."""
+    col = table.columns.get(column)
+    if col is None or col.kind != DATE:
+        return np.full(len(table), fill, dtype=np.int64)
+    v = col.values
+    return np.where(np.isnat(v), fill, v.astype(np.int64))
+
+
+def _to_day(date: str | None) -> int:
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+def _per_contract(data: IFRS17Store, dataset: str, weights: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
+    """Sum weights of a contract-keyed dataset per contract row (rows with unknown contract dropped)."""
+    n = len(data.table("contracts"))
+    rows = data.contract_rows.get(dataset)
+    if rows is None or not len(rows):
+        return np.zeros(n)
+    keep = rows >= 0 if mask is None else (rows >= 0) & mask
+    return np.bincount(rows[keep], weights=weights[keep], minlength=n)
+
+
+def _portfolio_assumptions(data: IFRS17Store, basis: MeasurementBasis, day: int) -> dict[str, np.ndarray]:
+    """
+    Per portfolio code: lapse, mortality (annual prob.), claim inflation, loss and
+    expense ratios, from the assumption rows effective at `day` (no date: always).
+    """
+    n_ports = len(data.categories("portfolio")) + 1
+    out = {
+        "lapse": np.zeros(n_ports),
+        "mortality": np.zeros(n_ports),
+        "inflation": np.zeros(n_ports),
+        "loss_ratio": np.full(n_ports, basis.expected_loss_ratio),
+        "expense_ratio": np.full(n_ports, basis.expense_ratio),
+    }
+    table = data.table("assumptions")
+    if not len(table) or "assumption_type" not in table or "portfolio" not in table:
+        return out
+    ports = table.values("portfolio")
+    types = table.values("assumption_type")
+    type_names = data.categories("assumption_type")
+    values = table.numeric("value_pct")
+    effective = _days(table, "effective_date", _NO_DAY)
+    # Rows are applied in effective_date order, so the latest assumption wins
+    order = np.argsort(effective, kind="stable")
+    for i in order[effective[order] <= day].tolist():
+        key = ASSUMPTION_INPUTS.get(type_names[types[i]]) if types[i] >= 0 else None
+        if key is not None and ports[i] >= 0:
+            out[key[0]][ports[i]] = values[i] / key[1]
+    return out
+
+
+def _spot_curve(data: IFRS17Store, horizon: int) -> np.ndarray:
+    """Annual spot rates for terms 0..horizon from the latest discount_rates curve (flat extrapolation)."""
+    table = data.table("discount_rates")
+    if not len(table) or "term_years" not in table:
+        return np.zeros(horizon + 1)
+    as_at = _days(table, "as_at_date", 0)
+    latest = as_at == as_at.max()
+    terms = table.numeric("term_years")[latest]
+    rates = table.numeric("rate_pct")[latest] / 100.0
+    order = np.argsort(terms)
+    return np.interp(np.arange(horizon + 1), terms[order], rates[order])
+
+
+def apply_shocks(
+    data: IFRS17Store, spot: np.ndarray, assumptions: dict[str, np.ndarray], shocks: Sequence[Shock]
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """Shocked copies of the spot curve and per-portfolio assumptions. Raises ValueError for an unknown target."""
+    spot = spot.copy()
+    assumptions = {k: v.copy() for k, v in assumptions.items()}
+    for shock in shocks:
+        if shock.target == DISCOUNT_RATE:
+            spot = spot * (1 + shock.value) if shock.relative else spot + shock.value / 100.0
+            continue
+        if shock.target not in ASSUMPTION_INPUTS:
+            raise ValueError(f"Unknown shock target: {shock.target}")
+        key, divisor = ASSUMPTION_INPUTS[shock.target]
+        values = assumptions[key]
+        ports = slice(None)
+        if shock.portfolio is not None:
+            code = data.code("portfolio", shock.portfolio)
+            if code < 0:
+                raise ValueError(f"Unknown portfolio: {shock.portfolio}")
+            ports = code
+        if shock.relative:
+            values[ports] = values[ports] * (1 + shock.value)
+        else:
+            values[ports] = values[ports] + shock.value / divisor
+        assumptions[key] = np.maximum(values, 0.0)
+    return spot, assumptions
+
+
+def _annuity_tables(
+    assumptions: dict[str, np.ndarray], spot: np.ndarray, horizon: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cumulative per-portfolio factors for n = 0..horizon remaining years, per scenario
+    (shape scenarios x ports x horizon+1; inputs have a leading scenario axis):
+    premiums (in advance), claims (in arrears, inflated), and both undiscounted:
+    coverage units (= expected premiums per unit premium) and expected claims.
+    """
+    t = np.arange(1, horizon + 1)
+    v = (1.0 + spot[:, None, :]) ** -np.arange(horizon + 1)
+    persist = np.clip(1.0 - assumptions["lapse"] - assumptions["mortality"], 0.0, 1.0)[:, :, None]
+    survival = persist ** (t - 1)
+    inflation = (1.0 + assumptions["inflation"][:, :, None]) ** t
+    zero = np.zeros(survival.shape[:2] + (1,))
+    premium = np.concatenate([zero, np.cumsum(survival * v[:, :, :-1], axis=2)], axis=2)
+    claims = np.concatenate([zero, np.cumsum(survival * inflation * v[:, :, 1:], axis=2)], axis=2)
+    units = np.concatenate([zero, np.cumsum(survival, axis=2)], axis=2)
+    claims_cash = np.concatenate([zero, np.cumsum(survival * inflation, axis=2)], axis=2)
+    return premium, claims, units, claims_cash
+
+
+@dataclass
+class _Basis:
+    """Shocked curve, assumptions and annuity tables for one assumption date, per scenario."""
+
+    spot: np.ndarray
+    assumptions: dict[str, np.ndarray]
+    premium: np.ndarray
+    claims: np.ndarray
+    units: np.ndarray
+    claims_cash: np.ndarray
+
+
+def _scenario_basis(
+    data: IFRS17Store,
+    spot: np.ndarray,
+    assumptions: dict[str, np.ndarray],
+    scenarios: Sequence[Sequence[Shock]],
+    horizon: int,
+) -> _Basis:
+    shocked = [apply_shocks(data, spot, assumptions, shocks) for shocks in scenarios]
+    stacked_spot = np.stack([s for s, _ in shocked])
+    stacked = {k: np.stack([a[k] for _, a in shocked]) for k in assumptions}
+    return _Basis(stacked_spot, stacked, *_annuity_tables(stacked, stacked_spot, horizon))
+
+
+def _interp_rows(table: np.ndarray, ports: np.ndarray, years: np.ndarray) -> np.ndarray:
+    """table[:, port, years] (scenarios x contracts) with linear interpolation between whole years."""
+    lo = np.floor(years).astype(np.int64)
+    hi = np.minimum(lo + 1, table.shape[2] - 1)
+    frac = years - lo
+    return table[:, ports, lo] * (1 - frac) + table[:, ports, hi] * frac
+
+
+class _Contracts:
+    """Per-contract inputs as arrays (one element per contracts row)."""
+
+    def __init__(self, data: IFRS17Store, end: int):
+        contracts = data.table("contracts")
+        n = len(contracts)
+        n_ports = len(data.categories("portfolio"))
+        ports = data.dimension("contracts", "portfolio")
+        self.n = n
+        self.port = np.where(ports >= 0, ports, n_ports)
+        self.inception = _days(contracts, "inception_date", end + 1)
+        self.coverage_end = np.maximum(_days(contracts, "coverage_end_date", end), self.inception)
+        model_code = data.code("measurement_model", "GMM")
+        self.gmm = (contracts.values("measurement_model") == model_code) if "measurement_model" in contracts else np.zeros(n, bool)
+        self.coverage_days = (self.coverage_end - self.inception + 1).astype(np.float64)
+        # Premium due dates (GMM): inception and each policy anniversary before coverage end
+        self.policy_years = np.floor((self.coverage_end - self.inception) / DAYS_PER_YEAR).astype(np.int64) + 1
+
+        premiums = data.table("premiums")
+        self.premium_day = _days(premiums, "received_date", _NO_DAY)
+        received = data.contract_rows.get("premiums", np.zeros(0, dtype=np.int64))
+        # Premiums without a received date count as received at inception
+        no_date = self.premium_day == _NO_DAY
+        if no_date.any():
+            self.premium_day[no_date] = self.inception[np.maximum(received[no_date], 0)]
+        self.premium_amount = premiums.numeric("gross_premium")
+        self.premium_total = _per_contract(data, "premiums", self.premium_amount, self.premium_day <= end)
+        self.acquisition = _per_contract(data, "acquisition_costs", data.table("acquisition_costs").numeric("total"))
+
+        claims = data.table("claims")
+        self.claim_incurred_day = _days(claims, "incurred_date", _NO_DAY)
+        self.claim_paid_day = _days(claims, "paid_date", _NO_DAY)
+        # Paid amounts without a paid date (or dated before the claim) count as paid when incurred
+        self.claim_paid_day = np.maximum(self.claim_paid_day, self.claim_incurred_day)
+        self.claim_incurred = claims.numeric("incurred_amount")
+        self.claim_paid = claims.numeric("paid_amount")
+
+    def premiums_due(self, day: int) -> np.ndarray:
+        """Premium due dates on or before day, per contract."""
+        due = np.floor((day - self.inception) / DAYS_PER_YEAR).astype(np.int64) + 1
+        return np.where(day >= self.inception, np.minimum(due, self.policy_years), 0)
+
+    def premiums_to(self, data: IFRS17Store, day: int) -> np.ndarray:
+        return _per_contract(data, "premiums", self.premium_amount, self.premium_day <= day)
+
+    def lic(self, data: IFRS17Store, day: int) -> np.ndarray:
+        """Incurred but unpaid claims at day, per contract."""
+        incurred = self.claim_incurred_day <= day
+        paid = incurred & (self.claim_paid_day <= day)
+        return _per_contract(data, "claims", self.claim_incurred, incurred) - _per_contract(
+            data, "claims", self.claim_paid, paid
+        )
+
+
+def measure_contracts(
+    data: IFRS17Store,
+    basis: MeasurementBasis,
+    start: int,
+    end: int,
+    scenarios: Sequence[Sequence[Shock]] = ((),),
+) -> dict[str, np.ndarray]:
+    """
+    Per-contract balances at `end` and roll-forward flows over (start, end], for
+    each scenario (list of shocks) at once. Arrays that depend on the scenario have
+    shape (scenarios, contracts); the rest (PAA, LIC, cash) have shape (contracts,).
+    Discount-rate shocks move the curve of both opening and closing balances;
+    assumption shocks only change the closing assumptions, so for GMM they are
+    changes in estimates that the CSM absorbs.
+    """
+    c = _Contracts(data, end)
+    horizon = int(min(MAX_HORIZON, c.policy_years.max() if c.n else 1))
+    base_spot = _spot_curve(data, horizon)
+    financial = [[s for s in shocks if s.target == DISCOUNT_RATE] for shocks in scenarios]
+    opening_basis = _scenario_basis(data, base_spot, _portfolio_assumptions(data, basis, start), financial, horizon)
+    closing_basis = _scenario_basis(data, base_spot, _portfolio_assumptions(data, basis, end), scenarios, horizon)
+    locked_rate = opening_basis.spot[:, min(1, horizon), None]
+    gmm, paa = c.gmm, ~c.gmm
+
+    def recognised(day: int) -> np.ndarray:
+        return c.inception <= day
+
+    def elapsed(day: int) -> np.ndarray:
+        """Fraction of coverage elapsed at day (0 before inception, 1 after coverage end)."""
+        return np.clip((day - c.inception + 1) / c.coverage_days, 0.0, 1.0)
+
+    def remaining_years_at(day: int | np.ndarray) -> np.ndarray:
+        return np.clip((c.coverage_end - day) / DAYS_PER_YEAR, 0.0, horizon)
+
+    def premiums_left(day: int) -> np.ndarray:
+        """GMM premiums still to come after day (all of them before inception)."""
+        return np.clip(c.policy_years - c.premiums_due(day), 0, horizon)
+
+    def at(table: np.ndarray, n: np.ndarray) -> np.ndarray:
+        return table[:, c.port, n]
+
+    # GMM annual premium: premiums received so far spread over the premiums due so far
+    annual_premium = c.premium_total / np.maximum(c.premiums_due(end), 1)
+    ra_pct = basis.risk_adjustment_pct / 100.0
+
+    def fcf(b: _Basis, n: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """GMM fulfilment cash flows and risk adjustment with n premiums to come."""
+        loss_ratio = b.assumptions["loss_ratio"][:, c.port]
+        expense_ratio = b.assumptions["expense_ratio"][:, c.port]
+        pv_in = annual_premium * at(b.premium, n)
+        pv_out = annual_premium * (loss_ratio * at(b.claims, n) + expense_ratio * at(b.premium, n))
+        ra = ra_pct * pv_out
+        return pv_out - pv_in + ra, ra
+
+    # Initial recognition (GMM), at the opening assumptions
+    n0 = np.clip(c.policy_years, 0, horizon)
+    fcf0, _ = fcf(opening_basis, n0)
+    csm0 = np.where(gmm, np.maximum(0.0, -(fcf0 + c.acquisition)), 0.0)
+    loss0 = np.where(gmm, np.maximum(0.0, fcf0 + c.acquisition), 0.0)
+    units0 = np.maximum(_interp_rows(opening_basis.units, c.port, remaining_years_at(c.inception)), 1e-12)
+
+    def coverage(day: int) -> tuple[np.ndarray, np.ndarray]:
+        """Coverage units left (fraction of units at inception) and CSM accretion factor at day."""
+        left = _interp_rows(opening_basis.units, c.port, remaining_years_at(day))
+        units = np.where(recognised(day), left / units0, 0.0)
+        growth = (1.0 + locked_rate) ** (np.clip(day - c.inception + 1, 0, None) / DAYS_PER_YEAR)
+        return units, growth
+
+    def paa_lrc(day: int) -> np.ndarray:
+        acquisition = np.where(recognised(day), c.acquisition, 0.0)
+        return c.premiums_to(data, day) - acquisition - (c.premium_total - c.acquisition) * elapsed(day)
+
+    live_start, live_end = gmm & recognised(start), gmm & recognised(end)
+    new = (c.inception > start) & (c.inception <= end)
+    units_start, growth_start = coverage(start)
+    units_end, growth_end = coverage(end)
+
+    # Opening balances, at the opening assumptions
+    n_start, n_end = premiums_left(start), premiums_left(end)
+    fcf_start, _ = fcf(opening_basis, n_start)
+    csm_start = np.where(live_start, csm0 * growth_start * units_start, 0.0)
+    lrc_start = np.where(gmm, np.where(live_start, fcf_start, 0.0) + csm_start, paa_lrc(start))
+
+    # GMM FCF from period start (inception for new business) to end at the opening assumptions:
+    # the k premiums due in the period and their claims and expenses fall out of the
+    # FCF, and the flows still to come are valued from end instead of from start
+    n_base = np.where(new, n0, n_start)
+    n_due = n_base - n_end
+    ob = opening_basis
+    loss_ratio = ob.assumptions["loss_ratio"][:, c.port]
+    expense_ratio = ob.assumptions["expense_ratio"][:, c.port]
+
+    def unwind(table: np.ndarray) -> np.ndarray:
+        return at(table, n_end) - (at(table, n_base) - at(table, n_due))
+
+    expected_premiums = annual_premium * at(ob.units, n_due)
+    expected_outgo = annual_premium * (loss_ratio * at(ob.claims_cash, n_due) + expense_ratio * at(ob.units, n_due))
+    ra_release = -ra_pct * annual_premium * (loss_ratio * at(ob.claims, n_due) + expense_ratio * at(ob.premium, n_due))
+    finance = annual_premium * (
+        loss_ratio * (at(ob.claims_cash, n_due) - at(ob.claims, n_due))
+        + (expense_ratio - 1.0) * (at(ob.units, n_due) - at(ob.premium, n_due))
+        + (1.0 + ra_pct) * (loss_ratio * unwind(ob.claims) + expense_ratio * unwind(ob.premium))
+        - unwind(ob.premium)
+    )
+
+    # Closing assumptions: the FCF change is a change in estimates for future service.
+    # The CSM accretes, absorbs it (down to zero; the rest is an onerous loss) and
+    # is then released by the coverage units of the period.
+    fcf_expected, _ = fcf(opening_basis, n_end)
+    fcf_end, ra_end = fcf(closing_basis, n_end)
+    change = np.where(live_end, fcf_end - fcf_expected, 0.0)
+    csm_base = np.where(new, csm0, csm_start)
+    base_growth = np.where(new, 1.0, growth_start)
+    accreted = csm_base * growth_end / np.maximum(base_growth, 1e-12)
+    adjusted = np.where(live_end, np.maximum(0.0, accreted - change), 0.0)
+    csm_end = adjusted * units_end / np.maximum(np.where(new, 1.0, units_start), 1e-12)
+    onerous = change + adjusted - accreted
+
+    lic_start, lic_end = c.lic(data, start), c.lic(data, end)
+    lrc_end = np.where(gmm, np.where(live_end, fcf_end, 0.0) + csm_end, paa_lrc(end))
+    closing = {
+        "lrc": lrc_end,
+        "lic": lic_end,
+        "risk_adjustment": np.where(live_end, ra_end, 0.0),
+        "csm": csm_end,
+        "loss_component": np.where(live_end, loss0 * units_end + onerous, 0.0),
+        "total_liability": lrc_end + lic_end,
+    }
+
+    def in_period(days: np.ndarray) -> np.ndarray:
+        return (days > start) & (days <= end)
+
+    flows: dict[str, np.ndarray] = {}
+    flows["opening_balance"] = lrc_start + lic_start
+    flows["new_contracts"] = np.where(new, np.where(gmm, fcf0 + csm0, -c.acquisition), 0.0)
+    flows["premiums_received"] = _per_contract(data, "premiums", c.premium_amount, in_period(c.premium_day))
+    flows["claims_incurred"] = _per_contract(data, "claims", c.claim_incurred, in_period(c.claim_incurred_day))
+    flows["claims_paid"] = -_per_contract(data, "claims", c.claim_paid, in_period(c.claim_paid_day))
+    earned = elapsed(end) - elapsed(start)
+    flows["insurance_revenue"] = np.where(
+        paa, -c.premium_total * earned, np.where(live_end, ra_release - expected_outgo, 0.0)
+    )
+    flows["acquisition_amortization"] = np.where(paa, c.acquisition * earned, 0.0)
+    flows["csm_accretion"] = np.where(gmm, accreted - csm_base, 0.0)
+    flows["csm_release"] = np.where(gmm, csm_end - adjusted, 0.0)
+    flows["onerous_changes"] = np.where(gmm, onerous, 0.0)
+    flows["insurance_finance"] = np.where(live_end, finance, 0.0)
+    flows["experience_variance"] = np.where(live_end, expected_premiums, 0.0) - np.where(
+        gmm, flows["premiums_received"], 0.0
+    )
+    flows["closing_balance"] = closing["total_liability"]
+
+    flows["opening_csm"] = csm_start
+    flows["initial_recognition"] = np.where(new, csm0, 0.0)
+    flows["interest_accretion"] = flows["csm_accretion"]
+    flows["changes_in_estimates"] = np.where(gmm, adjusted - accreted, 0.0)
+    flows["csm_release_to_pl"] = flows["csm_release"]
+    flows["closing_csm"] = csm_end
+    for k in BALANCES:
+        flows[k] = closing[k]
+    flows["gmm"] = gmm
+    return flows
+
+
+def _number(x: float) -> float:
+    return round(float(x), 2) + 0.0
+
+
+@dataclass
+class CellSums:
+    """Per-(portfolio, cohort) sums of per-contract columns, one row per scenario."""
+
+    labels: list[tuple[str | None, int | None]]
+    contracts: np.ndarray
+    # column -> array (scenarios, cells)
+    sums: dict[str, np.ndarray]
+
+
+def cell_sums(data: IFRS17Store, flows: dict[str, np.ndarray], columns: tuple[str, ...]) -> CellSums:
+    """Group measure_contracts() output by (portfolio, cohort) in one bincount per column."""
+    cohorts = cohort_axis(data)
+    cells = cell_index(data, "contracts", cohorts)
+    n_cohort_slots = len(cohorts) + 1
+    size = (len(data.categories("portfolio")) + 1) * n_cohort_slots
+    count = np.bincount(cells, minlength=size)
+    present = np.flatnonzero(count)
+    n_scenarios = max((v.shape[0] for v in flows.values() if v.ndim == 2), default=1)
+    # Scenario s, cell k -> bin s * size + k
+    bins = (np.arange(n_scenarios)[:, None] * size + cells[None, :]).ravel()
+    sums = {}
+    for k in columns:
+        weights = np.broadcast_to(flows[k], (n_scenarios, len(cells))).ravel()
+        sums[k] = np.bincount(bins, weights=weights, minlength=n_scenarios * size).reshape(n_scenarios, size)[
+            :, present
+        ]
+    names = data.categories("portfolio")
+    years = cohorts.tolist()
+    labels = []
+    for cell in present.tolist():
+        p, y = divmod(cell, n_cohort_slots)
+        labels.append((names[p] if p < len(names) else None, years[y] if y < len(years) else None))
+    return CellSums(labels, count[present], sums)
+
+
+def _grouped(data: IFRS17Store, flows: dict[str, np.ndarray], columns: tuple[str, ...]) -> dict[str, Any]:
+    """Sum per-contract columns by (portfolio, cohort) for the first scenario; rows plus totals."""
+    grouped = cell_sums(data, flows, columns)
+    rows = []
+    for i, (portfolio, cohort_year) in enumerate(grouped.labels):
+        row: dict[str, Any] = {
+            "portfolio": portfolio,
+            "cohort_year": cohort_year,
+            "contracts": int(grouped.contracts[i]),
+        }
+        row.update({k: _number(grouped.sums[k][0, i]) for k in columns})
+        rows.append(row)
+    return {"rows": rows, "totals": {k: _number(grouped.sums[k][0].sum()) for k in columns}}
+
+
+def measurement_period(data: IFRS17Store, period_start: str | None) -> tuple[str, int, int]:
+    """
+    (period_start, start day, end day) of the roll-forward: from period_start
+    (default 1 Jan of the reporting year) to metadata.reporting_date. Flows cover (start, end].
+    """
+    reporting_date = data.metadata.get("reporting_date")
+    if not reporting_date:
+        raise ValueError("metadata.reporting_date is required for measurement")
+    end = _to_day(reporting_date)
+    if period_start is None:
+        period_start = f"{reporting_date[:4]}-01-01"
+    start = _to_day(period_start) - 1
+    if start >= end:
+        raise ValueError("period_start must be before the reporting date")
+    return period_start, start, end
+
+
+def measure(
+    data: IFRS17Store | None = None,
+    basis: MeasurementBasis | None = None,
+    period_start: str | None = None,
+) -> dict[str, Any]:
+    """
+    Measure every contract and roll forward from period_start (default: start of
+    the reporting year) to the reporting date. Results by portfolio and cohort.
+    """
+    data = load_data() if data is None else data
+    basis = basis or MeasurementBasis()
+    period_start, start, end = measurement_period(data, period_start)
+    cache_key = ("measurement", basis, start)
+    cached = data.derived.get(cache_key)
+    if cached is not None:
+        return cached
+    flows = measure_contracts(data, basis, start, end)
+    result = {
+        "reporting_date": data.metadata["reporting_date"],
+        "period_start": period_start,
+        "basis": asdict(basis),
+        "contracts": {"PAA": int((~flows["gmm"]).sum()), "GMM": int(flows["gmm"].sum())},
+        "balances": _grouped(data, flows, BALANCES),
+        "liability": _grouped(data, flows, LIABILITY_FLOWS),
+        "csm": _grouped(data, flows, CSM_FLOWS),
+    }
+    if basis == MeasurementBasis():
+        data.derived[cache_key] = result
+    return result
+
+
+def _diff_rows(computed: list[dict], reported: list[dict], columns: tuple[str, ...]) -> list[dict[str, Any]]:
+    """Per (portfolio, cohort_year): computed vs reported value and difference for each column."""
+    cells: dict[tuple, dict[str, Any]] = {}
+    for source, rows in (("computed", computed), ("reported", reported)):
+        for r in rows:
+            key = (r.get("portfolio"), r.get("cohort_year"))
+            cell = cells.setdefault(key, {"portfolio": key[0], "cohort_year": key[1], "computed": {}, "reported": {}})
+            for c in columns:
+                cell[source][c] = cell[source].get(c, 0) + (r.get(c) or 0)
+    out = []
+    for cell in cells.values():
+        cell["difference"] = {
+            c: _number(cell["computed"].get(c, 0) - cell["reported"].get(c, 0)) for c in columns
+        }
+        out.append(cell)
+    return out
+
+
+def compare_with_reported(
+    data: IFRS17Store | None = None,
+    basis: MeasurementBasis | None = None,
+    period_start: str | None = None,
+) -> dict[str, Any]:
+    """Computed liability and CSM roll-forwards next to the reported reconciliations."""
+    data = load_data() if data is None else data
+    computed = measure(data, basis, period_start)
+    liability = get_reconciliation_liability(data=data)
+    csm = get_reconciliation_csm(data=data)
+    return {
+        "reporting_date": computed["reporting_date"],
+        "period_start": computed["period_start"],
+        "liability": _diff_rows(computed["liability"]["rows"], liability["rows"], LIABILITY_COLUMNS),
+        "csm": _diff_rows(computed["csm"]["rows"], csm["rows"], CSM_COLUMNS),
+    }
@@ -0,0 +1,299 @@
+"""
+Multi-period IFRS 17 store. Loads one JSON file per reporting date (same shape as
+ifrs17_sample_data.json) from IFRS17_PERIODS_DIR (default: project-root periods/).
+
+Periods share everything that did not change: each dataset is hashed, and a
+dataset whose content matches one already loaded reuses that Table (and its
+contract links and filter indexes), so memory grows with the changes between
+closes rather than with the number of periods. All periods share one set of
+dictionaries, so codes are comparable across periods.
+
+Every engine function takes `data=<period store>`; compare_periods() diffs the
+precomputed aggregates of two periods.
+"""
+from dataclasses import dataclass, field
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Any
+
+import numpy as np
+
+from services import ifrs17_engine
+from services.ifrs17_aggregates import get_aggregates, trend_pct
+from services.ifrs17_index import build_table_indexes
+from services.ifrs17_store import (
+    CONTRACT_KEYED,
+    Dictionary,
+    IFRS17Store,
+    Table,
+    build_table,
+    contract_rows_of,
+)
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+PERIODS_DIR = Path(os.environ.get("IFRS17_PERIODS_DIR", _PROJECT_ROOT / "periods"))
+
+
+@dataclass
+class PeriodSet:
+    """Stores by reporting period (sorted), plus each period's dataset content hashes."""
+
+    version: str
+    stores: dict[str, IFRS17Store]
+    hashes: dict[str, dict[str, str]]
+
+
+@dataclass
+class _Pool:
+    """Objects shared between periods, keyed by content hash."""
+
+    dictionaries: dict[str, Dictionary] = field(default_factory=dict)
+    # (dataset, hash) -> Table
+    tables: dict[tuple, Table] = field(default_factory=dict)
+    # (dataset, hash, contracts hash) -> contract rows / filter indexes
+    contract_rows: dict[tuple, np.ndarray] = field(default_factory=dict)
+    indexes: dict[tuple, dict] = field(default_factory=dict)
+
+
+_pool = _Pool()
+# path -> (file fingerprint, period store, dataset hashes)
+_files: dict[str, tuple[tuple[int, int], IFRS17Store, dict[str, str]]] = {}
+_periods_cache: PeriodSet | None = None
+_fingerprint: tuple | None = None
+_lock = threading.Lock()
+
+
+def _dataset_hash(rows: list[Any]) -> str:
+    raw = json.dumps(rows, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _link_key(dataset: str, hashes: dict[str, str]) -> tuple:
+    """Sharing key for objects that depend on the dataset and, if contract-keyed, on contracts."""
+    if dataset in CONTRACT_KEYED:
+        return dataset, hashes[dataset], hashes.get("contracts")
+    return dataset, hashes[dataset]
+
+
+def build_period(raw: dict[str, Any], version: str, pool: _Pool) -> tuple[IFRS17Store, dict[str, str]]:
+    """Columnar store for one period, reusing the pool's Tables, links and indexes where content matches."""
+    hashes = {k: _dataset_hash(v) for k, v in raw.items() if k != "metadata" and isinstance(v, list)}
+    tables = {}
+    for name, h in hashes.items():
+        table = pool.tables.get((name, h))
+        if table is None:
+            table = pool.tables[(name, h)] = build_table(name, raw[name], pool.dictionaries)
+        tables[name] = table
+    store = IFRS17Store(
+        metadata=raw.get("metadata", {}), tables=tables, dictionaries=pool.dictionaries, version=version
+    )
+    contracts = tables.get("contracts")
+    id_dict = pool.dictionaries.get("contract_id")
+    if contracts is not None and id_dict is not None and "contract_id" in contracts:
+        for name in CONTRACT_KEYED:
+            if name not in tables or "contract_id" not in tables[name]:
+                continue
+            key = _link_key(name, hashes)
+            rows = pool.contract_rows.get(key)
+            if rows is None:
+                rows = pool.contract_rows[key] = contract_rows_of(tables[name], contracts, id_dict)
+            store.contract_rows[name] = rows
+    for name in tables:
+        key = _link_key(name, hashes)
+        indexes = pool.indexes.get(key)
+        if indexes is None:
+            indexes = pool.indexes[key] = build_table_indexes(store, name)
+        store.indexes[name] = indexes
+    return store, hashes
+
+
+def _dir_fingerprint(directory: Path) -> tuple:
+    return tuple(
+        (p.name, p.stat().st_mtime_ns, p.stat().st_size) for p in sorted(directory.glob("*.json"))
+    )
+
+
+def _prune(pool: _Pool, hashes: list[dict[str, str]]) -> None:
+    """Drop pooled objects no loaded period uses any more."""
+    tables = {(d, h) for hs in hashes for d, h in hs.items()}
+    links = {_link_key(d, hs) for hs in hashes for d in hs}
+    pool.tables = {k: v for k, v in pool.tables.items() if k in tables}
+    pool.contract_rows = {k: v for k, v in pool.contract_rows.items() if k in links}
+    pool.indexes = {k: v for k, v in pool.indexes.items() if k in links}
+
+
+def load_periods(directory: Path | None = None) -> PeriodSet:
+    """
+    All reporting periods in the directory. Files are re-read only when their
+    mtime/size change; unchanged files keep their stores.
+    Raises FileNotFoundError if the directory has no period files.
+    """
+    global _periods_cache, _fingerprint
+    directory = directory or PERIODS_DIR
+    if not directory.is_dir():
+        raise FileNotFoundError(f"IFRS 17 periods directory not found: {directory}")
+    fingerprint = (str(directory), _dir_fingerprint(directory))
+    cached = _periods_cache
+    if cached is not None and fingerprint == _fingerprint:
+        return cached
+    with _lock:
+        if _periods_cache is not None and fingerprint == _fingerprint:
+            return _periods_cache
+        loaded: dict[str, tuple[IFRS17Store, dict[str, str]]] = {}
+        files = {}
+        for path in sorted(directory.glob("*.json")):
+            st = path.stat()
+            file_fp = (st.st_mtime_ns, st.st_size)
+            previous = _files.get(str(path))
+            if previous is not None and previous[0] == file_fp:
+                store, hashes = previous[1], previous[2]
+            else:
+                content = path.read_bytes()
+                version = hashlib.sha256(content).hexdigest()[:16]
+                store, hashes = build_period(json.loads(content), version, _pool)
+                # Aggregate now, while no other period can grow the shared dictionaries
+                get_aggregates(store)
+            files[str(path)] = (file_fp, store, hashes)
+            period = str(store.metadata.get("reporting_date") or path.stem)
+            if period in loaded:
+                logger.warning("Duplicate IFRS 17 reporting period %s; using file name %s", period, path.stem)
+                period = path.stem
+            loaded[period] = (store, hashes)
+        if not loaded:
+            raise FileNotFoundError(f"No IFRS 17 period files (*.json) in {directory}")
+        _files.clear()
+        _files.update(files)
+        _prune(_pool, [h for _, h in loaded.values()])
+        order = sorted(loaded)
+        versions = "|".join(f"{p}={loaded[p][0].version}" for p in order)
+        _periods_cache = PeriodSet(
+            version=hashlib.sha256(versions.encode("utf-8")).hexdigest()[:16],
+            stores={p: loaded[p][0] for p in order},
+            hashes={p: loaded[p][1] for p in order},
+        )
+        _fingerprint = fingerprint
+        return _periods_cache
+
+
+def periods_version() -> str:
+    """Version of the loaded period set (changes when any period file changes)."""
+    return load_periods().version
+
+
+def get_period(period: str) -> IFRS17Store:
+    """Store for one reporting period. Raises KeyError if unknown."""
+    stores = load_periods().stores
+    if period not in stores:
+        raise KeyError(f"Unknown reporting period: {period}")
+    return stores[period]
+
+
+def list_periods() -> dict[str, Any]:
+    """Periods in order, with the datasets each one shares with the previous period."""
+    periods = load_periods()
+    out = []
+    previous: dict[str, str] = {}
+    for period, store in periods.stores.items():
+        hashes = periods.hashes[period]
+        out.append({
+            "period": period,
+            "reporting_date": store.metadata.get("reporting_date"),
+            "version": store.version,
+            "datasets": len(hashes),
+            "unchanged_from_previous": [d for d, h in hashes.items() if previous.get(d) == h],
+        })
+        previous = hashes
+    table_refs = sum(len(h) for h in periods.hashes.values())
+    distinct = len({(d, h) for hs in periods.hashes.values() for d, h in hs.items()})
+    return {"periods": out, "tables_referenced": table_refs, "tables_in_memory": distinct}
+
+
+def _delta(base: Any, other: Any) -> dict[str, Any]:
+    """base, other, delta and delta % for two numbers (missing counts as 0)."""
+    a = base or 0
+    b = other or 0
+    diff = b - a
+    if isinstance(diff, float):
+        diff = round(diff, 6)
+    return {"base": base, "other": other, "delta": diff, "delta_pct": trend_pct(b, a)}
+
+
+def _is_figure(v: Any) -> bool:
+    return v is None or (isinstance(v, (int, float)) and not isinstance(v, bool))
+
+
+def _delta_fields(base: dict[str, Any], other: dict[str, Any]) -> dict[str, Any]:
+    """Deltas of every numeric field present in either dict."""
+    keys = list(base) + [k for k in other if k not in base]
+    return {
+        k: _delta(base.get(k), other.get(k))
+        for k in keys
+        if _is_figure(base.get(k)) and _is_figure(other.get(k))
+    }
+
+
+def _delta_rows(base: list[dict], other: list[dict], columns: tuple[str, ...]) -> list[dict[str, Any]]:
+    """Per (portfolio, cohort_year) column deltas of two reconciliations; absent cells count as 0."""
+    cells: dict[tuple, dict[str, Any]] = {}
+    for sign, rows in ((-1, base), (1, other)):
+        for r in rows:
+            cell = cells.setdefault(
+                (r.get("portfolio"), r.get("cohort_year")),
+                {"portfolio": r.get("portfolio"), "cohort_year": r.get("cohort_year"), **{c: 0 for c in columns}},
+            )
+            for c in columns:
+                cell[c] += sign * (r.get(c) or 0)
+    out = list(cells.values())
+    for row in out:
+        for c in columns:
+            if isinstance(row[c], float):
+                row[c] = round(row[c], 6)
+    return out
+
+
+def compare_periods(base: str, other: str) -> dict[str, Any]:
+    """
+    Changes from period `base` to period `other`: summary figures, by-portfolio
+    figures and reconciliation rows/totals. Raises KeyError for an unknown period.
+    """
+    a, b = get_period(base), get_period(other)
+    sa, sb = get_aggregates(a).summary, get_aggregates(b).summary
+    hashes = load_periods().hashes
+    portfolios = list(sa["by_portfolio"]) + [p for p in sb["by_portfolio"] if p not in sa["by_portfolio"]]
+    liability_a = ifrs17_engine.get_reconciliation_liability(data=a)
+    liability_b = ifrs17_engine.get_reconciliation_liability(data=b)
+    csm_a = ifrs17_engine.get_reconciliation_csm(data=a)
+    csm_b = ifrs17_engine.get_reconciliation_csm(data=b)
+    return {
+        "base": base,
+        "other": other,
+        "unchanged_datasets": [d for d, h in hashes[other].items() if hashes[base].get(d) == h],
+        "summary": _delta_fields(sa, sb),
+        "by_portfolio": {
+            p: _delta_fields(sa["by_portfolio"].get(p, {}), sb["by_portfolio"].get(p, {})) for p in portfolios
+        },
+        "liability_reconciliation": {
+            "rows": _delta_rows(liability_a["rows"], liability_b["rows"], ifrs17_engine.LIABILITY_COLUMNS),
+            "totals": _delta_fields(liability_a["totals"], liability_b["totals"]),
+        },
+        "csm_reconciliation": {
+            "rows": _delta_rows(csm_a["rows"], csm_b["rows"], ifrs17_engine.CSM_COLUMNS),
+            "totals": _delta_fields(csm_a["totals"], csm_b["totals"]),
+        },
+    }
+
+
+def clear_cache() -> None:
+    """Forget all loaded periods (e.g. for tests)."""
+    global _pool, _periods_cache, _fingerprint
+    with _lock:
+        _pool = _Pool()
+        _files.clear()
+        _periods_cache = None
+        _fingerprint = None
@@ -0,0 +1,417 @@
+"""
+Ad-hoc group-by / pivot queries over the columnar IFRS 17 snapshot.
+
+A query names a dataset (optionally joined to contracts on contract_id), the
+dimensions to group by, measures (sum, count, mean, ratio) and filters. A small
+planner turns it into vectorized steps and returns the plan with the result:
+1. Index lookup: eq / in filters on indexed columns (ifrs17_index.FILTERS) read
+   posting lists, shortest first. Without one, every row is scanned.
+2. Join: contract columns are read through each row's contract row, the hash
+   join on contract_id built at load (IFRS17Store.contract_rows). The join is
+   inner: rows whose contract_id has no contract are dropped.
+3. Filter: the remaining filters are evaluated as masks on the rows left.
+4. Group-by: each dimension is factorized (np.unique) into ranks in value order,
+   the ranks are combined into one group id, and every measure is one np.bincount
+   over (group, pivot column) cells.
+
+Column references are the dataset's own columns, or with join=contracts also
+contract columns (`product`, or `contracts.product` when the name is in both).
+"""
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from services import metrics
+from services.ifrs17_data import load_data
+from services.ifrs17_index import FILTERS, select_rows
+from services.ifrs17_store import (
+    CATEGORY,
+    CONTRACT_KEYED,
+    DATE,
+    FLOAT,
+    INT,
+    Column,
+    IFRS17Store,
+    contract_rows_of,
+)
+
+JOINS = ("contracts",)
+OPS = ("sum", "count", "mean", "ratio")
+FILTER_OPS = ("eq", "in", "gt", "gte", "lt", "lte")
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+_CONTRACT_PREFIX = "contracts."
+# Label of the null group in pivot column keys
+_NULL_LABEL = "null"
+
+
+@dataclass(frozen=True)
+class Measure:
+    """
+    One figure per group. op: sum, mean (of non-null values), count (rows, or
+    non-null values of `column`) or ratio (sum of column / sum of denominator).
+    """
+
+    op: str
+    column: str | None = None
+    denominator: str | None = None
+    # Output key; default e.g. sum_gross_premium
+    name: str | None = None
+
+    @property
+    def label(self) -> str:
+        if self.name:
+            return self.name
+        if self.op == "ratio":
+            return f"ratio_{self.column}_{self.denominator}"
+        return self.op if self.column is None else f"{self.op}_{self.column}"
+
+
+@dataclass(frozen=True)
+class Filter:
+    """column op value; `in` takes a list, gt/gte/lt/lte need a number or date column."""
+
+    column: str
+    value: Any
+    op: str = "eq"
+
+
+@dataclass
+class _Source:
+    """A resolved column reference: the column and whether it is read through the contract link."""
+
+    ref: str
+    name: str
+    column: Column
+    via_contract: bool
+
+
+class _Planner:
+    """Resolves column references for one query and records the plan steps."""
+
+    def __init__(self, data: IFRS17Store, dataset: str, join: str | None):
+        if dataset not in data.tables:
+            raise ValueError(f"Unknown dataset: {dataset}")
+        if join is not None and join not in JOINS:
+            raise ValueError(f"Unknown join: {join} (choose from {', '.join(JOINS)})")
+        if join is not None and dataset not in CONTRACT_KEYED:
+            raise ValueError(f"join={join} applies to {', '.join(CONTRACT_KEYED)}")
+        self.data = data
+        self.dataset = dataset
+        self.table = data.table(dataset)
+        self.contracts = data.table("contracts")
+        self.joined = join is not None
+        self.steps: list[str] = []
+        self.links: np.ndarray | None = None
+        if self.joined:
+            links = data.contract_rows.get(dataset)
+            if links is None:
+                links = contract_rows_of(self.table, self.contracts, data.dictionaries["contract_id"])
+            self.links = links
+
+    def resolve(self, ref: str) -> _Source:
+        name = ref[len(_CONTRACT_PREFIX):] if ref.startswith(_CONTRACT_PREFIX) else ref
+        if ref.startswith(_CONTRACT_PREFIX) and self.dataset != "contracts":
+            if not self.joined:
+                raise ValueError(f"Column {ref} needs join=contracts")
+            via_contract = True
+        else:
+            via_contract = name not in self.table and self.joined
+        source = self.contracts if via_contract or self.dataset == "contracts" else self.table
+        if name not in source:
+            hint = " (add join=contracts for contract columns)" if not self.joined and name in self.contracts else ""
+            raise ValueError(f"Unknown column for {self.dataset}: {ref}{hint}")
+        return _Source(ref, name, source.columns[name], via_contract)
+
+    def values(self, source: _Source, rows: np.ndarray) -> np.ndarray:
+        """Column values for rows of the dataset (through the contract link for contract columns)."""
+        if source.via_contract:
+            return source.column.values[self.links[rows]]
+        return source.column.values[rows]
+
+    def indexed(self, source: _Source) -> bool:
+        """True if the filter index on this column has the same meaning (see IFRS17Store.dimension)."""
+        if source.name not in FILTERS.get(self.dataset, ()) or self.dataset not in self.data.indexes:
+            return False
+        own = source.name in self.table
+        return source.name == "contract_id" or own != source.via_contract
+
+
+def _numeric(source: _Source) -> None:
+    if source.column.kind not in (INT, FLOAT):
+        raise ValueError(f"{source.ref} is not a numeric column")
+
+
+def _filter_values(f: Filter) -> list[Any]:
+    if f.op == "in":
+        if not isinstance(f.value, list) or not f.value:
+            raise ValueError(f"Filter {f.column} in needs a non-empty list")
+        values = f.value
+    else:
+        values = [f.value]
+    if any(v is None or isinstance(v, (list, dict)) for v in values):
+        raise ValueError(f"Filter {f.column} {f.op} needs non-null scalar values")
+    return values
+
+
+def _targets(source: _Source, f: Filter) -> list[str] | np.ndarray:
+    """Filter values checked against the column: strings for category columns, else a date or number array."""
+    col = source.column
+    wanted = _filter_values(f)
+    if col.kind == CATEGORY:
+        if f.op not in ("eq", "in"):
+            raise ValueError(f"Filter {f.column} {f.op} needs a number or date column")
+        if any(not isinstance(v, str) for v in wanted):
+            raise ValueError(f"Filter {f.column} expects string values")
+        return wanted
+    try:
+        if col.kind == DATE:
+            if any(not isinstance(v, str) for v in wanted):
+                raise ValueError
+            return np.array(wanted, dtype="datetime64[D]")
+        if any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in wanted):
+            raise ValueError
+        return np.array(wanted, dtype=np.float64)
+    except ValueError:
+        kind = "YYYY-MM-DD date" if col.kind == DATE else "number"
+        raise ValueError(f"Filter {f.column} expects a {kind}") from None
+
+
+def _mask(source: _Source, values: np.ndarray, f: Filter) -> np.ndarray:
+    """Boolean mask of values matching one filter."""
+    col = source.column
+    targets = _targets(source, f)
+    if col.kind == CATEGORY:
+        codes = [c for c in (col.dictionary.code(v) for v in targets) if c >= 0]
+        return np.isin(values, codes)
+    if f.op == "in":
+        return np.isin(values, targets)
+    target = targets[0]
+    if f.op == "eq":
+        return values == target
+    if f.op == "gt":
+        return values > target
+    if f.op == "gte":
+        return values >= target
+    if f.op == "lt":
+        return values < target
+    return values <= target
+
+
+def _select(plan: _Planner, filters: list[Filter]) -> np.ndarray:
+    """Row ids matching all filters: index lookups first, then the join, then masks."""
+    n = len(plan.table)
+    lists: list[tuple[np.ndarray, str]] = []
+    residual: list[tuple[_Source, Filter]] = []
+    for f in filters:
+        if f.op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter op: {f.op} (choose from {', '.join(FILTER_OPS)})")
+        source = plan.resolve(f.column)
+        # Every filter value is checked before any lookup
+        wanted = _targets(source, f)
+        if f.op in ("eq", "in") and plan.indexed(source):
+            if source.column.kind != CATEGORY:
+                # Integer keys: a fractional value matches no row
+                wanted = [int(v) for v in wanted.tolist() if v.is_integer()]
+            parts = [select_rows(plan.data, plan.dataset, {source.name: v}) for v in wanted]
+            rows = parts[0] if len(parts) == 1 else np.unique(np.concatenate([np.zeros(0, np.int64), *parts]))
+            lists.append((rows, f"index {plan.dataset}.{source.name} {f.op} {f.value!r}"))
+        else:
+            residual.append((source, f))
+
+    if lists:
+        # Intersect shortest posting lists first
+        lists.sort(key=lambda item: len(item[0]))
+        rows = lists[0][0]
+        for other, step in lists:
+            if other is not rows:
+                rows = np.intersect1d(rows, other, assume_unique=True)
+            plan.steps.append(f"{step}: {len(rows)} rows")
+    else:
+        rows = np.arange(n, dtype=np.int64)
+        plan.steps.append(f"scan {plan.dataset}: {n} rows")
+
+    if plan.joined:
+        rows = rows[plan.links[rows] >= 0]
+        plan.steps.append(f"hash join contracts on contract_id (inner): {len(rows)} rows")
+
+    for source, f in residual:
+        rows = rows[_mask(source, plan.values(source, rows), f)]
+        plan.steps.append(f"filter {f.column} {f.op} {f.value!r}: {len(rows)} rows")
+    return rows
+
+
+def _nulls(col: Column, values: np.ndarray) -> np.ndarray:
+    if col.kind == CATEGORY:
+        return values < 0
+    if values.dtype.kind == "M":
+        return np.isnat(values)
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    return np.zeros(len(values), dtype=bool)
+
+
+def _factorize(source: _Source, values: np.ndarray) -> tuple[np.ndarray, list[Any]]:
+    """Rank of each value in value order (nulls last) and the label of each rank."""
+    col = source.column
+    null = _nulls(col, values)
+    unique, inverse = np.unique(values[~null], return_inverse=True)
+    if col.kind == CATEGORY:
+        names = col.dictionary.decode(unique)
+        by_name = np.argsort(np.array(names, dtype=object), kind="stable")
+        rank = np.empty(len(unique), dtype=np.int64)
+        rank[by_name] = np.arange(len(unique))
+        inverse = rank[inverse]
+        labels = [names[i] for i in by_name.tolist()]
+    else:
+        labels = Column(col.kind, unique).to_list()
+    ranks = np.full(len(values), len(unique), dtype=np.int64)
+    ranks[~null] = inverse
+    if null.any():
+        labels.append(None)
+    return ranks, labels
+
+
+def _groups(ranks: list[np.ndarray], sizes: list[int], n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Dense group id per row (groups in dimension order) and the first row of each group."""
+    if not ranks:
+        return np.zeros(n, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    gid = ranks[0]
+    for r, size in zip(ranks[1:], sizes[1:]):
+        # Re-densify after each dimension so the combined key stays below n * size
+        gid = np.unique(gid * size + r, return_inverse=True)[1]
+    _, first, inverse = np.unique(gid, return_index=True, return_inverse=True)
+    return inverse.astype(np.int64), first
+
+
+def _measure(plan: _Planner, m: Measure, rows: np.ndarray, cells: np.ndarray, size: int) -> tuple[np.ndarray, bool]:
+    """Measure per cell as a float array (NaN where undefined), and whether it is reported as int."""
+    if m.op not in OPS:
+        raise ValueError(f"Unknown measure op: {m.op} (choose from {', '.join(OPS)})")
+    if m.op == "count" and m.column is None:
+        return np.bincount(cells, minlength=size).astype(np.float64), True
+    if m.column is None:
+        raise ValueError(f"Measure {m.op} needs a column")
+    source = plan.resolve(m.column)
+    values = plan.values(source, rows)
+    if m.op == "count":
+        return np.bincount(cells, weights=~_nulls(source.column, values), minlength=size), True
+    _numeric(source)
+    values = values.astype(np.float64)
+    present = ~np.isnan(values)
+    sums = np.bincount(cells, weights=np.nan_to_num(values), minlength=size)
+    if m.op == "sum":
+        return sums, source.column.kind == INT
+    if m.op == "mean":
+        counts = np.bincount(cells, weights=present, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan), False
+    if m.denominator is None:
+        raise ValueError("Measure ratio needs a denominator column")
+    denominator = plan.resolve(m.denominator)
+    _numeric(denominator)
+    below = np.bincount(cells, weights=np.nan_to_num(plan.values(denominator, rows).astype(np.float64)), minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(below != 0, sums / below, np.nan), False
+
+
+def _number(x: float, integer: bool) -> int | float | None:
+    if x != x:
+        return None
+    return int(round(x)) if integer else float(x)
+
+
+@metrics.timed()
+def run_query(
+    dataset: str,
+    dimensions: list[str] | None = None,
+    measures: list[Measure] | None = None,
+    filters: list[Filter] | None = None,
+    join: str | None = None,
+    pivot: str | None = None,
+    order_by: str | None = None,
+    limit: int = DEFAULT_LIMIT,
+    data: IFRS17Store | None = None,
+) -> dict[str, Any]:
+    """
+    Group `dataset` rows by `dimensions` and compute `measures` per group
+    (default: row count). With `pivot` (one of the dimensions), its values
+    become columns: each measure is then {pivot value: figure} per row.
+    order_by: a dimension or measure name, "-name" for descending (default:
+    dimension values ascending, nulls last). Raises ValueError for an invalid query.
+    Returns {"dataset", "join", "dimensions", "measures", "columns", "total", "rows", "plan"}.
+    """
+    data = load_data() if data is None else data
+    dimensions = list(dimensions or [])
+    measures = list(measures or [Measure("count")])
+    if len(set(dimensions)) != len(dimensions):
+        raise ValueError("Dimensions must be distinct")
+    labels = [m.label for m in measures]
+    if len(set(labels) | set(dimensions)) != len(labels) + len(dimensions):
+        raise ValueError("Measure names must be distinct and differ from the dimensions")
+    if pivot is not None and pivot not in dimensions:
+        raise ValueError("pivot must be one of the dimensions")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+
+    plan = _Planner(data, dataset, join)
+    rows = _select(plan, filters or [])
+
+    outer = [d for d in dimensions if d != pivot]
+    factors = {d: _factorize(src, plan.values(src, rows)) for d, src in ((d, plan.resolve(d)) for d in dimensions)}
+    group_of, first = _groups([factors[d][0] for d in outer], [len(factors[d][1]) for d in outer], len(rows))
+    n_groups = len(first)
+    columns = factors[pivot][1] if pivot is not None else [None]
+    cells = group_of * len(columns) + (factors[pivot][0] if pivot is not None else 0)
+    size = n_groups * len(columns)
+    figures = {}
+    for m in measures:
+        values, integer = _measure(plan, m, rows, cells, size)
+        figures[m.label] = (values.reshape(n_groups, len(columns)), integer)
+    plan.steps.append(
+        f"group by {', '.join(dimensions) or '(all rows)'}: {n_groups} groups"
+        + (f" x {len(columns)} {pivot} columns" if pivot is not None else "")
+    )
+
+    # Dimension ranks of each group (for labels and ordering)
+    group_ranks = {d: factors[d][0][first] for d in outer}
+    order = np.arange(n_groups)
+    if order_by is not None:
+        key_name = order_by.lstrip("-")
+        if key_name in group_ranks:
+            key = group_ranks[key_name].astype(np.float64)
+        elif key_name in figures:
+            key = np.nansum(figures[key_name][0], axis=1)
+            key[np.isnan(figures[key_name][0]).all(axis=1)] = np.nan
+        else:
+            raise ValueError(f"order_by must be one of the dimensions or measures, not {key_name}")
+        if order_by.startswith("-"):
+            key = -key
+        # NaN (undefined) last in either direction
+        order = np.lexsort((order, key, np.isnan(key)))
+    order = order[:limit]
+
+    out_rows = []
+    for g in order.tolist():
+        row: dict[str, Any] = {d: factors[d][1][int(group_ranks[d][g])] for d in outer}
+        for label, (values, integer) in figures.items():
+            if pivot is None:
+                row[label] = _number(values[g, 0], integer)
+            else:
+                row[label] = {
+                    _NULL_LABEL if c is None else str(c): _number(x, integer)
+                    for c, x in zip(columns, values[g].tolist())
+                }
+        out_rows.append(row)
+    return {
+        "dataset": dataset,
+        "join": join,
+        "dimensions": dimensions,
+        "measures": labels,
+        "columns": None if pivot is None else [_NULL_LABEL if c is None else c for c in columns],
+        "total": n_groups,
+        "rows": out_rows,
+        "plan": plan.steps,
+    }
@@ -0,0 +1,187 @@
+"""
+IFRS 17 sensitivity and scenario runs (e.g. "liability if discount rate +1%",
+"CSM if lapse +10%") on top of the measurement engine.
+
+Scenarios are evaluated together: measure_contracts() takes a stack of shocked
+discount curves / assumptions and computes every scenario in one array pass
+(scenarios x contracts). Scenario lists are cut into batches that keep that
+array bounded; large runs spread the batches over a process pool. Results are
+per-(portfolio, cohort) deltas against the base run.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+import itertools
+import math
+import multiprocessing
+import os
+import threading
+from typing import Any, Sequence
+
+import numpy as np
+
+from services import ifrs17_data
+from services.ifrs17_aggregates import trend_pct
+from services.ifrs17_measurement import (
+    BALANCES,
+    MeasurementBasis,
+    Shock,
+    cell_sums,
+    measure_contracts,
+    measurement_period,
+)
+
+# Scenario x contract values per vectorized pass (bounds memory per batch)
+MAX_BATCH_CELLS = 4_000_000
+# Runs larger than this (scenarios x contracts) use the process pool
+POOL_THRESHOLD = 8_000_000
+WORKERS = int(os.environ.get("IFRS17_SCENARIO_WORKERS", os.cpu_count() or 1))
+MAX_SCENARIOS = 1000
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """A named set of shocks applied together."""
+
+    name: str
+    shocks: tuple[Shock, ...] = ()
+
+
+def scenario_grid(axes: Sequence[tuple[Shock, Sequence[float]]]) -> list[Scenario]:
+    """
+    Cartesian product of shock axes: each axis is a template shock (target,
+    relative, portfolio) and the values to try, e.g. discount_rate [-1, 0, 1] x
+    lapse_rate relative [-0.1, 0, 0.1] -> 9 scenarios. Raises ValueError when
+    the product exceeds MAX_SCENARIOS (checked before any scenario is built).
+    """
+    size = math.prod(len(values) for _, values in axes)
+    if size > MAX_SCENARIOS:
+        raise ValueError(f"Grid has {size} scenarios; at most {MAX_SCENARIOS} per run")
+    scenarios = []
+    for values in itertools.product(*(vals for _, vals in axes)):
+        shocks = tuple(
+            Shock(t.target, v, t.relative, t.portfolio) for (t, _), v in zip(axes, values) if v != 0
+        )
+        scenarios.append(Scenario(", ".join(_label(s) for s in shocks) or "base", shocks))
+    return scenarios
+
+
+def _label(shock: Shock) -> str:
+    value = f"{shock.value * 100:+g}%" if shock.relative else f"{shock.value:+g}"
+    scope = f" [{shock.portfolio}]" if shock.portfolio else ""
+    return f"{shock.target} {value}{scope}"
+
+
+def _evaluate(
+    data: Any, basis: MeasurementBasis, start: int, end: int, batch: Sequence[tuple[Shock, ...]]
+) -> tuple[list, np.ndarray, dict[str, np.ndarray]]:
+    """One vectorized pass: closing balances per (portfolio, cohort) for each scenario in the batch."""
+    flows = measure_contracts(data, basis, start, end, batch)
+    grouped = cell_sums(data, flows, BALANCES)
+    return grouped.labels, grouped.contracts, grouped.sums
+
+
+def _run_batch(
+    version: str, basis: MeasurementBasis, start: int, end: int, batch: Sequence[tuple[Shock, ...]]
+) -> tuple[list, np.ndarray, dict[str, np.ndarray]]:
+    """Pool worker: evaluate a batch on the worker's copy of the data (same version as the caller)."""
+    data = ifrs17_data.load_data()
+    if data.version != version:
+        ifrs17_data.reload_if_changed()
+        data = ifrs17_data.load_data()
+        if data.version != version:
+            raise RuntimeError("IFRS 17 data changed during the scenario run; retry")
+    return _evaluate(data, basis, start, end, batch)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared worker pool. Workers start from a clean interpreter and load the data once."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=context)
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker pool (e.g. on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _delta(value: float, base: float) -> dict[str, Any]:
+    return {"value": round(value, 2) + 0.0, "delta": round(value - base, 2) + 0.0, "delta_pct": trend_pct(value, base)}
+
+
+def run_scenarios(
+    scenarios: Sequence[Scenario],
+    basis: MeasurementBasis | None = None,
+    period_start: str | None = None,
+    workers: int | None = None,
+) -> dict[str, Any]:
+    """
+    Closing balances for the base run and every scenario, with per-(portfolio,
+    cohort) deltas against base. Raises ValueError for an invalid shock or too many scenarios.
+    """
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ValueError(f"At most {MAX_SCENARIOS} scenarios per run")
+    data = ifrs17_data.load_data()
+    basis = basis or MeasurementBasis()
+    period_start, start, end = measurement_period(data, period_start)
+    n_contracts = max(len(data.table("contracts")), 1)
+    # Base run first, then every scenario
+    runs = [()] + [tuple(s.shocks) for s in scenarios]
+    size = max(1, MAX_BATCH_CELLS // n_contracts)
+    batches = [runs[i:i + size] for i in range(0, len(runs), size)]
+    workers = WORKERS if workers is None else workers
+    pooled = workers > 1 and len(batches) > 1 and len(runs) * n_contracts > POOL_THRESHOLD
+    if pooled:
+        pool = _get_pool()
+        futures = [pool.submit(_run_batch, data.version, basis, start, end, b) for b in batches]
+        results = [f.result() for f in futures]
+    else:
+        results = [_evaluate(data, basis, start, end, b) for b in batches]
+
+    labels, contracts = results[0][0], results[0][1]
+    sums = {k: np.concatenate([r[2][k] for r in results]) for k in BALANCES}
+    base = {k: v[0] for k, v in sums.items()}
+    out_scenarios = []
+    for i, scenario in enumerate(scenarios, start=1):
+        rows = []
+        for j, (portfolio, cohort_year) in enumerate(labels):
+            row: dict[str, Any] = {"portfolio": portfolio, "cohort_year": cohort_year}
+            row.update({k: round(float(sums[k][i, j] - base[k][j]), 2) + 0.0 for k in BALANCES})
+            rows.append(row)
+        out_scenarios.append({
+            "name": scenario.name,
+            "shocks": [asdict(s) for s in scenario.shocks],
+            "totals": {k: _delta(float(sums[k][i].sum()), float(base[k].sum())) for k in BALANCES},
+            "deltas": rows,
+        })
+    return {
+        "reporting_date": data.metadata.get("reporting_date"),
+        "period_start": period_start,
+        "basis": asdict(basis),
+        "base": {
+            "totals": {k: round(float(base[k].sum()), 2) + 0.0 for k in BALANCES},
+            "rows": [
+                {
+                    "portfolio": p,
+                    "cohort_year": y,
+                    "contracts": int(contracts[j]),
+                    **{k: round(float(base[k][j]), 2) + 0.0 for k in BALANCES},
+                }
+                for j, (p, y) in enumerate(labels)
+            ],
+        },
+        "scenarios": out_scenarios,
+        "batches": len(batches),
+        "workers": workers if pooled else 1,
+    }
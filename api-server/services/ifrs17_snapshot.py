@@ -0,0 +1,526 @@
+"""
+Compiled, memory-mapped IFRS 17 snapshots.
+
+compile_snapshot() (CLI below) turns the JSON file, or a directory of
+IFRS17_sample_data_<dataset>.csv files, into a directory of fixed-width NumPy columns:
+
+    <out>/manifest.json              format, version, metadata, column kinds, file names
+    <out>/v-<version>-f<format>/<table>.<column>.npy
+    <out>/v-<version>-f<format>/dict.<column>.<part>.npy         string dictionary (UTF-8 data, offsets, order)
+    <out>/v-<version>-f<format>/links.<table>.npy                contract row of each row
+    <out>/v-<version>-f<format>/index.<table>.<key>.<part>.npy   posting-list indexes (keys, offsets, order)
+    <out>/v-<version>-f<format>/lineage.<table>.<part>.npy       row ids per aggregate cell (keys, offsets, order)
+    <out>/v-<version>-f<format>/grid.<table>.<column>.npy        aggregate grids (services/ifrs17_aggregates.py)
+    <out>/v-<version>-f<format>/validation.<n>.<part>.npy        rows failing each validation rule (and expected values)
+
+open_snapshot() maps every array read-only with np.load(mmap_mode="r"), so opening
+takes milliseconds, pages are read on first touch, and all uvicorn workers on the
+host share the same physical pages through the OS page cache. Nothing is unpickled
+or decoded per worker: the dashboard figures are reassembled from the mapped grids,
+the validation report from the mapped row ids, and string dictionaries decode only
+the values a request reads (ifrs17_store.MappedDictionary).
+
+The manifest is replaced atomically and names its data directory, so recompiling
+while workers are serving is safe: the watcher in ifrs17_data sees the new
+manifest and maps the new directory; the previous directory is kept for workers
+still swapping over, older ones are removed.
+
+CSV input is read CSV_CHUNK_ROWS rows at a time into typed arrays, so compiling
+never holds a whole dataset as Python objects.
+
+Usage (from api-server):
+    python -m services.ifrs17_snapshot --json ../ifrs17_sample_data.json --out ../ifrs17_snapshot
+    python -m services.ifrs17_snapshot --csv-dir /data/csv --metadata /data/metadata.json --out /data/snapshot
+Then set IFRS17_DATA_PATH to the --out directory.
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+from pathlib import Path
+import shutil
+import time
+from typing import Any, Callable
+
+import numpy as np
+from sqlalchemy import String
+
+from models.db_models import IFRS17_TABLES
+from services.ifrs17_aggregates import Aggregates, CellGrid, assemble, get_aggregates
+from services.ifrs17_index import PostingIndex, SegmentedIndex, build_indexes
+from services.ifrs17_ingest import csv_path
+from services.ifrs17_store import (
+    CATEGORY,
+    DATASETS,
+    DATE,
+    FLOAT,
+    INT,
+    Column,
+    Dictionary,
+    IFRS17Store,
+    MappedDictionary,
+    Table,
+    build_store,
+    link_contracts,
+)
+from services.ifrs17_validation import CheckResult, ValidationReport, get_validation
+
+FORMAT = 4
+MANIFEST = "manifest.json"
+_DATA_PREFIX = "v-"
+# Rows per chunk when reading CSV input
+CSV_CHUNK_ROWS = 65536
+
+
+def is_snapshot(path: Path) -> bool:
+    """True if path is a compiled snapshot directory."""
+    return path.is_dir() and (path / MANIFEST).is_file()
+
+
+def read_manifest(path: Path) -> dict[str, Any]:
+    manifest = json.loads((path / MANIFEST).read_text(encoding="utf-8"))
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"Unsupported IFRS 17 snapshot format {manifest.get('format')} in {path}")
+    return manifest
+
+
+def _save(directory: Path, name: str, array: np.ndarray) -> str:
+    np.save(directory / name, np.ascontiguousarray(array), allow_pickle=False)
+    return name
+
+
+def _load(directory: Path, name: str) -> np.ndarray:
+    array = np.load(directory / name, mmap_mode="r", allow_pickle=False)
+    # Plain ndarray view over the mapping (results of NumPy ops are then plain arrays too)
+    return np.asarray(array)
+
+
+def _save_dictionary(directory: Path, name: str, dictionary: Dictionary) -> dict[str, str]:
+    """UTF-8 bytes of the values, their offsets (one more than values) and the codes in value order."""
+    values = dictionary.values
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    order = np.array(sorted(range(len(values)), key=values.__getitem__), dtype=np.int64)
+    return {
+        "data": _save(directory, f"dict.{name}.data.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8)),
+        "offsets": _save(directory, f"dict.{name}.offsets.npy", offsets),
+        "order": _save(directory, f"dict.{name}.order.npy", order),
+    }
+
+
+def _save_index(directory: Path, prefix: str, index: PostingIndex | SegmentedIndex) -> dict[str, str]:
+    merged = index.merged() if isinstance(index, SegmentedIndex) else index
+    return {
+        part: _save(directory, f"{prefix}.{part}.npy", getattr(merged, part)) for part in ("keys", "offsets", "order")
+    }
+
+
+def _load_index(directory: Path, parts: dict[str, str]) -> PostingIndex:
+    return PostingIndex(**{part: _load(directory, file) for part, file in parts.items()})
+
+
+def _save_aggregates(directory: Path, aggregates: Aggregates) -> dict[str, Any]:
+    """Grids and lineage as arrays; every other figure is reassembled from the grids on open."""
+    return {
+        "cohorts": aggregates.cohorts,
+        "portfolio_order": list(aggregates.by_portfolio),
+        "grids": {
+            name: {
+                "count": _save(directory, f"grid.{name}.count.npy", grid.count),
+                "sums": {c: _save(directory, f"grid.{name}.{c}.npy", s) for c, s in grid.sums.items()},
+                "integer": sorted(grid.integer),
+            }
+            for name, grid in aggregates.grids.items()
+        },
+        "lineage": {
+            name: _save_index(directory, f"lineage.{name}", index) for name, index in aggregates.lineage.items()
+        },
+    }
+
+
+def _load_aggregates(directory: Path, store: IFRS17Store, entry: dict[str, Any]) -> Aggregates:
+    grids = {
+        name: CellGrid(
+            _load(directory, g["count"]),
+            {c: _load(directory, file) for c, file in g["sums"].items()},
+            set(g["integer"]),
+        )
+        for name, g in entry["grids"].items()
+    }
+    lineage = {name: _load_index(directory, parts) for name, parts in entry["lineage"].items()}
+    cohorts = np.asarray(entry["cohorts"], dtype=np.int64)
+    return assemble(store, cohorts, grids, entry["portfolio_order"], lineage)
+
+
+def _save_validation(directory: Path, report: ValidationReport) -> dict[str, Any]:
+    results = []
+    for i, r in enumerate(report.results):
+        result = {
+            "check": r.check,
+            "dataset": r.dataset,
+            "rule": r.rule,
+            "columns": list(r.columns),
+            "rows": _save(directory, f"validation.{i}.rows.npy", r.rows),
+        }
+        if r.expected is not None:
+            result["expected"] = _save(directory, f"validation.{i}.expected.npy", r.expected)
+        results.append(result)
+    return {"version": report.version, "rows_checked": report.rows_checked, "results": results}
+
+
+def _load_validation(directory: Path, entry: dict[str, Any]) -> ValidationReport:
+    results = [
+        CheckResult(
+            r["check"],
+            r["dataset"],
+            r["rule"],
+            _load(directory, r["rows"]),
+            tuple(r["columns"]),
+            _load(directory, r["expected"]) if "expected" in r else None,
+        )
+        for r in entry["results"]
+    ]
+    return ValidationReport(entry["version"], entry["rows_checked"], results)
+
+
+def _write_arrays(store: IFRS17Store, directory: Path) -> dict[str, Any]:
+    """Write every array of the store into directory; returns the manifest entries."""
+    tables: dict[str, Any] = {}
+    for name, table in store.tables.items():
+        columns = {}
+        for col_name, col in table.columns.items():
+            columns[col_name] = {
+                "kind": col.kind,
+                "file": _save(directory, f"{name}.{col_name}.npy", col.values),
+            }
+            if col.ints is not None:
+                columns[col_name]["ints"] = _save(directory, f"{name}.{col_name}.ints.npy", col.ints)
+        tables[name] = {"n_rows": table.n_rows, "columns": columns}
+    dictionaries = {name: _save_dictionary(directory, name, d) for name, d in store.dictionaries.items()}
+    links = {name: _save(directory, f"links.{name}.npy", rows) for name, rows in store.contract_rows.items()}
+    indexes = {
+        name: {key: _save_index(directory, f"index.{name}.{key}", index) for key, index in table_indexes.items()}
+        for name, table_indexes in store.indexes.items()
+    }
+    return {
+        "tables": tables,
+        "dictionaries": dictionaries,
+        "contract_rows": links,
+        "indexes": indexes,
+        "aggregates": _save_aggregates(directory, get_aggregates(store)),
+        "validation": _save_validation(directory, get_validation(store)),
+    }
+
+
+def _prune(out_dir: Path, keep: set[str]) -> None:
+    """Remove data directories other than `keep` (workers may still map the previous one)."""
+    for child in out_dir.iterdir():
+        if child.is_dir() and child.name.startswith(_DATA_PREFIX) and child.name not in keep:
+            shutil.rmtree(child, ignore_errors=True)
+
+
+def _data_dir_name(store: IFRS17Store) -> str:
+    # The format is part of the name, so a directory written by an older format is never reused
+    return f"{_DATA_PREFIX}{store.version or 'unversioned'}-f{FORMAT}"
+
+
+def compile_snapshot(store: IFRS17Store, out_dir: Path) -> Path:
+    """
+    Write store (with its indexes; built here if missing) as a snapshot under
+    out_dir and switch the manifest to it. Returns out_dir.
+    """
+    if not store.indexes:
+        store.indexes = build_indexes(store)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    data_name = _data_dir_name(store)
+    target = out_dir / data_name
+    work = out_dir / f".{data_name}.{os.getpid()}"
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir()
+    try:
+        entries = _write_arrays(store, work)
+        # Same version means same content: leave a directory workers may have mapped in place
+        if not target.exists():
+            work.rename(target)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    previous = None
+    if (out_dir / MANIFEST).exists():
+        try:
+            previous = read_manifest(out_dir).get("data_dir")
+        except (ValueError, json.JSONDecodeError):
+            previous = None
+    manifest = {
+        "format": FORMAT,
+        "version": store.version,
+        "data_dir": data_name,
+        "metadata": store.metadata,
+        **entries,
+    }
+    tmp = out_dir / f".{MANIFEST}.{os.getpid()}"
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    os.replace(tmp, out_dir / MANIFEST)
+    _prune(out_dir, {data_name, previous} - {None})
+    return out_dir
+
+
+def open_snapshot(path: Path, manifest: dict[str, Any] | None = None) -> IFRS17Store:
+    """Map a compiled snapshot read-only, with its indexes, precomputed aggregates, lineage and validation report."""
+    manifest = manifest or read_manifest(path)
+    directory = path / manifest["data_dir"]
+    dictionaries: dict[str, Dictionary] = {
+        name: MappedDictionary(*(_load(directory, parts[part]) for part in ("data", "offsets", "order")))
+        for name, parts in manifest["dictionaries"].items()
+    }
+    tables = {}
+    for name, entry in manifest["tables"].items():
+        columns = {}
+        for col_name, col in entry["columns"].items():
+            dictionary = dictionaries.get(col_name) if col["kind"] == CATEGORY else None
+            ints = _load(directory, col["ints"]) if "ints" in col else None
+            columns[col_name] = Column(col["kind"], _load(directory, col["file"]), dictionary, ints=ints)
+        tables[name] = Table(name, columns, entry["n_rows"])
+    indexes = {
+        name: {key: _load_index(directory, parts) for key, parts in table_indexes.items()}
+        for name, table_indexes in manifest["indexes"].items()
+    }
+    store = IFRS17Store(
+        metadata=manifest["metadata"],
+        tables=tables,
+        dictionaries=dictionaries,
+        contract_rows={name: _load(directory, file) for name, file in manifest["contract_rows"].items()},
+        version=manifest["version"],
+        indexes=indexes,
+    )
+    store.derived["aggregates"] = _load_aggregates(directory, store, manifest["aggregates"])
+    store.derived["validation"] = _load_validation(directory, manifest["validation"])
+    return store
+
+
+def _csv_number(text: str) -> Any:
+    """CSV cell to the value the JSON file would hold: None, int, float or (if not numeric) str."""
+    if text == "":
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _csv_string(text: str) -> str | None:
+    return None if text == "" else text
+
+
+# Kind of a CSV column whose values so far are all numbers (INT or FLOAT once complete)
+_NUMBER = "number"
+
+
+class _CsvColumn:
+    """
+    One CSV column, converted to arrays a chunk of rows at a time. The finished
+    column has the kind and values build_store gives the whole column (see
+    ifrs17_store._build_column); a column that turns out not to be numeric or
+    dates is dictionary-encoded from its first row on, so codes keep row order.
+    """
+
+    def __init__(self, name: str, parse: Callable[[str], Any], dictionaries: dict[str, Dictionary]):
+        self.name = name
+        self.parse = parse
+        self.dictionaries = dictionaries
+        self.n_rows = 0
+        # None while every value is null, then _NUMBER, DATE or CATEGORY
+        self.kind: str | None = None
+        # Per chunk: a null count, (floats, int flags, ints, nulls) numbers, dates or codes (per kind)
+        self.chunks: list[Any] = []
+
+    def add(self, cells: list[str]) -> None:
+        values = [self.parse(v) for v in cells]
+        self.n_rows += len(values)
+        present = [v for v in values if v is not None]
+        if self.kind != CATEGORY:
+            if not present:
+                self.chunks.append(len(values))
+                return
+            numbers = [isinstance(v, (int, float)) for v in present]
+            if all(numbers) and self.kind in (None, _NUMBER):
+                self.kind = _NUMBER
+                self.chunks.append(self._numbers(values))
+                return
+            if not any(numbers) and self.kind in (None, DATE) and self.name.endswith("_date"):
+                try:
+                    dates = np.array(["NaT" if v is None else v for v in values], dtype="datetime64[D]")
+                except ValueError:
+                    pass
+                else:
+                    self.kind = DATE
+                    self.chunks.append(dates)
+                    return
+            # Encode the earlier chunks first, so codes are assigned in row order
+            earlier, self.chunks = self.chunks, []
+            self.kind = CATEGORY
+            for chunk in earlier:
+                self.chunks.append(self._encode(self._values(chunk)))
+        self.chunks.append(self._encode(values))
+
+    @staticmethod
+    def _numbers(values: list[Any]) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        n = len(values)
+        floats = np.fromiter((np.nan if v is None else v for v in values), dtype=np.float64, count=n)
+        ints = np.fromiter((isinstance(v, int) for v in values), dtype=bool, count=n)
+        exact = np.fromiter((v if isinstance(v, int) else 0 for v in values), dtype=np.int64, count=n)
+        return floats, ints, exact, values.count(None)
+
+    def _values(self, chunk: Any) -> list[Any]:
+        """Python values of a null, number or date chunk."""
+        if isinstance(chunk, int):
+            return [None] * chunk
+        if isinstance(chunk, tuple):
+            floats, ints, exact, _ = chunk
+            return [
+                None if f != f else e if i else f for f, i, e in zip(floats.tolist(), ints.tolist(), exact.tolist())
+            ]
+        return [None if s == "NaT" else s for s in np.datetime_as_string(chunk, unit="D").tolist()]
+
+    def _encode(self, values: list[Any]) -> np.ndarray:
+        return self.dictionaries.setdefault(self.name, Dictionary()).encode(values)
+
+    def column(self) -> Column:
+        n, chunks = self.n_rows, self.chunks
+        if self.kind is None:
+            if not n:
+                return Column(FLOAT, np.zeros(0, dtype=np.float64))
+            if self.name.endswith("_date"):
+                return Column(DATE, np.full(n, "NaT", dtype="datetime64[D]"))
+            return Column(CATEGORY, self._encode([None] * n), self.dictionaries[self.name])
+        if self.kind == CATEGORY:
+            return Column(CATEGORY, np.concatenate(chunks), self.dictionaries[self.name])
+        if self.kind == DATE:
+            return Column(
+                DATE,
+                np.concatenate([np.full(c, "NaT", dtype="datetime64[D]") if isinstance(c, int) else c for c in chunks]),
+            )
+        numbers = [c for c in chunks if isinstance(c, tuple)]
+        nulls = sum(c if isinstance(c, int) else c[3] for c in chunks)
+        floats = np.concatenate([np.full(c, np.nan) if isinstance(c, int) else c[0] for c in chunks])
+        ints = np.concatenate([np.zeros(c, dtype=bool) if isinstance(c, int) else c[1] for c in chunks])
+        if all(c[1].sum() == len(c[1]) - c[3] for c in numbers):
+            if nulls:
+                return Column(INT, floats)
+            return Column(INT, np.concatenate([c[2] for c in numbers]))
+        return Column(FLOAT, floats, ints=ints if ints.any() else None)
+
+
+def read_csv_table(dataset: str, path: Path, dictionaries: dict[str, Dictionary]) -> Table:
+    """
+    One IFRS 17 CSV as a columnar Table (empty cells are null), read CSV_CHUNK_ROWS
+    rows at a time. Columns that are strings in the dataset's table
+    (models/db_models.py), e.g. premium `period`, stay strings; other cells are
+    read as numbers where they parse.
+    """
+    model = IFRS17_TABLES[dataset].__table__ if dataset in IFRS17_TABLES else None
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = [
+            _CsvColumn(
+                name,
+                _csv_string if model is not None and name in model.c and isinstance(model.c[name].type, String)
+                else _csv_number,
+                dictionaries,
+            )
+            for name in header
+        ]
+        while rows := list(itertools.islice(reader, CSV_CHUNK_ROWS)):
+            for i, column in enumerate(columns):
+                column.add([row[i] if i < len(row) else "" for row in rows])
+    return Table(dataset, {c.name: c.column() for c in columns}, columns[0].n_rows if columns else 0)
+
+
+def _derived_metadata(tables: dict[str, Table]) -> dict[str, Any]:
+    """Metadata for CSV input without a metadata file (same rules as the SQL backend)."""
+    contracts = tables.get("contracts", Table("contracts"))
+    rates = tables.get("discount_rates", Table("discount_rates"))
+    dates = [d for d in rates.columns["as_at_date"].to_list() if d] if "as_at_date" in rates else []
+    portfolios: list[str] = []
+    if "portfolio" in contracts:
+        col = contracts.columns["portfolio"]
+        codes = col.values[col.values >= 0]
+        _, first = np.unique(codes, return_index=True)
+        portfolios = [p for p in col.dictionary.decode(codes[np.sort(first)]) if p]
+    currency = None
+    if len(contracts) and "currency" in contracts:
+        currency = contracts.columns["currency"].take(np.arange(1)).to_list()[0]
+    return {
+        "reporting_date": max(dates) if dates else None,
+        "currency": currency,
+        "portfolios": portfolios,
+        "description": None,
+    }
+
+
+def load_json_store(path: Path) -> IFRS17Store:
+    """Columnar store of a JSON data file, versioned like ifrs17_data (content hash)."""
+    content = path.read_bytes()
+    return build_store(json.loads(content), version=hashlib.sha256(content).hexdigest()[:16])
+
+
+def load_csv_store(directory: Path, metadata: dict[str, Any] | None = None) -> IFRS17Store:
+    """Columnar store of the IFRS17_sample_data_<dataset>.csv files in directory."""
+    digest = hashlib.sha256()
+    dictionaries: dict[str, Dictionary] = {}
+    tables: dict[str, Table] = {}
+    for dataset in DATASETS:
+        path = csv_path(directory, dataset)
+        if path.exists():
+            digest.update(dataset.encode("utf-8"))
+            with open(path, "rb") as f:
+                while block := f.read(1 << 20):
+                    digest.update(block)
+            tables[dataset] = read_csv_table(dataset, path, dictionaries)
+    if not tables:
+        raise FileNotFoundError(f"No IFRS 17 CSV files in {directory}")
+    metadata = metadata if metadata is not None else _derived_metadata(tables)
+    digest.update(json.dumps(metadata, sort_keys=True).encode("utf-8"))
+    return IFRS17Store(
+        metadata=metadata,
+        tables=tables,
+        dictionaries=dictionaries,
+        contract_rows=link_contracts(tables, dictionaries),
+        version=digest.hexdigest()[:16],
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compile IFRS 17 data into a memory-mapped snapshot.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--json", type=Path, help="IFRS 17 JSON data file")
+    source.add_argument("--csv-dir", type=Path, help="Directory with IFRS17_sample_data_<dataset>.csv files")
+    parser.add_argument("--metadata", type=Path, help="JSON metadata for --csv-dir (default: derived from the data)")
+    parser.add_argument("--out", type=Path, required=True, help="Snapshot directory (point IFRS17_DATA_PATH here)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.json:
+        store = load_json_store(args.json)
+    else:
+        metadata = json.loads(args.metadata.read_text(encoding="utf-8")) if args.metadata else None
+        store = load_csv_store(args.csv_dir, metadata)
+    compile_snapshot(store, args.out)
+    size = sum(f.stat().st_size for f in (args.out / _data_dir_name(store)).iterdir())
+    rows = sum(len(t) for t in store.tables.values())
+    print(
+        f"Compiled {rows} rows ({size / 2**20:.1f} MB) into {args.out}"
+        f" version {store.version} in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+"""
+IFRS 17 SQL push-down backend. Same public functions as services/ifrs17_engine.py,
+but every aggregation runs as GROUP BY / SUM queries in the SQLite database
+(tables from models/db_models.py, loaded by services/ifrs17_ingest.py), so the
+API process never loads the full dataset.
+
+Selected with IFRS17_BACKEND=sql. Check it against the in-memory path with:
+    python -m services.ifrs17_sql --check
+"""
+import argparse
+import math
+import sys
+from typing import Any, Iterator
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection, Engine
+
+from database import engine as default_engine
+from models.db_models import (
+    IFRS17_TABLES,
+    ClaimTable,
+    ContractTable,
+    CSMMovementTable,
+    DiscountRateTable,
+    LiabilityMovementTable,
+    PremiumTable,
+)
+from services.ifrs17_aggregates import empty_portfolio, portfolio_comparison, trend_pct
+from services.ifrs17_engine import (
+    CSM_COLUMNS,
+    DATA_KEYS,
+    DEFAULT_PAGE_SIZE,
+    LIABILITY_COLUMNS,
+    MAX_PAGE_SIZE,
+    data_filters,
+    decode_cursor,
+    encode_cursor,
+    selected_datasets,
+)
+from services.ifrs17_index import FILTERS
+
+_engine: Engine = default_engine
+
+
+def use_engine(engine: Engine) -> None:
+    """Point the backend at another SQLAlchemy engine (e.g. a separate reporting DB)."""
+    global _engine
+    _engine = engine
+
+
+def _num(x: Any) -> Any:
+    """SQLite REAL sums come back as float; report whole numbers as int like the JSON data."""
+    if isinstance(x, float) and x.is_integer():
+        return int(x)
+    return x
+
+
+def _data_columns(dataset: str) -> list:
+    """Table columns in CSV/JSON order (without the surrogate id)."""
+    return [c for c in IFRS17_TABLES[dataset].__table__.c if c.name != "id"]
+
+
+def _totals(conn: Connection, table, columns: tuple[str, ...]) -> dict[str, Any]:
+    """SUM of several columns in one scan (nulls as 0)."""
+    t = table.__table__
+    row = conn.execute(select(*(func.coalesce(func.sum(t.c[c]), 0) for c in columns))).one()
+    return {c: _num(v) for c, v in zip(columns, row)}
+
+
+def _portfolios(conn: Connection) -> list[str]:
+    """Contract portfolios in first-seen order."""
+    stmt = (
+        select(ContractTable.portfolio)
+        .group_by(ContractTable.portfolio)
+        .order_by(func.min(ContractTable.id))
+    )
+    return [r[0] for r in conn.execute(stmt)]
+
+
+def _metadata(conn: Connection) -> dict[str, Any]:
+    """Metadata is not stored in the DB; derive it from the data."""
+    reporting_date = conn.execute(select(func.max(DiscountRateTable.as_at_date))).scalar()
+    currency = conn.execute(
+        select(ContractTable.currency).order_by(ContractTable.id).limit(1)
+    ).scalar()
+    return {
+        "reporting_date": reporting_date,
+        "currency": currency,
+        "portfolios": _portfolios(conn),
+        "description": None,
+    }
+
+
+def get_metadata() -> dict[str, Any]:
+    """Reporting metadata: date, currency, portfolios."""
+    with _engine.connect() as conn:
+        return _metadata(conn)
+
+
+def _build_by_portfolio(conn: Connection) -> dict[str, dict[str, Any]]:
+    """By-portfolio aggregates as GROUP BY queries (premiums/claims joined to contracts)."""
+    by_portfolio = {p: empty_portfolio() for p in _portfolios(conn)}
+
+    def put(key: str, stmt) -> None:
+        for portfolio, value in conn.execute(stmt):
+            if portfolio in by_portfolio:
+                by_portfolio[portfolio][key] = _num(value)
+
+    put("count", select(ContractTable.portfolio, func.count()).group_by(ContractTable.portfolio))
+    put(
+        "premium",
+        select(ContractTable.portfolio, func.coalesce(func.sum(PremiumTable.gross_premium), 0))
+        .join(ContractTable, ContractTable.contract_id == PremiumTable.contract_id)
+        .group_by(ContractTable.portfolio),
+    )
+    put(
+        "claims",
+        select(ContractTable.portfolio, func.coalesce(func.sum(ClaimTable.incurred_amount), 0))
+        .join(ContractTable, ContractTable.contract_id == ClaimTable.contract_id)
+        .group_by(ContractTable.portfolio),
+    )
+    lm = LiabilityMovementTable
+    stmt = select(
+        lm.portfolio,
+        func.coalesce(func.sum(lm.closing_balance), 0),
+        func.coalesce(func.sum(lm.opening_balance), 0),
+    ).group_by(lm.portfolio)
+    for portfolio, closing, opening in conn.execute(stmt):
+        if portfolio in by_portfolio:
+            by_portfolio[portfolio]["liability"] = _num(closing)
+            by_portfolio[portfolio]["opening"] = _num(opening)
+    put(
+        "csm",
+        select(CSMMovementTable.portfolio, func.coalesce(func.sum(CSMMovementTable.closing_csm), 0))
+        .group_by(CSMMovementTable.portfolio),
+    )
+    return by_portfolio
+
+
+def _summary(conn: Connection) -> dict[str, Any]:
+    lm = _totals(conn, LiabilityMovementTable, ("closing_balance", "opening_balance"))
+    cm = _totals(conn, CSMMovementTable, ("closing_csm", "opening_csm", "csm_release_to_pl"))
+    prem = _totals(conn, PremiumTable, ("gross_premium", "net_premium"))
+    cl = _totals(conn, ClaimTable, ("incurred_amount", "paid_amount", "outstanding_reserve"))
+    acq = _totals(conn, IFRS17_TABLES["acquisition_costs"], ("total",))
+    rein = _totals(conn, IFRS17_TABLES["reinsurance"], ("reinsurance_asset_balance",))
+    contracts_count = conn.execute(select(func.count()).select_from(ContractTable)).scalar()
+    by_portfolio = _build_by_portfolio(conn)
+    ports = list(by_portfolio)
+    total_net, total_incurred = prem["net_premium"], cl["incurred_amount"]
+    return {
+        "insurance_liability": lm["closing_balance"],
+        "insurance_liability_opening": lm["opening_balance"],
+        "liability_trend_pct": trend_pct(lm["closing_balance"], lm["opening_balance"]),
+        "reinsurance_asset": rein["reinsurance_asset_balance"],
+        "closing_csm": cm["closing_csm"],
+        "csm_trend_pct": trend_pct(cm["closing_csm"], cm["opening_csm"]),
+        "gross_premium": prem["gross_premium"],
+        "net_premium": total_net,
+        "claims_incurred": total_incurred,
+        "loss_ratio_pct": round(total_incurred / total_net * 100, 1) if total_net else None,
+        "contracts_count": contracts_count,
+        "insurance_revenue_csm_release": cm["csm_release_to_pl"],
+        "acquisition_costs_total": acq["total"],
+        "claims_paid": cl["paid_amount"],
+        "claims_outstanding_reserve": cl["outstanding_reserve"],
+        "by_portfolio": by_portfolio,
+        "portfolios": ports,
+    }
+
+
+def get_dashboard_summary() -> dict[str, Any]:
+    """Totals and trend percentages for dashboard cards."""
+    with _engine.connect() as conn:
+        return _summary(conn)
+
+
+def _cohort_trend(conn: Connection, table, column: str) -> dict[str, Any]:
+    stmt = (
+        select(table.cohort_year, func.coalesce(func.sum(getattr(table, column)), 0))
+        .group_by(table.cohort_year)
+        .order_by(table.cohort_year)
+    )
+    rows = conn.execute(stmt).all()
+    return {"labels": [str(y) for y, _ in rows], "values": [_num(v) for _, v in rows]}
+
+
+def get_dashboard_liability_trend() -> dict[str, Any]:
+    """Liability by cohort year for line chart. Labels and values."""
+    with _engine.connect() as conn:
+        return _cohort_trend(conn, LiabilityMovementTable, "closing_balance")
+
+
+def get_dashboard_csm_trend() -> dict[str, Any]:
+    """CSM by cohort year for line chart."""
+    with _engine.connect() as conn:
+        return _cohort_trend(conn, CSMMovementTable, "closing_csm")
+
+
+def get_dashboard_portfolio_comparison() -> list[dict[str, Any]]:
+    """Table rows: portfolio, contracts, gross premium, claims, loss %, closing liability, closing CSM."""
+    return portfolio_comparison(get_dashboard_summary())
+
+
+def get_dashboard() -> dict[str, Any]:
+    """Summary, liability trend, CSM trend and portfolio comparison on one connection."""
+    with _engine.connect() as conn:
+        summary = _summary(conn)
+        return {
+            "summary": summary,
+            "liability_trend": _cohort_trend(conn, LiabilityMovementTable, "closing_balance"),
+            "csm_trend": _cohort_trend(conn, CSMMovementTable, "closing_csm"),
+            "portfolio_comparison": portfolio_comparison(summary),
+        }
+
+
+def _reconciliation(table, columns: tuple[str, ...]) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+    t = table.__table__
+    names = ("portfolio", "cohort_year") + columns
+    with _engine.connect() as conn:
+        result = conn.execute(select(*(t.c[n] for n in names)).order_by(t.c.id))
+        rows = [{n: _num(v) for n, v in zip(names, r)} for r in result]
+        totals = _totals(conn, table, columns)
+    return rows, totals
+
+
+def get_reconciliation_liability() -> dict[str, Any]:
+    """Liability reconciliation: rows by portfolio/cohort plus totals (SUMs in SQL)."""
+    rows, totals = _reconciliation(LiabilityMovementTable, LIABILITY_COLUMNS)
+    return {"rows": rows, "totals": totals}
+
+
+def get_reconciliation_csm() -> dict[str, Any]:
+    """CSM reconciliation: rows by portfolio/cohort plus totals (SUMs in SQL)."""
+    rows, totals = _reconciliation(CSMMovementTable, CSM_COLUMNS)
+    return {"rows": rows, "totals": totals, "insurance_revenue_from_csm_release": totals["csm_release_to_pl"]}
+
+
+def _where(dataset: str, filters: dict[str, Any]) -> list:
+    """WHERE clauses for a dataset; contract-keyed datasets filter through contracts."""
+    applicable = {c: v for c, v in filters.items() if v is not None and c in FILTERS.get(dataset, ())}
+    if not applicable:
+        return []
+    t = IFRS17_TABLES[dataset].__table__
+    if dataset == "contracts" or "contract_id" not in t.c:
+        return [t.c[c] == v for c, v in applicable.items()]
+    contract_ids = select(ContractTable.contract_id).where(
+        *(getattr(ContractTable, c) == v for c, v in applicable.items())
+    )
+    return [t.c.contract_id.in_(contract_ids)]
+
+
+def _rows(conn: Connection, dataset: str, clauses: list, after_id: int = 0, limit: int | None = None):
+    t = IFRS17_TABLES[dataset].__table__
+    columns = _data_columns(dataset)
+    stmt = select(t.c.id, *columns).where(*clauses, t.c.id > after_id).order_by(t.c.id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    names = [c.name for c in columns]
+    for r in conn.execution_options(yield_per=DEFAULT_PAGE_SIZE).execute(stmt):
+        yield r[0], {n: _num(v) for n, v in zip(names, r[1:])}
+
+
+def get_data(
+    portfolio: str | None = None,
+    cohort_year: int | None = None,
+    contract_id: str | None = None,
+) -> dict[str, Any]:
+    """Raw IFRS 17 data, optionally filtered; filters run as indexed WHERE clauses."""
+    filters = data_filters(portfolio, cohort_year, contract_id)
+    with _engine.connect() as conn:
+        out: dict[str, Any] = {"metadata": _metadata(conn)}
+        for key in DATA_KEYS:
+            out[key] = [row for _, row in _rows(conn, key, _where(key, filters))]
+    return out
+
+
+def get_data_page(
+    dataset: str | None = None,
+    portfolio: str | None = None,
+    cohort_year: int | None = None,
+    contract_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> dict[str, Any]:
+    """One page of a dataset (keyset pagination on id; the cursor holds the last id)."""
+    after_id = 0
+    if cursor:
+        cursor_dataset, after_id, _ = decode_cursor(cursor)
+        if dataset and dataset != cursor_dataset:
+            raise ValueError("Cursor belongs to a different dataset")
+        dataset = cursor_dataset
+    if dataset not in DATA_KEYS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    clauses = _where(dataset, data_filters(portfolio, cohort_year, contract_id))
+    t = IFRS17_TABLES[dataset].__table__
+    with _engine.connect() as conn:
+        total = conn.execute(select(func.count()).select_from(t).where(*clauses)).scalar()
+        page = list(_rows(conn, dataset, clauses, after_id, limit + 1))
+    more = len(page) > limit
+    page = page[:limit]
+    return {
+        "dataset": dataset,
+        "total": total,
+        "rows": [row for _, row in page],
+        "next_cursor": encode_cursor(dataset, page[-1][0], "sql") if more else None,
+    }
+
+
+def iter_data_rows(
+    portfolio: str | None = None,
+    cohort_year: int | None = None,
+    contract_id: str | None = None,
+    datasets: list[str] | None = None,
+) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Lazily yield (dataset, row), streaming each query's result set; unknown datasets raise ValueError."""
+    selected = selected_datasets(datasets)
+    filters = data_filters(portfolio, cohort_year, contract_id)
+    with _engine.connect() as conn:
+        yield "metadata", _metadata(conn)
+        for key in selected:
+            for _, row in _rows(conn, key, _where(key, filters)):
+                yield key, row
+
+
+# --- Equivalence check against the in-memory engine ---------------------------------
+
+
+def _diff(path: str, expected: Any, actual: Any, out: list[str]) -> None:
+    """Collect differences; numbers compare with a small relative tolerance."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for k in expected.keys() | actual.keys():
+            _diff(f"{path}.{k}", expected.get(k), actual.get(k), out)
+    elif isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            out.append(f"{path}: length {len(expected)} != {len(actual)}")
+            return
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            _diff(f"{path}[{i}]", e, a, out)
+    elif isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        if not math.isclose(expected, actual, rel_tol=1e-9, abs_tol=1e-6):
+            out.append(f"{path}: {expected} != {actual}")
+    elif expected != actual:
+        out.append(f"{path}: {expected!r} != {actual!r}")
+
+
+def _comparable(fn: Any, name: str, kwargs: dict[str, Any]) -> Any:
+    """Result of one engine call in a form both backends share."""
+    if name == "get_data_page":
+        # Cursors differ (offset vs keyset); walk every page and compare the rows
+        rows: list[dict[str, Any]] = []
+        cursor = None
+        while True:
+            page = fn(cursor=cursor, limit=CHECK_PAGE_SIZE, **kwargs)
+            rows += page["rows"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return {"total": page["total"], "rows": rows}
+    if name == "iter_data_rows":
+        return [item for item in fn(**kwargs) if item[0] != "metadata"]
+    result = fn(**kwargs)
+    if name == "get_data":
+        # Metadata is derived in SQL; compare the datasets only
+        return {k: v for k, v in result.items() if k != "metadata"}
+    return result
+
+
+# Small pages, so the check crosses page boundaries
+CHECK_PAGE_SIZE = 7
+
+
+def filter_sets() -> list[dict[str, Any]]:
+    """
+    Filters the equivalence check runs: none, each portfolio, each cohort year,
+    each portfolio x cohort pair and the first three contract ids in the DB.
+    """
+    with _engine.connect() as conn:
+        portfolios = _portfolios(conn)
+        cohorts = [r[0] for r in conn.execute(select(ContractTable.cohort_year).distinct())]
+        contract_ids = [r[0] for r in conn.execute(select(ContractTable.contract_id).limit(3))]
+
+    sets: list[dict[str, Any]] = [{}]
+    sets += [{"portfolio": p} for p in portfolios]
+    sets += [{"cohort_year": y} for y in cohorts]
+    sets += [{"portfolio": p, "cohort_year": y} for p in portfolios for y in cohorts]
+    sets += [{"contract_id": c} for c in contract_ids]
+    return sets
+
+
+def compare_backends(filters: list[dict[str, Any]] | None = None) -> list[str]:
+    """
+    Run every engine function (but get_metadata, which SQL derives from the data)
+    on both backends, for each filter set (default: filter_sets()), and return the
+    differences (empty list = same numbers). The unfiltered set ({}) also runs the
+    dashboard and reconciliation functions. Needs the same data in the JSON file and the DB.
+    """
+    from services import ifrs17_engine as memory
+
+    filters = filter_sets() if filters is None else filters
+    calls: list[tuple[str, dict[str, Any]]] = []
+    if {} in filters:
+        calls += [
+            ("get_dashboard_summary", {}),
+            ("get_dashboard_liability_trend", {}),
+            ("get_dashboard_csm_trend", {}),
+            ("get_dashboard_portfolio_comparison", {}),
+            ("get_dashboard", {}),
+            ("get_reconciliation_liability", {}),
+            ("get_reconciliation_csm", {}),
+        ]
+    calls += [("get_data", f) for f in filters]
+    calls += [("iter_data_rows", f) for f in filters]
+    calls += [("get_data_page", {"dataset": d, **f}) for d in DATA_KEYS for f in filters]
+
+    diffs: list[str] = []
+    for name, kwargs in calls:
+        expected = _comparable(getattr(memory, name)._memory_impl, name, kwargs)
+        actual = _comparable(getattr(sys.modules[__name__], name), name, kwargs)
+        _diff(f"{name}({kwargs})", expected, actual, diffs)
+    return diffs
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="IFRS 17 SQL backend utilities.")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Compare every engine function against the in-memory backend",
+    )
+    args = parser.parse_args(argv)
+    if args.check:
+        diffs = compare_backends()
+        for d in diffs:
+            print(d)
+        print("OK: backends agree" if not diffs else f"FAILED: {len(diffs)} differences")
+        sys.exit(1 if diffs else 0)
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
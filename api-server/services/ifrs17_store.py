@@ -0,0 +1,486 @@
+"""
+Columnar IFRS 17 store. Each dataset is a Table of typed NumPy columns.
+
+String columns are dictionary-encoded as integer codes. Dictionaries are shared
+per column name across tables (e.g. `portfolio` in contracts and in
+liability_movements use the same codes), so joins and group-bys work on codes.
+Columns whose name ends in `_date` are stored as datetime64[D].
+"""
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Iterable, Iterator
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from services.ifrs17_index import PostingIndex, SegmentedIndex
+
+# Contract-keyed datasets get a `contract_row` array (row in contracts, -1 if unknown)
+CONTRACT_KEYED = ("premiums", "claims", "acquisition_costs", "reinsurance")
+
+# Order of datasets in ifrs17_sample_data.json
+DATASETS = (
+    "contracts",
+    "premiums",
+    "claims",
+    "acquisition_costs",
+    "assumptions",
+    "discount_rates",
+    "reinsurance",
+    "liability_movements",
+    "csm_movements",
+    "claims_development",
+)
+
+INT = "int"
+FLOAT = "float"
+CATEGORY = "category"
+DATE = "date"
+
+_NO_CODE = -1
+# Smallest backing array allocated for appends (see append_values)
+_MIN_CAPACITY = 1024
+
+
+class Dictionary:
+    """Shared string dictionary: value <-> integer code. Code -1 means null."""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: list[str] = list(values)
+        # value -> code; built on first lookup (snapshots opened from disk may never need it)
+        self._lookup: dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def _index(self) -> dict[str, int]:
+        if self._lookup is None:
+            self._lookup = {v: i for i, v in enumerate(self.values)}
+        return self._lookup
+
+    def code(self, value: str | None) -> int:
+        """Code for value; -1 if value is null or not in the dictionary."""
+        if value is None:
+            return _NO_CODE
+        return self._index.get(value, _NO_CODE)
+
+    def add(self, value: str) -> int:
+        """Code for value, adding it to the dictionary if new."""
+        index = self._index
+        code = index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            index[value] = code
+        return code
+
+    def encode(self, values: Iterable[str | None]) -> np.ndarray:
+        """Encode values to int32 codes, growing the dictionary as needed."""
+        return np.fromiter(
+            (_NO_CODE if v is None else self.add(str(v)) for v in values),
+            dtype=np.int32,
+        )
+
+    def decode(self, codes: np.ndarray) -> list[str | None]:
+        """Decode codes back to strings (None for -1)."""
+        values = self.values
+        return [values[c] if c >= 0 else None for c in codes.tolist()]
+
+
+class MappedDictionary(Dictionary):
+    """
+    Dictionary over UTF-8 bytes (e.g. memory-mapped from a compiled snapshot):
+    value i is data[offsets[i]:offsets[i + 1]], and `order` lists the codes in
+    value order. code() bisects `order` and decode() reads only the codes asked
+    for, so a worker never decodes a large dictionary (contract_id) as a whole.
+    `values` decodes every value on first use, and adding a value switches to it.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, order: np.ndarray):
+        self._data = data
+        self._offsets = offsets
+        self._order = order
+        self._values: list[str] | None = None
+        self._lookup = None
+
+    @property
+    def values(self) -> list[str]:
+        if self._values is None:
+            self._values = [self._value(i) for i in range(len(self._offsets) - 1)]
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1 if self._values is None else len(self._values)
+
+    def _value(self, code: int) -> str:
+        return self._data[self._offsets[code]:self._offsets[code + 1]].tobytes().decode("utf-8")
+
+    def code(self, value: str | None) -> int:
+        if self._values is not None or value is None:
+            return super().code(value)
+        i = bisect_left(self._order, value, key=self._value)
+        if i < len(self._order) and self._value(self._order[i]) == value:
+            return int(self._order[i])
+        return _NO_CODE
+
+    def add(self, value: str) -> int:
+        code = self.code(value)
+        return code if code >= 0 else super().add(value)
+
+    def decode(self, codes: np.ndarray) -> list[str | None]:
+        if self._values is not None:
+            return super().decode(codes)
+        return [self._value(c) if c >= 0 else None for c in codes.tolist()]
+
+
+@dataclass
+class Spare:
+    """Backing array with room to append; the first `used` entries are taken (by the newest view)."""
+
+    buffer: np.ndarray
+    used: int
+
+
+def append_values(values: np.ndarray, extra: np.ndarray, spare: Spare | None = None) -> tuple[np.ndarray, Spare]:
+    """
+    values + extra without modifying `values` (copy-on-write). Writes into the
+    spare capacity after `values` when `values` is the newest view of its buffer,
+    else copies into a new buffer with room to double, so appends cost O(len(extra))
+    amortized. Returns the new array and its Spare.
+    """
+    n, k = len(values), len(extra)
+    dtype = np.result_type(values.dtype, extra.dtype)
+    if spare is not None and spare.used == n and n + k <= len(spare.buffer) and spare.buffer.dtype == dtype:
+        spare.buffer[n:n + k] = extra
+        spare.used = n + k
+        return spare.buffer[:n + k], spare
+    buffer = np.empty(max(2 * (n + k), _MIN_CAPACITY), dtype=dtype)
+    buffer[:n] = values
+    buffer[n:n + k] = extra
+    return buffer[:n + k], Spare(buffer, n + k)
+
+
+@dataclass
+class Column:
+    """One typed column. `values` holds numbers, dates, or dictionary codes."""
+
+    kind: str
+    values: np.ndarray
+    dictionary: Dictionary | None = None
+    # Capacity behind `values` for appends (None until the first append)
+    spare: Spare | None = None
+    # FLOAT columns from a mix of ints and floats: True where the source value was
+    # an int, so it decodes back as an int (None when there is nothing to restore)
+    ints: np.ndarray | None = None
+    ints_spare: Spare | None = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_list(self) -> list[Any]:
+        """Python values as they appeared in the source records."""
+        v = self.values
+        if self.kind == CATEGORY:
+            return self.dictionary.decode(v)
+        if self.kind == DATE:
+            return [None if s == "NaT" else s for s in np.datetime_as_string(v, unit="D").tolist()]
+        if self.kind == INT and v.dtype.kind == "f":
+            # Integer column with nulls is stored as float64 with NaN
+            return [None if x != x else int(x) for x in v.tolist()]
+        if v.dtype.kind == "f":
+            if self.ints is not None:
+                return [None if x != x else int(x) if i else x for x, i in zip(v.tolist(), self.ints.tolist())]
+            return [None if x != x else x for x in v.tolist()]
+        return v.tolist()
+
+    def take(self, rows: np.ndarray) -> "Column":
+        ints = None if self.ints is None else self.ints[rows]
+        return Column(self.kind, self.values[rows], self.dictionary, ints=ints)
+
+    def append(self, extra: np.ndarray, kind: str | None = None, extra_ints: np.ndarray | None = None) -> "Column":
+        """
+        New column with `extra` appended (this one is unchanged); `kind` to change
+        it (e.g. INT to FLOAT), `extra_ints` for the int-ness of a FLOAT batch (see `ints`).
+        """
+        kind = kind or self.kind
+        values, spare = append_values(self.values, extra, self.spare)
+        ints, ints_spare = None, None
+        if kind == FLOAT and (self.ints is not None or extra_ints is not None or self.kind == INT):
+            # An INT column turning FLOAT keeps its rows as ints
+            old = self.ints if self.ints is not None else np.full(len(self.values), self.kind == INT)
+            new = extra_ints if extra_ints is not None else np.zeros(len(extra), dtype=bool)
+            ints, ints_spare = append_values(old, new, self.ints_spare if self.ints is not None else None)
+        return Column(kind, values, self.dictionary, spare, ints, ints_spare)
+
+
+@dataclass
+class Table:
+    """A dataset as named columns of equal length."""
+
+    name: str
+    columns: dict[str, Column] = field(default_factory=dict)
+    n_rows: int = 0
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.columns
+
+    def values(self, column: str) -> np.ndarray:
+        """Raw column array (codes for category columns)."""
+        return self.columns[column].values
+
+    def numeric(self, column: str) -> np.ndarray:
+        """Numeric column with nulls as 0; missing column gives zeros."""
+        col = self.columns.get(column)
+        if col is None:
+            return np.zeros(self.n_rows, dtype=np.int64)
+        v = col.values
+        return np.nan_to_num(v) if v.dtype.kind == "f" else v
+
+    def sum(self, column: str, rows: np.ndarray | None = None) -> int | float:
+        """Sum of a numeric column (nulls count as 0), as a Python number."""
+        v = self.numeric(column)
+        if rows is not None:
+            v = v[rows]
+        return as_number(v.sum(), self.columns.get(column))
+
+    def group_sum(
+        self,
+        column: str,
+        codes: np.ndarray,
+        size: int,
+        rows: np.ndarray | None = None,
+    ) -> list[int | float]:
+        """Sum of a numeric column per group code (0..size-1); codes < 0 are skipped."""
+        v = self.numeric(column)
+        if rows is not None:
+            v = v[rows]
+        keep = codes >= 0
+        sums = np.bincount(codes[keep], weights=v[keep], minlength=size)
+        col = self.columns.get(column)
+        return [as_number(x, col) for x in sums]
+
+    def match(self, column: str, value: Any) -> np.ndarray:
+        """Boolean mask of rows where column == value (string values compared by code)."""
+        col = self.columns.get(column)
+        if col is None:
+            return np.zeros(self.n_rows, dtype=bool)
+        if col.kind == CATEGORY:
+            code = col.dictionary.code(value)
+            if code < 0:
+                return np.zeros(self.n_rows, dtype=bool)
+            return col.values == code
+        return col.values == value
+
+    def select_records(
+        self,
+        columns: Iterable[str],
+        rows: np.ndarray | None = None,
+        default: Any = 0,
+    ) -> list[dict[str, Any]]:
+        """Rows as dicts with exactly `columns` (missing columns filled with `default`)."""
+        table = self if rows is None else self.take(rows)
+        names = list(columns)
+        lists = [
+            table.columns[n].to_list() if n in table.columns else [default] * table.n_rows
+            for n in names
+        ]
+        return [dict(zip(names, vals)) for vals in zip(*lists)]
+
+    def take(self, rows: np.ndarray) -> "Table":
+        """New table with the given rows (in the given order)."""
+        return Table(self.name, {k: c.take(rows) for k, c in self.columns.items()}, len(rows))
+
+    def to_records(self, rows: np.ndarray | None = None) -> list[dict[str, Any]]:
+        """Rows as list of dicts, same shape as the source JSON."""
+        table = self if rows is None else self.take(rows)
+        names = list(table.columns)
+        lists = [table.columns[n].to_list() for n in names]
+        return [dict(zip(names, vals)) for vals in zip(*lists)]
+
+    def iter_records(self, rows: np.ndarray | None = None, batch_size: int = 1000) -> Iterator[dict[str, Any]]:
+        """Yield rows as dicts, decoding `batch_size` rows at a time."""
+        total = self.n_rows if rows is None else len(rows)
+        for start in range(0, total, batch_size):
+            end = min(start + batch_size, total)
+            yield from self.to_records(np.arange(start, end) if rows is None else rows[start:end])
+
+    def iter_rows(
+        self,
+        columns: Iterable[str],
+        rows: np.ndarray | None = None,
+        batch_size: int = 1000,
+        default: Any = 0,
+    ) -> Iterator[tuple[Any, ...]]:
+        """Yield rows as tuples in `columns` order (missing columns give `default`), a batch at a time."""
+        names = list(columns)
+        total = self.n_rows if rows is None else len(rows)
+        for start in range(0, total, batch_size):
+            end = min(start + batch_size, total)
+            batch = self.take(np.arange(start, end) if rows is None else rows[start:end])
+            lists = [
+                batch.columns[n].to_list() if n in batch.columns else [default] * batch.n_rows
+                for n in names
+            ]
+            yield from zip(*lists)
+
+
+@dataclass
+class IFRS17Store:
+    """All IFRS 17 datasets in columnar form plus shared dictionaries."""
+
+    metadata: dict[str, Any]
+    tables: dict[str, Table]
+    dictionaries: dict[str, Dictionary]
+    # dataset -> row in contracts for each row (-1 if contract_id unknown)
+    contract_rows: dict[str, np.ndarray] = field(default_factory=dict)
+    # Identifies the loaded data (content hash of the source file)
+    version: str = ""
+    # dataset -> filter column -> posting index (see services/ifrs17_index.py)
+    indexes: dict[str, dict[str, "PostingIndex | SegmentedIndex"]] = field(default_factory=dict)
+    # Results derived from this snapshot (e.g. "aggregates"), built on first use
+    derived: dict[str, Any] = field(default_factory=dict)
+    # dataset -> capacity behind contract_rows[dataset] for appends (see services/ifrs17_delta.py)
+    link_spare: dict[str, Spare] = field(default_factory=dict)
+
+    def table(self, name: str) -> Table:
+        """Dataset by name; empty table if absent."""
+        t = self.tables.get(name)
+        return t if t is not None else Table(name)
+
+    def code(self, column: str, value: str | None) -> int:
+        """Dictionary code of a string value for a column (-1 if unknown)."""
+        d = self.dictionaries.get(column)
+        return d.code(value) if d is not None else _NO_CODE
+
+    def categories(self, column: str) -> list[str]:
+        d = self.dictionaries.get(column)
+        return d.values if d is not None else []
+
+    def contract_values(self, dataset: str, column: str, fill: int = -1) -> np.ndarray:
+        """
+        For a contract-keyed dataset, the owning contract's `column` per row
+        (e.g. portfolio code of each premium); `fill` where the contract is unknown.
+        """
+        n = len(self.table(dataset))
+        contracts = self.table("contracts")
+        rows = self.contract_rows.get(dataset)
+        if rows is None or column not in contracts:
+            return np.full(n, fill, dtype=np.int64)
+        out = np.full(n, fill, dtype=np.int64)
+        known = rows >= 0
+        out[known] = contracts.values(column)[rows[known]]
+        return out
+
+    def dimension(self, dataset: str, column: str) -> np.ndarray:
+        """
+        Integer key per row for a grouping/filter column: the dataset's own
+        column if present, else the owning contract's (e.g. portfolio of a
+        premium). Codes for strings, values for ints; -1 where unknown/null.
+        """
+        table = self.table(dataset)
+        if column in table:
+            v = table.values(column)
+            if v.dtype.kind == "f":
+                return np.where(np.isnan(v), -1, v).astype(np.int64)
+            return v
+        return self.contract_values(dataset, column)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Full dataset as the original JSON-shaped dict."""
+        out: dict[str, Any] = {"metadata": self.metadata}
+        for name, table in self.tables.items():
+            out[name] = table.to_records()
+        return out
+
+
+def as_number(x: Any, col: Column | None = None) -> int | float:
+    """NumPy scalar to Python int/float (int for integer columns)."""
+    if col is not None and col.kind == INT:
+        return int(round(float(x)))
+    if isinstance(x, np.integer):
+        return int(x)
+    return float(x)
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _build_column(name: str, raw: list[Any], dictionaries: dict[str, Dictionary]) -> Column:
+    """Infer a column type from its values and encode it."""
+    present = [v for v in raw if v is not None]
+    has_null = len(present) != len(raw)
+    if present and all(_is_number(v) for v in present):
+        if all(isinstance(v, int) for v in present):
+            if has_null:
+                return Column(INT, np.array([np.nan if v is None else v for v in raw], dtype=np.float64))
+            return Column(INT, np.array(raw, dtype=np.int64))
+        ints = np.fromiter((isinstance(v, int) for v in raw), dtype=bool, count=len(raw))
+        values = np.array([np.nan if v is None else v for v in raw], dtype=np.float64)
+        return Column(FLOAT, values, ints=ints if ints.any() else None)
+    if not present and not raw:
+        return Column(FLOAT, np.zeros(0, dtype=np.float64))
+    if name.endswith("_date"):
+        try:
+            return Column(DATE, np.array(["NaT" if v is None else v for v in raw], dtype="datetime64[D]"))
+        except ValueError:
+            pass
+    dictionary = dictionaries.setdefault(name, Dictionary())
+    return Column(CATEGORY, dictionary.encode(raw), dictionary)
+
+
+def build_table(name: str, records: list[dict[str, Any]], dictionaries: dict[str, Dictionary]) -> Table:
+    """Build a columnar Table from a list of dicts."""
+    names: dict[str, None] = {}
+    for r in records:
+        for k in r:
+            names.setdefault(k, None)
+    columns = {n: _build_column(n, [r.get(n) for r in records], dictionaries) for n in names}
+    return Table(name, columns, len(records))
+
+
+def contract_rows_of(table: Table, contracts: Table, id_dict: Dictionary) -> np.ndarray:
+    """Row in contracts of each row's contract_id (-1 if unknown)."""
+    row_of_code = np.full(len(id_dict), -1, dtype=np.int64)
+    row_of_code[contracts.values("contract_id")] = np.arange(len(contracts))
+    codes = table.values("contract_id")
+    rows = np.full(len(codes), -1, dtype=np.int64)
+    known = codes >= 0
+    rows[known] = row_of_code[codes[known]]
+    return rows
+
+
+def link_contracts(tables: dict[str, Table], dictionaries: dict[str, Dictionary]) -> dict[str, np.ndarray]:
+    """Map contract_id codes in each contract-keyed dataset to contract rows."""
+    id_dict = dictionaries.get("contract_id")
+    contracts = tables.get("contracts")
+    if id_dict is None or contracts is None or "contract_id" not in contracts:
+        return {}
+    out = {}
+    for name in CONTRACT_KEYED:
+        t = tables.get(name)
+        if t is None or "contract_id" not in t:
+            continue
+        out[name] = contract_rows_of(t, contracts, id_dict)
+    return out
+
+
+def build_store(raw: dict[str, Any], version: str = "") -> IFRS17Store:
+    """Convert the JSON-shaped dict (metadata + lists of rows) to a columnar store."""
+    dictionaries: dict[str, Dictionary] = {}
+    tables: dict[str, Table] = {}
+    for key, value in raw.items():
+        if key == "metadata" or not isinstance(value, list):
+            continue
+        tables[key] = build_table(key, value, dictionaries)
+    return IFRS17Store(
+        metadata=raw.get("metadata", {}),
+        tables=tables,
+        dictionaries=dictionaries,
+        contract_rows=link_contracts(tables, dictionaries),
+        version=version,
+    )
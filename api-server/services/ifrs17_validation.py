@@ -0,0 +1,277 @@
+"""
+IFRS 17 data validation, run once per data snapshot at load time.
+
+Three kinds of check, each a set/array operation over whole columns:
+- reference: contract_id of premiums, claims, acquisition costs and reinsurance
+  exists in contracts (the load-time contract links, -1 when unknown); contract_id
+  is unique in contracts; portfolios are among metadata.portfolios.
+- date_range: dates are not after the reporting date, coverage ends after
+  inception, claims are paid after they are incurred and incurred within the
+  contract's coverage, and a contract's cohort_year is its inception year.
+- roll_forward: opening + movements == closing for liability_movements and
+  csm_movements (within ROLL_FORWARD_TOLERANCE, compared in cents).
+
+A check keeps only the ids of the rows that fail it (plus the expected value
+for roll-forwards); row details are decoded for the page being read. Violations
+are reported, never fatal: the data still loads.
+"""
+from dataclasses import dataclass
+import threading
+from typing import Any
+
+import numpy as np
+
+from services import metrics
+from services.ifrs17_store import CONTRACT_KEYED, DATE, IFRS17Store, Table
+
+REFERENCE = "reference"
+DATE_RANGE = "date_range"
+ROLL_FORWARD = "roll_forward"
+CHECKS = (REFERENCE, DATE_RANGE, ROLL_FORWARD)
+
+# Absolute difference allowed between computed and reported closing balances
+ROLL_FORWARD_TOLERANCE = 0.01
+
+# dataset -> (opening column, movement columns, closing column)
+ROLL_FORWARDS: dict[str, tuple[str, tuple[str, ...], str]] = {
+    "liability_movements": (
+        "opening_balance",
+        ("new_contracts", "premiums_received", "claims_incurred", "csm_release", "experience_variance"),
+        "closing_balance",
+    ),
+    "csm_movements": (
+        "opening_csm",
+        ("initial_recognition", "changes_in_estimates", "csm_release_to_pl"),
+        "closing_csm",
+    ),
+}
+
+# Dates that cannot be after metadata.reporting_date
+NOT_AFTER_REPORTING_DATE: tuple[tuple[str, str], ...] = (
+    ("contracts", "inception_date"),
+    ("premiums", "received_date"),
+    ("claims", "incurred_date"),
+    ("claims", "paid_date"),
+    ("assumptions", "effective_date"),
+    ("discount_rates", "as_at_date"),
+)
+
+# (dataset, earlier, later): `later` cannot be before `earlier` in the same row
+DATE_ORDER: tuple[tuple[str, str, str], ...] = (
+    ("contracts", "inception_date", "coverage_end_date"),
+    ("claims", "incurred_date", "paid_date"),
+)
+
+# Datasets whose portfolio must be one of metadata.portfolios
+PORTFOLIO_DATASETS = ("contracts", "assumptions", "liability_movements", "csm_movements")
+
+
+@dataclass
+class CheckResult:
+    """Rows of one dataset failing one rule (ascending row ids)."""
+
+    check: str
+    dataset: str
+    rule: str
+    rows: np.ndarray
+    # Columns shown with each violating row
+    columns: tuple[str, ...]
+    # Roll-forwards: computed closing balance per violating row
+    expected: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+@dataclass
+class ValidationReport:
+    """Every check run on one data version."""
+
+    version: str
+    rows_checked: int
+    results: list[CheckResult]
+
+    @property
+    def violations(self) -> int:
+        return sum(len(r) for r in self.results)
+
+    def summary(self) -> dict[str, Any]:
+        """Counts per rule (rules that passed included)."""
+        return {
+            "version": self.version,
+            "valid": self.violations == 0,
+            "rows_checked": self.rows_checked,
+            "violations": self.violations,
+            "checks": [
+                {"check": r.check, "dataset": r.dataset, "rule": r.rule, "violations": len(r)} for r in self.results
+            ],
+        }
+
+    def page(
+        self,
+        data: IFRS17Store,
+        check: str | None = None,
+        dataset: str | None = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> dict[str, Any]:
+        """
+        Summary plus one page of violating rows of `data` (the snapshot this report
+        is for), optionally of one check kind and/or dataset. Each row is
+        {"check", "dataset", "rule", "row", "values", "expected"}.
+        """
+        if check is not None and check not in CHECKS:
+            raise ValueError(f"Unknown check: {check} (choose from {', '.join(CHECKS)})")
+        selected = [
+            r for r in self.results
+            if (check is None or r.check == check) and (dataset is None or r.dataset == dataset)
+        ]
+        rows: list[dict[str, Any]] = []
+        skip = offset
+        for result in selected:
+            if len(rows) >= limit:
+                break
+            if skip >= len(result):
+                skip -= len(result)
+                continue
+            rows += _violations(data, result, skip, skip + limit - len(rows))
+            skip = 0
+        return {**self.summary(), "total": sum(len(r) for r in selected), "offset": offset, "rows": rows}
+
+
+def _violations(data: IFRS17Store, result: CheckResult, start: int, end: int) -> list[dict[str, Any]]:
+    """Violations start..end of one check, with the row's values decoded."""
+    ids = result.rows[start:end]
+    values = data.table(result.dataset).select_records(result.columns, ids, default=None)
+    expected = [None] * len(ids) if result.expected is None else result.expected[start:end].tolist()
+    return [
+        {
+            "check": result.check,
+            "dataset": result.dataset,
+            "rule": result.rule,
+            "row": row,
+            "values": v,
+            "expected": e,
+        }
+        for row, v, e in zip(ids.tolist(), values, expected)
+    ]
+
+
+def _date(table: Table, column: str) -> np.ndarray | None:
+    col = table.columns.get(column)
+    return col.values if col is not None and col.kind == DATE else None
+
+
+def _references(data: IFRS17Store) -> list[CheckResult]:
+    results = []
+    for dataset in CONTRACT_KEYED:
+        links = data.contract_rows.get(dataset)
+        if links is None:
+            continue
+        results.append(CheckResult(
+            REFERENCE, dataset, "contract_id exists in contracts", np.flatnonzero(links < 0), ("contract_id",)
+        ))
+    contracts = data.table("contracts")
+    if "contract_id" in contracts:
+        ids = contracts.values("contract_id")
+        order = np.argsort(ids, kind="stable")
+        # Every occurrence after the first of a repeated id
+        repeated = order[1:][ids[order][1:] == ids[order][:-1]]
+        results.append(CheckResult(
+            REFERENCE, "contracts", "contract_id is unique", np.sort(repeated), ("contract_id",)
+        ))
+    portfolios = data.metadata.get("portfolios") or []
+    if portfolios:
+        allowed = [c for c in (data.code("portfolio", p) for p in portfolios) if c >= 0]
+        for dataset in PORTFOLIO_DATASETS:
+            table = data.table(dataset)
+            if "portfolio" not in table:
+                continue
+            bad = np.flatnonzero(~np.isin(table.values("portfolio"), allowed))
+            results.append(CheckResult(
+                REFERENCE, dataset, "portfolio is one of metadata.portfolios", bad, ("portfolio",)
+            ))
+    return results
+
+
+def _date_ranges(data: IFRS17Store) -> list[CheckResult]:
+    # Comparisons with NaT are false, so null dates never fail a date check
+    results = []
+    reporting_date = data.metadata.get("reporting_date")
+    if reporting_date:
+        limit = np.datetime64(reporting_date, "D")
+        for dataset, column in NOT_AFTER_REPORTING_DATE:
+            dates = _date(data.table(dataset), column)
+            if dates is not None:
+                results.append(CheckResult(
+                    DATE_RANGE, dataset, f"{column} <= reporting_date {reporting_date}",
+                    np.flatnonzero(dates > limit), (column,),
+                ))
+    for dataset, earlier, later in DATE_ORDER:
+        table = data.table(dataset)
+        first, then = _date(table, earlier), _date(table, later)
+        if first is not None and then is not None:
+            results.append(CheckResult(
+                DATE_RANGE, dataset, f"{later} >= {earlier}", np.flatnonzero(then < first), (earlier, later)
+            ))
+
+    contracts = data.table("contracts")
+    inception, coverage_end = _date(contracts, "inception_date"), _date(contracts, "coverage_end_date")
+    incurred, links = _date(data.table("claims"), "incurred_date"), data.contract_rows.get("claims")
+    if incurred is not None and links is not None and inception is not None and coverage_end is not None:
+        known = np.flatnonzero(links >= 0)
+        owner = links[known]
+        outside = (incurred[known] < inception[owner]) | (incurred[known] > coverage_end[owner])
+        results.append(CheckResult(
+            DATE_RANGE, "claims", "incurred_date within the contract's coverage period",
+            known[outside], ("contract_id", "incurred_date"),
+        ))
+    if inception is not None and "cohort_year" in contracts:
+        years = inception.astype("datetime64[Y]").astype(np.int64) + 1970
+        mismatch = ~np.isnat(inception) & (years != contracts.values("cohort_year"))
+        results.append(CheckResult(
+            DATE_RANGE, "contracts", "cohort_year is the year of inception_date",
+            np.flatnonzero(mismatch), ("contract_id", "inception_date", "cohort_year"),
+        ))
+    return results
+
+
+def _roll_forwards(data: IFRS17Store) -> list[CheckResult]:
+    results = []
+    for dataset, (opening, movements, closing) in ROLL_FORWARDS.items():
+        table = data.table(dataset)
+        if closing not in table:
+            continue
+        expected = table.numeric(opening).astype(np.float64)
+        for column in movements:
+            expected = expected + table.numeric(column)
+        reported = table.numeric(closing)
+        # In whole cents, so float noise in the sums cannot tip a difference of exactly the tolerance
+        cents = np.abs(np.round(expected * 100) - np.round(reported * 100))
+        bad = np.flatnonzero(cents > round(ROLL_FORWARD_TOLERANCE * 100))
+        identity = f"{opening} + {' + '.join(movements)} == {closing}"
+        columns = tuple(c for c in ("portfolio", "cohort_year", opening, *movements, closing) if c in table)
+        results.append(CheckResult(ROLL_FORWARD, dataset, identity, bad, columns, expected[bad]))
+    return results
+
+
+def validate(data: IFRS17Store) -> ValidationReport:
+    """Run every check on a snapshot."""
+    results = _references(data) + _date_ranges(data) + _roll_forwards(data)
+    return ValidationReport(data.version, sum(len(t) for t in data.tables.values()), results)
+
+
+_validation_lock = threading.Lock()
+
+
+def get_validation(data: IFRS17Store) -> ValidationReport:
+    """Validation report for this data snapshot; built once and kept on the snapshot (like aggregates)."""
+    cached = data.derived.get("validation")
+    if cached is not None:
+        return cached
+    with _validation_lock:
+        cached = data.derived.get("validation")
+        if cached is None:
+            with metrics.stage("ifrs17_validation.validate"):
+                cached = data.derived["validation"] = validate(data)
+        return cached
@@ -0,0 +1,222 @@
+"""
+In-process metrics: counters, gauges and histograms rendered in the Prometheus
+text format (GET /metrics), plus stage timers for the data loader and engine.
+
+stage("name") / @timed() record a duration into ifrs17_stage_duration_seconds.
+While a request is being profiled (X-Profile header, see api/middleware.py) the
+same timings are also collected for that request only, via a context variable,
+and returned in a Server-Timing header.
+
+Metrics are per process: with several uvicorn workers, scrape each worker or
+aggregate in Prometheus.
+"""
+import bisect
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+import threading
+import time
+from types import GeneratorType
+from typing import Any, Callable, Generator, Iterator
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Stage timings of the request being profiled (None when not profiling)
+_profile: ContextVar[list[tuple[str, float]] | None] = ContextVar("ifrs17_profile", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1.0) -> None:
+        self.inc(labels, -amount)
+
+    def samples(self) -> Iterator[str]:
+        if not self.labelnames and not self._values:
+            yield f"{self.name} 0"
+        yield from super().samples()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count], sum
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            counts, total = entry
+            # First bucket with bound >= value (len(buckets) is +Inf)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = _labels(self.labelnames, labels, 'le="' + le + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: Any) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+HTTP_REQUESTS = REGISTRY.register(
+    Counter("http_requests_total", "HTTP requests by method, route and status.", ("method", "route", "status"))
+)
+HTTP_LATENCY = REGISTRY.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"), LATENCY_BUCKETS)
+)
+HTTP_RESPONSE_SIZE = REGISTRY.register(
+    Histogram("http_response_size_bytes", "HTTP response body size (as sent).", ("method", "route"), SIZE_BUCKETS)
+)
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "HTTP requests being served."))
+STAGE_SECONDS = REGISTRY.register(
+    Histogram("ifrs17_stage_duration_seconds", "Time spent in data loading and engine stages.", ("stage",))
+)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Record one stage duration (histogram, and the current profile if any)."""
+    STAGE_SECONDS.observe((name,), seconds)
+    profile = _profile.get()
+    if profile is not None:
+        profile.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def timed(name: str | None = None) -> Callable[[Callable], Callable]:
+    """Decorator: time each call as stage `name` (default: <module>.<function>)."""
+
+    def decorate(fn: Callable) -> Callable:
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return _timed_iteration(result, label) if isinstance(result, GeneratorType) else result
+            finally:
+                if not isinstance(result, GeneratorType):
+                    record_stage(label, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorate
+
+
+def _timed_iteration(gen: Generator, label: str) -> Generator:
+    """Generators (e.g. streamed rows) are timed over their whole iteration, not their creation."""
+    start = time.perf_counter()
+    try:
+        yield from gen
+    finally:
+        record_stage(label, time.perf_counter() - start)
+
+
+def start_profile() -> Any:
+    """Collect stage timings for the current request; returns a token for end_profile()."""
+    return _profile.set([])
+
+
+def end_profile(token: Any) -> list[tuple[str, float]]:
+    """Stop collecting and return the (stage, seconds) list, in completion order."""
+    timings = _profile.get() or []
+    _profile.reset(token)
+    return timings
+
+
+def profile_timings() -> list[tuple[str, float]] | None:
+    """Stage timings collected so far for the current request (None if not profiling)."""
+    timings = _profile.get()
+    return list(timings) if timings is not None else None
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return REGISTRY.render()
@@ -0,0 +1,139 @@
+"""
+Password hashing and verification (bcrypt).
+
+bcrypt is deliberately slow (~50-250 ms per call), so the async request path never
+runs it on the event loop or in the shared threadpool: calls go to a dedicated
+process pool of BCRYPT_WORKERS processes. At most BCRYPT_MAX_CONCURRENCY calls
+are in flight; further callers queue, and once BCRYPT_MAX_QUEUE callers are
+waiting new ones are rejected with PasswordHashingBusy (HTTP 503) instead of
+piling up behind a login burst while dashboard requests stall.
+"""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+import weakref
+
+import bcrypt
+
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+BCRYPT_MAX_CONCURRENCY = int(os.environ.get("BCRYPT_MAX_CONCURRENCY", BCRYPT_WORKERS))
+BCRYPT_MAX_QUEUE = int(os.environ.get("BCRYPT_MAX_QUEUE", "256"))
+# Pool kind: "process" (default) or "thread" (e.g. where subprocesses are unavailable)
+BCRYPT_EXECUTOR = os.environ.get("BCRYPT_EXECUTOR", "process")
+
+_pool: Executor | None = None
+_pool_lock = threading.Lock()
+# One semaphore (and waiting count) per event loop
+_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Limit]" = weakref.WeakKeyDictionary()
+
+
+class PasswordHashingBusy(Exception):
+    """Too many password hash/verify calls are already queued."""
+
+
+class _Limit:
+    def __init__(self, concurrency: int):
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.waiting = 0
+
+
+def hash_password(password: str) -> str:
+    """bcrypt hash of the password (first 72 bytes, bcrypt's limit). Blocking."""
+    secret = password.encode("utf-8")[:72]
+    return bcrypt.hashpw(secret, bcrypt.gensalt()).decode("utf-8")
+
+
+def check_password(password: str, password_hash: str | None) -> bool:
+    """True if the password matches the stored bcrypt hash. Blocking."""
+    if not password_hash:
+        return False
+    secret = password.encode("utf-8")[:72]
+    stored = password_hash.strip().encode("utf-8")
+    try:
+        return bcrypt.checkpw(secret, stored)
+    except (ValueError, TypeError):
+        return False
+
+
+def _get_pool() -> Executor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if BCRYPT_EXECUTOR == "thread":
+                _pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+            else:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                _pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS, mp_context=context)
+        return _pool
+
+
+def start_pool() -> None:
+    """Create the pool and start its workers up front (e.g. on app startup)."""
+    pool = _get_pool()
+    # A process pool starts its workers on first submit; do it now rather than on the first login
+    for future in [pool.submit(check_password, "", None) for _ in range(BCRYPT_WORKERS)]:
+        future.result()
+
+
+def shutdown_pool() -> None:
+    """Stop the worker pool (e.g. on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _discard_pool(broken: Executor) -> None:
+    """Drop a broken pool (unless another caller already replaced it)."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _limit() -> _Limit:
+    loop = asyncio.get_running_loop()
+    limit = _limits.get(loop)
+    if limit is None:
+        limit = _limits[loop] = _Limit(BCRYPT_MAX_CONCURRENCY)
+    return limit
+
+
+async def _run(fn, *args):
+    limit = _limit()
+    if limit.semaphore.locked() and limit.waiting >= BCRYPT_MAX_QUEUE:
+        raise PasswordHashingBusy("Too many concurrent password checks; retry shortly")
+    limit.waiting += 1
+    try:
+        await limit.semaphore.acquire()
+    finally:
+        limit.waiting -= 1
+    loop = asyncio.get_running_loop()
+    try:
+        pool = _get_pool()
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS): start a fresh pool and retry once
+            _discard_pool(pool)
+            return await loop.run_in_executor(_get_pool(), fn, *args)
+    finally:
+        limit.semaphore.release()
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password() in the bcrypt pool. Raises PasswordHashingBusy if the queue is full."""
+    return await _run(hash_password, password)
+
+
+async def check_password_async(password: str, password_hash: str | None) -> bool:
+    """check_password() in the bcrypt pool. Raises PasswordHashingBusy if the queue is full."""
+    if not password_hash:
+        return False
+    return await _run(check_password, password, password_hash)
@@ -1,23 +1,35 @@
 # Business logic — SQLite (db/data.db)
 
 from datetime import datetime
+import os
 
-import bcrypt
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
+from auth.cache import TTLCache
+from database import AsyncSessionLocal, SessionLocal
 from models.db_models import UserTable
 from models.user_model import Role, User
+from services.passwords import check_password_async, hash_password, hash_password_async
 from schemas.user_schema import UserCreate
 
 DEFAULT_ADMIN_EMAIL = "admin@admin.com"
 DEFAULT_ADMIN_PASSWORD = "1234"
 
+# Users by id (role checks on admin routes). Invalidated on create/change in this
+# process; the TTL bounds staleness for changes made by other processes.
+USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.environ.get("AUTH_USER_CACHE_TTL", "60"))
+_user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
 
-def _hash_password(password: str) -> str:
-    secret = password.encode("utf-8")[:72]
-    return bcrypt.hashpw(secret, bcrypt.gensalt()).decode("utf-8")
+
+def invalidate_user(user_id: int | None = None) -> None:
+    """Drop one cached user (or all users). Call after any change to a user row."""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(user_id)
 
 
 def _row_to_user(row: UserTable) -> User:
@@ -32,7 +44,10 @@ def _row_to_user(row: UserTable) -> User:
 
 
 class UserService:
-    """User business logic. Data stored in SQLite db/data.db."""
+    """
+    Synchronous user tasks run outside the request path (app startup, benchmarks).
+    Requests go through AsyncUserService.
+    """
 
     def _session(self) -> Session:
         return SessionLocal()
@@ -41,9 +56,10 @@ class UserService:
         """Create default admin (admin@admin.com / 1234) if not present. Call on app startup."""
         db = self._session()
         try:
+            # Only look up the id; bcrypt runs only when the admin really has to be created
             exists = (
-                db.query(UserTable)
-                .filter(UserTable.email == DEFAULT_ADMIN_EMAIL)
+                db.query(UserTable.id)
+                .filter(func.lower(UserTable.email) == DEFAULT_ADMIN_EMAIL.strip().lower())
                 .first()
             )
             if exists:
@@ -51,75 +67,77 @@ class UserService:
             admin = UserTable(
                 email=DEFAULT_ADMIN_EMAIL.strip().lower(),
                 name="Default Admin",
-                password_hash=_hash_password(DEFAULT_ADMIN_PASSWORD),
+                password_hash=hash_password(DEFAULT_ADMIN_PASSWORD),
                 role=Role.ADMIN.value,
             )
             db.add(admin)
             db.commit()
+            invalidate_user(admin.id)
         finally:
             db.close()
 
-    def list_all(self) -> list[User]:
-        db = self._session()
-        try:
-            rows = db.query(UserTable).order_by(UserTable.id).all()
+
+class AsyncUserService:
+    """
+    Async user business logic (aiosqlite pool, see database.py) for the request path.
+    bcrypt runs in the password pool (services/passwords.py), never on the event loop.
+    """
+
+    def _session(self) -> AsyncSession:
+        return AsyncSessionLocal()
+
+    async def list_all(self) -> list[User]:
+        async with self._session() as db:
+            rows = (await db.scalars(select(UserTable).order_by(UserTable.id))).all()
             return [_row_to_user(r) for r in rows]
-        finally:
-            db.close()
 
-    def get_by_id(self, user_id: int) -> User | None:
-        db = self._session()
-        try:
-            row = db.query(UserTable).filter(UserTable.id == user_id).first()
-            return _row_to_user(row) if row else None
-        finally:
-            db.close()
+    async def get_by_id(self, user_id: int) -> User | None:
+        """User by id, served from the user cache when possible."""
+        user = _user_cache.get(user_id)
+        if user is not None:
+            return user
+        async with self._session() as db:
+            row = await db.get(UserTable, user_id)
+        if not row:
+            return None
+        user = _row_to_user(row)
+        _user_cache.set(user_id, user)
+        return user
 
-    def get_by_email(self, email: str) -> User | None:
+    async def get_by_email(self, email: str) -> User | None:
         if not email:
             return None
         norm = email.strip().lower()
-        db = self._session()
-        try:
-            row = (
-                db.query(UserTable)
-                .filter(func.lower(UserTable.email) == norm)
-                .first()
+        async with self._session() as db:
+            row = await db.scalar(
+                select(UserTable).where(func.lower(UserTable.email) == norm).limit(1)
             )
             return _row_to_user(row) if row else None
-        finally:
-            db.close()
 
-    def authenticate(self, email: str, password: str) -> User | None:
-        user = self.get_by_email(email)
+    async def authenticate(self, email: str, password: str) -> User | None:
+        user = await self.get_by_email(email)
         if not user or not user.password_hash:
             return None
-        secret = password.encode("utf-8")[:72]
-        stored = user.password_hash.strip().encode("utf-8")
-        try:
-            if not bcrypt.checkpw(secret, stored):
-                return None
-        except (ValueError, TypeError):
+        if not await check_password_async(password, user.password_hash):
             return None
         return user
 
-    def create(self, data: UserCreate) -> User:
-        db = self._session()
-        try:
+    async def create(self, data: UserCreate) -> User:
+        password_hash = await hash_password_async(data.password)
+        async with self._session() as db:
             # Store email in lowercase for case-insensitive lookup
-            email_norm = data.email.strip().lower()
             row = UserTable(
-                email=email_norm,
+                email=data.email.strip().lower(),
                 name=data.name.strip(),
-                password_hash=_hash_password(data.password),
+                password_hash=password_hash,
                 role=Role.USER.value,
             )
             db.add(row)
-            db.commit()
-            db.refresh(row)
+            await db.commit()
+            await db.refresh(row)
+            invalidate_user(row.id)
             return _row_to_user(row)
-        finally:
-            db.close()
 
 
 user_service = UserService()
+async_user_service = AsyncUserService()
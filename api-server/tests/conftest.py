@@ -0,0 +1,87 @@
+"""
+Shared fixtures. The app's SQLite DB and the IFRS 17 delta log point at a
+throwaway directory before any app module is imported, so tests never touch
+db/data.db or the sample data's delta log; the in-memory backend reads the
+bundled sample data. bcrypt runs in threads, so no worker processes start.
+"""
+import json
+import os
+from pathlib import Path
+import tempfile
+from uuid import uuid4
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+_TMP = Path(tempfile.mkdtemp(prefix="ifrs17-tests-"))
+SAMPLE_DATA = PROJECT_ROOT / "ifrs17_sample_data.json"
+os.environ["IFRS17_DATA_PATH"] = str(SAMPLE_DATA)
+os.environ["DB_PATH"] = str(_TMP / "app.db")
+os.environ["IFRS17_DELTA_LOG"] = str(_TMP / "delta.ndjson")
+os.environ["BCRYPT_EXECUTOR"] = "thread"
+
+from fastapi.testclient import TestClient  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+from auth.jwt import create_access_token  # noqa: E402
+from database import Base, init_db  # noqa: E402
+from database import engine as default_engine  # noqa: E402
+import main  # noqa: E402
+from models import db_models  # noqa: E402, F401
+from services import ifrs17_data, ifrs17_ingest, ifrs17_sql  # noqa: E402
+from services.user_service import DEFAULT_ADMIN_EMAIL, user_service  # noqa: E402
+
+
+@pytest.fixture
+def raw_data():
+    """The sample data file as parsed JSON (fresh per test, safe to modify)."""
+    return json.loads(SAMPLE_DATA.read_text(encoding="utf-8"))
+
+
+@pytest.fixture
+def sample_data():
+    """The bundled sample data as a fresh in-memory snapshot (no appends)."""
+    ifrs17_data.clear_cache()
+    Path(os.environ["IFRS17_DELTA_LOG"]).unlink(missing_ok=True)
+    yield ifrs17_data.load_data()
+    ifrs17_data.clear_cache()
+    Path(os.environ["IFRS17_DELTA_LOG"]).unlink(missing_ok=True)
+
+
+@pytest.fixture
+def sql_engine(tmp_path):
+    """The sample CSVs ingested into a temporary SQLite DB, used by the SQL backend."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'ifrs17.db'}")
+    Base.metadata.create_all(bind=engine)
+    ifrs17_ingest.ingest_directory(PROJECT_ROOT, engine=engine)
+    ifrs17_sql.use_engine(engine)
+    yield engine
+    ifrs17_sql.use_engine(default_engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def client(sample_data):
+    """API client over the sample data (startup hooks such as the bcrypt pool are not run)."""
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def admin_headers():
+    """Bearer token of the default admin in the throwaway DB."""
+    init_db()
+    user_service.ensure_default_admin()
+    with default_engine.connect() as conn:
+        admin_id = conn.exec_driver_sql("SELECT id FROM users WHERE email = ?", (DEFAULT_ADMIN_EMAIL,)).scalar()
+    return {"Authorization": f"Bearer {create_access_token(admin_id)}"}
+
+
+@pytest.fixture
+def user_headers(client):
+    """Bearer token of a newly registered (non-admin) user, from the login route."""
+    init_db()
+    email = f"user-{uuid4().hex[:12]}@example.com"
+    r = client.post("/api/v1/register", json={"email": email, "name": "Test User", "password": "secret"})
+    assert r.status_code == 201, r.text
+    r = client.post("/api/v1/login", json={"email": email, "password": "secret"})
+    assert r.status_code == 200, r.text
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
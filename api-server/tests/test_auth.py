@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from uuid import uuid4
+
+import jwt
+import pytest
+
+from auth import cache, jwt as auth_jwt
+from database import init_db
+from models.user_model import Role, User
+from schemas.user_schema import UserCreate
+from services import passwords, user_service
+from services.passwords import PasswordHashingBusy
+from services.user_service import async_user_service
+
+
+class Clock:
+    """Stand-in for time.monotonic in auth/cache.py."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def new_user():
+    """Email and password of a newly created (non-admin) user."""
+    init_db()
+    email = f"user-{uuid4().hex[:12]}@example.com"
+    user = asyncio.run(async_user_service.create(UserCreate(email=email, name="Test User", password="secret")))
+    return user, email
+
+
+def test_async_login(client, new_user):
+    user, email = new_user
+    assert asyncio.run(async_user_service.authenticate(email.upper(), "secret")).id == user.id
+    assert asyncio.run(async_user_service.authenticate(email, "wrong")) is None
+    assert asyncio.run(async_user_service.authenticate("nobody@example.com", "secret")) is None
+    r = client.post("/api/v1/login", json={"email": email, "password": "secret"})
+    assert r.status_code == 200
+    token = r.json()["access_token"]
+    assert auth_jwt.verify_token(token)["sub"] == str(user.id)
+    r = client.get(f"/api/v1/users/{user.id}", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 200
+    assert r.json()["email"] == email
+    assert client.post("/api/v1/login", json={"email": email, "password": "wrong"}).status_code == 401
+
+
+def test_user_cache_serves_repeat_lookups_and_is_invalidated_on_create(new_user, monkeypatch):
+    user, _ = new_user
+    assert asyncio.run(async_user_service.get_by_id(user.id)) == user
+
+    def no_db():
+        raise AssertionError("user should come from the cache")
+
+    monkeypatch.setattr(async_user_service, "_session", no_db)
+    assert asyncio.run(async_user_service.get_by_id(user.id)) == user
+    monkeypatch.undo()
+
+    # A stale entry under the id the next user gets is dropped when that user is created
+    stale = User(id=user.id + 1, email="stale@example.com", name="Stale", password_hash="", role=Role.ADMIN)
+    user_service._user_cache.set(stale.id, stale)
+    email = f"user-{uuid4().hex[:12]}@example.com"
+    created = asyncio.run(async_user_service.create(UserCreate(email=email, name="Next User", password="secret")))
+    assert created.id == stale.id
+    assert asyncio.run(async_user_service.get_by_id(created.id)) == created
+
+
+def test_ttl_cache_expires_and_evicts(clock):
+    entries = cache.TTLCache(maxsize=2, ttl=10)
+    entries.set("a", 1)
+    entries.set("b", 2, ttl=3)
+    entries.set("c", 3, ttl=60)  # capped at the default ttl
+    assert (entries.get("a"), len(entries)) == (None, 2)  # least recently used, evicted
+    clock.now += 3
+    assert entries.get("b") is None
+    clock.now += 6.9
+    assert entries.get("c") == 3
+    clock.now += 0.1
+    assert entries.get("c") is None
+    entries.set("d", 4, ttl=0)
+    assert entries.get("d") is None
+
+
+def test_token_cache_entries_never_outlive_exp(clock, monkeypatch):
+    monkeypatch.setattr(auth_jwt, "_token_cache", cache.TTLCache(10, ttl=300))
+    exp = int(time.time()) + 30
+    token = jwt.encode({"sub": "1", "exp": exp}, auth_jwt.SECRET_KEY, algorithm=auth_jwt.ALGORITHM)
+    assert auth_jwt.verify_token_cached(token)["sub"] == "1"
+    expires, _ = auth_jwt._token_cache._entries[token]
+    # The entry expires with the token (30 s), not after the cache's 300 s
+    assert expires - clock.now <= exp - time.time() + 1
+    clock.now += 31
+    assert auth_jwt._token_cache.get(token) is None
+
+    expired = jwt.encode({"sub": "1", "exp": int(time.time()) - 1}, auth_jwt.SECRET_KEY, algorithm=auth_jwt.ALGORITHM)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        auth_jwt.verify_token_cached(expired)
+    with pytest.raises(jwt.InvalidTokenError):
+        auth_jwt.verify_token_cached("not-a-token")
+    assert len(auth_jwt._token_cache) == 0
+
+
+def test_full_password_queue_raises_busy(monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(passwords, "BCRYPT_MAX_QUEUE", 1)
+    release = threading.Event()
+
+    def slow_check(password, password_hash):
+        assert release.wait(10)
+        return True
+
+    monkeypatch.setattr(passwords, "check_password", slow_check)
+
+    async def burst():
+        running = asyncio.create_task(passwords.check_password_async("a", "hash"))
+        queued = asyncio.create_task(passwords.check_password_async("b", "hash"))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(PasswordHashingBusy):
+                await passwords.check_password_async("c", "hash")
+        finally:
+            release.set()
+        return await running, await queued
+
+    try:
+        assert asyncio.run(burst()) == (True, True)
+    finally:
+        passwords.shutdown_pool()
+
+
+def test_busy_password_pool_is_503(client, new_user, monkeypatch):
+    _, email = new_user
+
+    async def busy(*args):
+        raise PasswordHashingBusy("Too many concurrent password checks; retry shortly")
+
+    monkeypatch.setattr(user_service, "check_password_async", busy)
+    monkeypatch.setattr(user_service, "hash_password_async", busy)
+    r = client.post("/api/v1/login", json={"email": email, "password": "secret"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+    r = client.post("/api/v1/register", json={"email": f"x-{email}", "name": "X", "password": "secret"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import pytest
+
+from services import ifrs17_data
+
+SAMPLE_DATA = Path(os.environ["IFRS17_DATA_PATH"])
+DELTA_LOG = Path(os.environ["IFRS17_DELTA_LOG"])
+
+PREMIUM = {
+    "contract_id": "MTR-2023-001",
+    "period": "2024-Q4",
+    "gross_premium": 500,
+    "ceded_premium": 50.5,
+    "net_premium": 449.5,
+    "received_date": "2024-10-01",
+}
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """A copy of the sample data file, loaded as the current snapshot."""
+    path = tmp_path / "data.json"
+    path.write_bytes(SAMPLE_DATA.read_bytes())
+    ifrs17_data.clear_cache()
+    DELTA_LOG.unlink(missing_ok=True)
+    ifrs17_data.load_data(path)
+    yield path
+    ifrs17_data.clear_cache()
+    DELTA_LOG.unlink(missing_ok=True)
+
+
+def rewrite(path: Path, content: bytes) -> str:
+    """Replace the data file (with a new mtime) and return the version it should load as."""
+    stat = path.stat()
+    path.write_bytes(content)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def test_rewritten_file_is_served_after_reload(data_file, raw_data):
+    old = ifrs17_data.load_data(data_file)
+    assert not ifrs17_data.reload_if_changed(data_file)
+    raw_data["premiums"][0]["gross_premium"] += 1000
+    version = rewrite(data_file, json.dumps(raw_data).encode())
+    assert ifrs17_data.reload_if_changed(data_file)
+    new = ifrs17_data.load_data(data_file)
+    assert new.version == version != old.version
+    assert new.table("premiums").to_records()[0] == raw_data["premiums"][0]
+    assert not ifrs17_data.reload_if_changed(data_file)
+
+
+def test_touched_but_unchanged_file_keeps_the_snapshot(data_file):
+    appended = ifrs17_data.append_rows("premiums", [PREMIUM], data_file)
+    rewrite(data_file, data_file.read_bytes())
+    assert not ifrs17_data.reload_if_changed(data_file)
+    assert ifrs17_data.load_data(data_file) is appended
+
+
+def test_appends_do_not_wait_for_a_rebuild(data_file, raw_data, monkeypatch):
+    building, release = threading.Event(), threading.Event()
+    build_store = ifrs17_data.build_store
+
+    def slow_build_store(*args, **kwargs):
+        building.set()
+        assert release.wait(10)
+        return build_store(*args, **kwargs)
+
+    monkeypatch.setattr(ifrs17_data, "build_store", slow_build_store)
+    raw_data["premiums"][0]["gross_premium"] += 1000
+    version = rewrite(data_file, json.dumps(raw_data).encode())
+    reload = threading.Thread(target=ifrs17_data.reload_if_changed, args=(data_file,))
+    reload.start()
+    try:
+        assert building.wait(10)
+        # The old snapshot still serves, and takes appends, while the new one is built
+        appended = ifrs17_data.append_rows("premiums", [PREMIUM], data_file)
+        assert appended.table("premiums").to_records()[-1] == PREMIUM
+    finally:
+        release.set()
+        reload.join(10)
+    assert ifrs17_data.load_data(data_file).version == version
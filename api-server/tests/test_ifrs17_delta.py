@@ -0,0 +1,137 @@
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from services import ifrs17_data, ifrs17_engine
+from services.ifrs17_aggregates import build_aggregates, get_aggregates
+
+DELTA_LOG = Path(os.environ["IFRS17_DELTA_LOG"])
+
+PREMIUM = {
+    "contract_id": "MTR-2023-001",
+    "period": "2024-Q4",
+    "gross_premium": 500,
+    "ceded_premium": 50.5,
+    "net_premium": 449.5,
+    "received_date": "2024-10-01",
+}
+
+
+@pytest.mark.parametrize(
+    "dataset, rows, message",
+    [
+        ("contracts", [PREMIUM], "can only be appended"),
+        ("premiums", [], "No rows"),
+        ("premiums", [{**PREMIUM, "colour": "red"}], "Unknown column"),
+        ("premiums", [{"contract_id": "MTR-2023-001"}], "gross_premium: missing in row"),
+        ("premiums", [PREMIUM, {**PREMIUM, "net_premium": None}], r"net_premium: missing in row\(s\) 1"),
+        ("premiums", [{k: v for k, v in PREMIUM.items() if k != "received_date"}], "received_date: missing"),
+        ("premiums", [{**PREMIUM, "contract_id": None}], "contract_id: missing"),
+        ("premiums", [{**PREMIUM, "contract_id": "NOPE-0001"}], "no such contract"),
+        ("premiums", [{**PREMIUM, "gross_premium": "500"}], "gross_premium: expected a number"),
+        ("premiums", [{**PREMIUM, "gross_premium": True}], "gross_premium: expected a number"),
+        ("premiums", [{**PREMIUM, "received_date": "2024-13-01"}], "received_date: expected a YYYY-MM-DD date"),
+        ("premiums", [{**PREMIUM, "period": 4}], "period: expected a string"),
+        ("claims", [{"contract_id": "MTR-2023-001", "claim_id": "CLM-X"}], "incurred_date: missing"),
+        ("acquisition_costs", [{"contract_id": "MTR-2023-001", "period": "2024-Q4"}], "commission: missing"),
+        ("reinsurance", [{"contract_id": "MTR-2023-001", "reinsurer": "R"}], "ceded_premium_ytd: missing"),
+    ],
+)
+def test_invalid_batches_are_rejected_whole(sample_data, dataset, rows, message):
+    with pytest.raises(ValueError, match=message):
+        ifrs17_data.append_rows(dataset, rows)
+    assert ifrs17_data.load_data() is sample_data
+    assert not DELTA_LOG.exists()
+
+
+def test_valid_batch_is_logged_and_visible(sample_data):
+    claim = {
+        "contract_id": "MTR-2023-001",
+        "claim_id": "CLM-NEW-1",
+        "incurred_date": "2024-06-01",
+        "paid_date": None,  # open claim
+        "incurred_amount": 1000,
+        "paid_amount": 0,
+        "outstanding_reserve": 1000.5,
+    }
+    data = ifrs17_data.append_rows("premiums", [PREMIUM])
+    data = ifrs17_data.append_rows("claims", [claim])
+    assert data.version != sample_data.version
+    assert [json.loads(line)["dataset"] for line in DELTA_LOG.read_text(encoding="utf-8").splitlines()] == [
+        "premiums",
+        "claims",
+    ]
+    filtered = ifrs17_engine.get_data(contract_id="MTR-2023-001")
+    assert filtered["premiums"][-1] == PREMIUM
+    assert filtered["claims"][-1] == claim
+    assert len(ifrs17_engine.get_data()["premiums"]) == len(sample_data.table("premiums")) + 1
+
+
+def _close(a, b) -> bool:
+    """Same figures, numbers equal up to float summation order."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_close(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_close(x, y) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        return type(a) is type(b) and math.isclose(a, b, rel_tol=1e-12, abs_tol=1e-9)
+    return a == b
+
+
+BATCHES = [
+    ("premiums", [PREMIUM, {**PREMIUM, "contract_id": "LIF-2022-001", "gross_premium": 1200.25}]),
+    ("claims", [{
+        "contract_id": "PRP-2024-001",
+        "claim_id": "CLM-NEW-2",
+        "incurred_date": "2024-09-01",
+        "paid_date": "2024-10-15",
+        "incurred_amount": 2500,
+        "paid_amount": 2000,
+        "outstanding_reserve": 500,
+    }]),
+    ("acquisition_costs", [{
+        "contract_id": "MTR-2024-001", "period": "2024", "commission": 80.5, "underwriting_cost": 20, "total": 100.5,
+    }]),
+    ("reinsurance", [{
+        "contract_id": "LIF-2023-001",
+        "reinsurer": "Reinsurer B",
+        "ceded_premium_ytd": 300,
+        "recoveries_ytd": 10,
+        "reinsurance_asset_balance": 90,
+    }]),
+    ("premiums", [{**PREMIUM, "contract_id": "PRP-2023-001", "gross_premium": 75}]),
+]
+
+
+def test_incremental_aggregates_equal_a_full_rebuild(sample_data):
+    get_aggregates(sample_data)
+    for dataset, rows in BATCHES:
+        data = ifrs17_data.append_rows(dataset, rows)
+        # add_rows updated the previous aggregates; rebuild from scratch and compare
+        incremental = data.derived["aggregates"]
+        full = build_aggregates(data)
+        assert incremental.version == full.version == data.version
+        for figure in ("summary", "by_portfolio", "liability_trend", "csm_trend", "portfolio_comparison"):
+            assert _close(getattr(incremental, figure), getattr(full, figure)), figure
+        for name, grid in full.grids.items():
+            assert np.array_equal(incremental.grids[name].count, grid.count), name
+            for column, sums in grid.sums.items():
+                assert np.allclose(incremental.grids[name].sums[column], sums, rtol=1e-12), (name, column)
+            assert incremental.grids[name].integer == grid.integer, name
+        for name, index in full.lineage.items():
+            cells = range(full.grids[name].count.size)
+            assert all(np.array_equal(incremental.lineage[name].rows(c), index.rows(c)) for c in cells), name
+
+
+def test_append_endpoint(client, admin_headers):
+    assert client.post("/api/v1/ifrs17/data/premiums", json={"rows": [PREMIUM]}).status_code == 401
+    r = client.post("/api/v1/ifrs17/data/premiums", json={"rows": [{"contract_id": "MTR-2023-001"}]}, headers=admin_headers)
+    assert r.status_code == 400
+    assert "gross_premium: missing" in r.json()["detail"]
+    r = client.post("/api/v1/ifrs17/data/premiums", json={"rows": [PREMIUM]}, headers=admin_headers)
+    assert r.status_code == 200
+    assert r.json()["appended"] == 1
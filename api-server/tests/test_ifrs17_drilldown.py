@@ -0,0 +1,72 @@
+import pytest
+
+from services import ifrs17_engine
+from services.ifrs17_drilldown import FIGURES, MAX_LIMIT, drill_down
+from services.ifrs17_engine import CSM_COLUMNS, LIABILITY_COLUMNS
+
+# FIGURES also names the by_portfolio keys; the rest are summary keys
+BY_PORTFOLIO = ("premium", "claims", "liability", "opening", "csm", "count")
+
+
+def rows_total(result) -> float:
+    """The figure rebuilt from its drill-down rows: the column summed, or the rows counted."""
+    column = result["column"]
+    return len(result["rows"]) if column is None else sum(row[column] or 0 for row in result["rows"])
+
+
+@pytest.mark.parametrize("figure", [f for f in FIGURES if f not in BY_PORTFOLIO])
+def test_summary_figures_are_the_sum_of_their_rows(sample_data, figure):
+    result = drill_down(figure=figure, limit=MAX_LIMIT)
+    assert result["value"] == ifrs17_engine.get_dashboard_summary()[figure]
+    assert result["total"] == len(result["rows"])
+    assert rows_total(result) == pytest.approx(result["value"])
+
+
+def test_by_portfolio_figures_are_the_sum_of_their_rows(sample_data):
+    for portfolio, figures in ifrs17_engine.get_dashboard_summary()["by_portfolio"].items():
+        assert set(figures) == set(BY_PORTFOLIO)
+        for figure, value in figures.items():
+            result = drill_down(figure=figure, portfolio=portfolio, limit=MAX_LIMIT)
+            assert result["value"] == value, (portfolio, figure)
+            assert rows_total(result) == pytest.approx(value), (portfolio, figure)
+            assert {row["portfolio"] for row in result["rows"]} <= {portfolio}
+
+
+@pytest.mark.parametrize(
+    "dataset, columns, reconciliation",
+    [
+        ("liability_movements", LIABILITY_COLUMNS, ifrs17_engine.get_reconciliation_liability),
+        ("csm_movements", CSM_COLUMNS, ifrs17_engine.get_reconciliation_csm),
+    ],
+)
+def test_reconciliation_cells_are_the_sum_of_their_rows(sample_data, dataset, columns, reconciliation):
+    for row in reconciliation()["rows"]:
+        for column in columns:
+            result = drill_down(
+                dataset=dataset, column=column, portfolio=row["portfolio"], cohort_year=row["cohort_year"]
+            )
+            assert result["value"] == row[column], (row["portfolio"], row["cohort_year"], column)
+            assert rows_total(result) == pytest.approx(row[column])
+
+
+def test_pages_concatenate_to_the_whole_figure(sample_data):
+    whole = drill_down(figure="claims_incurred", limit=MAX_LIMIT)
+    pages = [drill_down(figure="claims_incurred", offset=offset, limit=2) for offset in range(0, whole["total"], 2)]
+    assert [row for page in pages for row in page["rows"]] == whole["rows"]
+    assert drill_down(figure="claims_incurred", offset=whole["total"])["rows"] == []
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        ({"figure": "nope"}, "Unknown figure"),
+        ({"figure": "csm", "dataset": "csm_movements"}, "not both"),
+        ({}, "Give a figure or a dataset"),
+        ({"dataset": "discount_rates"}, "No figures are aggregated"),
+        ({"dataset": "claims", "column": "claim_id"}, "is not aggregated"),
+        ({"figure": "csm", "limit": 0}, "limit must be"),
+    ],
+)
+def test_bad_drill_downs_raise(sample_data, kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        drill_down(**kwargs)
@@ -0,0 +1,119 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from services import ifrs17_engine
+from services.ifrs17_store import build_store
+
+# Set by conftest before collection
+SAMPLE_DATA = Path(os.environ["IFRS17_DATA_PATH"])
+
+CONTRACT_KEYED = ("premiums", "claims", "acquisition_costs", "reinsurance")
+
+
+def list_get_data(raw, portfolio=None, cohort_year=None, contract_id=None):
+    """get_data as it was before the columnar store: list filters over the JSON rows."""
+    if not portfolio and cohort_year is None and not contract_id:
+        return raw
+    contracts = raw["contracts"]
+    ids = {c["contract_id"] for c in contracts if not portfolio or c["portfolio"] == portfolio}
+    if cohort_year is not None:
+        ids &= {c["contract_id"] for c in contracts if c.get("cohort_year") == cohort_year}
+    if contract_id:
+        ids &= {contract_id}
+    out = {"metadata": raw["metadata"], "contracts": [c for c in contracts if c["contract_id"] in ids]}
+    for key in CONTRACT_KEYED:
+        out[key] = [r for r in raw[key] if r.get("contract_id") in ids]
+    for key in ("assumptions", "discount_rates", "liability_movements", "csm_movements", "claims_development"):
+        items = raw[key]
+        if key in ("liability_movements", "csm_movements"):
+            items = [
+                r for r in items
+                if (portfolio is None or r.get("portfolio") == portfolio)
+                and (cohort_year is None or r.get("cohort_year") == cohort_year)
+            ]
+        elif key == "claims_development" and cohort_year is not None:
+            items = [r for r in items if r.get("cohort_year") == cohort_year]
+        elif key == "assumptions" and portfolio:
+            items = [r for r in items if r.get("portfolio") == portfolio]
+        out[key] = items
+    return out
+
+
+def _filters():
+    raw = json.loads(SAMPLE_DATA.read_text(encoding="utf-8"))
+    portfolios = sorted({c["portfolio"] for c in raw["contracts"]}) + ["Unknown"]
+    cohorts = sorted({c["cohort_year"] for c in raw["contracts"]}) + [1999]
+    ids = [c["contract_id"] for c in raw["contracts"]] + ["NOPE-0001"]
+    combos = [{}]
+    combos += [{"portfolio": p} for p in portfolios]
+    combos += [{"cohort_year": y} for y in cohorts]
+    combos += [{"portfolio": p, "cohort_year": y} for p in portfolios for y in cohorts]
+    combos += [{"contract_id": c} for c in ids]
+    combos += [{"portfolio": raw["contracts"][0]["portfolio"], "contract_id": c} for c in ids[:3]]
+    return combos
+
+
+def test_store_round_trips_the_json_exactly(raw_data):
+    # Same values and types (ints stay ints, e.g. assumptions value_pct 8)
+    assert json.dumps(build_store(raw_data).to_dict()) == json.dumps(raw_data)
+
+
+@pytest.mark.parametrize("filters", _filters(), ids=str)
+def test_get_data_matches_list_filters(sample_data, raw_data, filters):
+    assert json.dumps(ifrs17_engine.get_data(**filters)) == json.dumps(list_get_data(raw_data, **filters))
+
+
+@pytest.mark.parametrize("filters", [{}, {"portfolio": "Motor"}, {"cohort_year": 2023}, {"contract_id": "MTR-2023-001"}])
+@pytest.mark.parametrize("dataset", ifrs17_engine.DATA_KEYS)
+def test_cursor_pages_cover_the_dataset_once(sample_data, filters, dataset):
+    expected = ifrs17_engine.get_data(**filters)[dataset]
+    rows, cursor, pages = [], None, 0
+    while True:
+        page = ifrs17_engine.get_data_page(dataset=dataset, cursor=cursor, limit=2, **filters)
+        assert page["total"] == len(expected)
+        rows += page["rows"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert rows == expected
+    assert pages == max(1, -(-len(expected) // 2))
+
+
+def test_cursor_carries_the_dataset(sample_data):
+    first = ifrs17_engine.get_data_page(dataset="premiums", limit=2)
+    second = ifrs17_engine.get_data_page(cursor=first["next_cursor"], limit=2)
+    assert second["dataset"] == "premiums"
+    assert second["rows"] == ifrs17_engine.get_data()["premiums"][2:4]
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        ({"dataset": "nope"}, "Unknown dataset"),
+        ({"cursor": "not-a-cursor"}, "Invalid cursor"),
+        ({"dataset": "claims", "cursor": ifrs17_engine.encode_cursor("premiums", 2, "v")}, "different dataset"),
+    ],
+)
+def test_bad_page_requests(sample_data, kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        ifrs17_engine.get_data_page(**kwargs)
+
+
+def test_cursor_expires_when_the_data_changes(sample_data, raw_data):
+    cursor = ifrs17_engine.get_data_page(dataset="premiums", limit=2)["next_cursor"]
+    other = build_store(raw_data, version="other")
+    with pytest.raises(ValueError, match="expired"):
+        ifrs17_engine.get_data_page(cursor=cursor, data=other)
+
+
+def test_iter_data_rows_rejects_unknown_datasets_before_yielding(sample_data):
+    rows = ifrs17_engine.iter_data_rows(datasets=["premiums", "nope"])
+    with pytest.raises(ValueError, match="Unknown dataset: nope"):
+        next(rows)
+    assert [d for d, _ in ifrs17_engine.iter_data_rows(datasets=["claims"]) if d != "metadata"] == ["claims"] * len(
+        sample_data.table("claims")
+    )
@@ -0,0 +1,77 @@
+import csv
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+from services import ifrs17_engine, ifrs17_export
+from services.ifrs17_engine import DATA_KEYS, LIABILITY_COLUMNS
+
+EXPORT = "/api/v1/ifrs17/export"
+
+
+def read_csv(body: bytes) -> list[list[str]]:
+    return list(csv.reader(io.StringIO(body.decode("utf-8"))))
+
+
+def cell(value) -> str:
+    """A value as csv.writer writes it."""
+    return "" if value is None else str(value)
+
+
+@pytest.mark.parametrize("params", [{}, {"portfolio": "Motor"}, {"contract_id": "LIF-2022-001"}])
+def test_csv_data_export_matches_get_data(client, sample_data, monkeypatch, params):
+    # Small chunks, so the export streams in several pieces
+    monkeypatch.setattr(ifrs17_export, "CSV_CHUNK_BYTES", 64)
+    r = client.get(f"{EXPORT}/data", params={"format": "csv", "dataset": "premiums", **params})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == ifrs17_export.MEDIA_TYPES["csv"]
+    assert r.headers["content-disposition"] == 'attachment; filename="ifrs17-data.csv"'
+    header, *rows = read_csv(r.content)
+    expected = ifrs17_engine.get_data(**params)["premiums"]
+    assert header == list(sample_data.table("premiums").columns)
+    assert len(rows) == len(expected) > 0
+    assert rows == [[cell(row[c]) for c in header] for row in expected]
+
+
+def test_csv_reconciliation_ends_with_totals(client, sample_data):
+    r = client.get(f"{EXPORT}/liability-reconciliation", params={"format": "csv"})
+    assert r.status_code == 200
+    header, *rows, total = read_csv(r.content)
+    reconciliation = ifrs17_engine.get_reconciliation_liability()
+    assert header == ["portfolio", "cohort_year", *LIABILITY_COLUMNS]
+    assert len(rows) == len(reconciliation["rows"])
+    assert total[:2] == ["Total", ""]
+    assert [float(v) for v in total[2:]] == pytest.approx([reconciliation["totals"][c] for c in LIABILITY_COLUMNS])
+
+
+def test_xlsx_data_export_opens_in_openpyxl(client, sample_data):
+    r = client.get(f"{EXPORT}/data", params={"portfolio": "Life"})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == ifrs17_export.MEDIA_TYPES["xlsx"]
+    workbook = load_workbook(io.BytesIO(r.content), read_only=True)
+    assert workbook.sheetnames == list(DATA_KEYS)
+    expected = ifrs17_engine.get_data(portfolio="Life")
+    for key in DATA_KEYS:
+        header, *rows = workbook[key].iter_rows(values_only=True)
+        assert list(header) == list(sample_data.table(key).columns)
+        assert len(rows) == len(expected[key]), key
+    header, *rows = workbook["premiums"].iter_rows(values_only=True)
+    premiums = [dict(zip(header, row)) for row in rows]
+    assert [p["gross_premium"] for p in premiums] == [p["gross_premium"] for p in expected["premiums"]]
+    workbook.close()
+
+
+@pytest.mark.parametrize(
+    "path, params, message",
+    [
+        ("data", {"format": "pdf"}, "Unknown format"),
+        ("data", {"format": "csv"}, "exactly one dataset"),
+        ("data", {"dataset": "nope"}, "Unknown dataset"),
+        ("balance-sheet", {}, "Unknown report"),
+    ],
+)
+def test_bad_exports_are_400(client, sample_data, path, params, message):
+    r = client.get(f"{EXPORT}/{path}", params=params)
+    assert r.status_code == 400
+    assert message in r.json()["detail"]
@@ -0,0 +1,65 @@
+import pytest
+
+from services.ifrs17_query import Filter, Measure, run_query
+
+QUERY = "/api/v1/ifrs17/query"
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        ({"dataset": "nope"}, "Unknown dataset"),
+        ({"dataset": "premiums", "dimensions": ["colour"]}, "Unknown column"),
+        ({"dataset": "premiums", "dimensions": ["product"]}, "join=contracts"),
+        ({"dataset": "premiums", "measures": [{"op": "median", "column": "gross_premium"}]}, "median"),
+        ({"dataset": "premiums", "measures": [{"op": "sum", "column": "period"}]}, "not a numeric column"),
+        ({"dataset": "premiums", "filters": [{"column": "gross_premium", "op": "like", "value": 1}]}, "Unknown filter op"),
+        ({"dataset": "contracts", "filters": [{"column": "portfolio", "value": None}]}, "non-null scalar"),
+        ({"dataset": "contracts", "filters": [{"column": "portfolio", "op": "in", "value": []}]}, "non-empty list"),
+        ({"dataset": "contracts", "filters": [{"column": "contract_id", "op": "in", "value": [[1]]}]}, "non-null scalar"),
+        ({"dataset": "contracts", "filters": [{"column": "portfolio", "value": {"a": 1}}]}, "non-null scalar"),
+        ({"dataset": "contracts", "filters": [{"column": "portfolio", "value": 3}]}, "expects string values"),
+        ({"dataset": "contracts", "filters": [{"column": "portfolio", "op": "gt", "value": "A"}]}, "number or date"),
+        ({"dataset": "contracts", "filters": [{"column": "cohort_year", "value": "x"}]}, "expects a number"),
+        ({"dataset": "contracts", "filters": [{"column": "cohort_year", "value": True}]}, "expects a number"),
+        ({"dataset": "premiums", "filters": [{"column": "received_date", "op": "gte", "value": 5}]}, "YYYY-MM-DD"),
+        ({"dataset": "premiums", "filters": [{"column": "received_date", "value": "soon"}]}, "YYYY-MM-DD"),
+        ({"dataset": "premiums", "dimensions": ["period"], "pivot": "contract_id"}, "pivot"),
+        ({"dataset": "premiums", "dimensions": ["period", "period"]}, "distinct"),
+    ],
+)
+def test_invalid_queries_are_400(client, body, message):
+    r = client.post(QUERY, json=body)
+    assert r.status_code == 400, r.text
+    assert message in r.json()["detail"]
+
+
+def _count(data, dataset, filters, join=None):
+    result = run_query(dataset, measures=[Measure("count")], filters=filters, join=join, data=data)
+    return result["rows"][0]["count"] if result["rows"] else 0
+
+
+@pytest.mark.parametrize(
+    "dataset, join, filters",
+    [
+        ("contracts", None, [Filter("portfolio", "Motor")]),
+        ("contracts", None, [Filter("cohort_year", 2023)]),
+        ("contracts", None, [Filter("cohort_year", 2023.0)]),
+        ("contracts", None, [Filter("cohort_year", 2023.5)]),
+        ("contracts", None, [Filter("cohort_year", [2022, 2023], "in")]),
+        ("contracts", None, [Filter("portfolio", ["Motor", "Nope"], "in")]),
+        ("premiums", "contracts", [Filter("portfolio", "Life"), Filter("cohort_year", 2024)]),
+        ("premiums", None, [Filter("contract_id", "MTR-2023-001")]),
+    ],
+)
+def test_index_lookups_match_a_scan(sample_data, dataset, join, filters):
+    """The indexed eq/in path counts the same rows as filtering the decoded records."""
+    table = sample_data.table(dataset)
+    records = table.to_records()
+    if join:
+        contracts = sample_data.table("contracts").to_records(sample_data.contract_rows[dataset])
+        records = [{**contract, **record} for contract, record in zip(contracts, records)]
+    expected = sum(
+        all(r.get(f.column) in ([f.value] if f.op == "eq" else f.value) for f in filters) for r in records
+    )
+    assert _count(sample_data, dataset, filters, join) == expected
@@ -0,0 +1,64 @@
+import pytest
+
+from services import ifrs17_scenarios
+from services.ifrs17_measurement import BALANCES, Shock
+from services.ifrs17_scenarios import Scenario, run_scenarios
+
+SCENARIOS = [
+    Scenario("discount rate +1%", (Shock("discount_rate", 1),)),
+    Scenario("lapse +10%", (Shock("lapse_rate", 0.1, relative=True),)),
+    Scenario("life lapse +1", (Shock("lapse_rate", 1, portfolio="Life"),)),
+    Scenario("mortality -5%, discount -1%", (Shock("mortality_rate_base", -0.05, True), Shock("discount_rate", -1))),
+]
+
+
+def test_zero_shocks_give_zero_deltas(sample_data):
+    zero = [
+        Scenario("no shocks"),
+        Scenario("zero", (Shock("discount_rate", 0), Shock("lapse_rate", 0, relative=True), Shock("expense_ratio", 0))),
+    ]
+    result = run_scenarios(zero)
+    for scenario in result["scenarios"]:
+        assert all(t["delta"] == 0 for t in scenario["totals"].values())
+        assert all(row[k] == 0 for row in scenario["deltas"] for k in BALANCES)
+    assert {k: t["value"] for k, t in result["scenarios"][1]["totals"].items()} == result["base"]["totals"]
+
+
+def test_shocks_move_the_balances(sample_data):
+    result = run_scenarios(SCENARIOS)
+    for scenario in result["scenarios"]:
+        assert any(row[k] != 0 for row in scenario["deltas"] for k in BALANCES), scenario["name"]
+    # A shock scoped to one portfolio leaves the others alone
+    life = result["scenarios"][2]["deltas"]
+    assert all(row[k] == 0 for row in life if row["portfolio"] != "Life" for k in BALANCES)
+
+
+def test_pool_matches_in_process_run(sample_data, monkeypatch):
+    in_process = run_scenarios(SCENARIOS, workers=1)
+    # One scenario per batch, and every run big enough for the pool
+    monkeypatch.setattr(ifrs17_scenarios, "MAX_BATCH_CELLS", 1)
+    monkeypatch.setattr(ifrs17_scenarios, "POOL_THRESHOLD", 0)
+    try:
+        pooled = run_scenarios(SCENARIOS, workers=2)
+    finally:
+        ifrs17_scenarios.shutdown_pool()
+    assert (pooled["batches"], pooled["workers"]) == (len(SCENARIOS) + 1, 2)
+    assert (in_process["batches"], in_process["workers"]) == (1, 1)
+    for key in ("base", "scenarios", "basis", "period_start"):
+        assert pooled[key] == in_process[key]
+
+
+def test_too_many_scenarios_are_rejected(sample_data):
+    with pytest.raises(ValueError, match="At most"):
+        run_scenarios([Scenario("base")] * (ifrs17_scenarios.MAX_SCENARIOS + 1))
+
+
+def test_scenarios_endpoint_needs_a_signed_in_user(client, user_headers):
+    body = {"scenarios": [{"name": "discount rate +1%", "shocks": [{"target": "discount_rate", "value": 1}]}]}
+    assert client.post("/api/v1/ifrs17/scenarios", json=body).status_code == 401
+    r = client.post("/api/v1/ifrs17/scenarios", json=body, headers=user_headers)
+    assert r.status_code == 200, r.text
+    assert [s["name"] for s in r.json()["scenarios"]] == ["discount rate +1%"]
+    r = client.post("/api/v1/ifrs17/scenarios", json={"scenarios": []}, headers=user_headers)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Provide scenarios or grid"
@@ -0,0 +1,127 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from services import ifrs17_snapshot
+from services.ifrs17_aggregates import build_aggregates
+from services.ifrs17_delta import apply_batch, prepare_batch
+from services.ifrs17_snapshot import compile_snapshot, load_csv_store, load_json_store, open_snapshot, read_manifest
+from services.ifrs17_store import CATEGORY, DATE, FLOAT, INT, MappedDictionary, build_table
+from services.ifrs17_validation import get_validation
+
+SAMPLE_DATA = Path(os.environ["IFRS17_DATA_PATH"])
+# The sample CSVs sit next to the JSON file
+CSV_DIR = SAMPLE_DATA.parent
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    """The sample JSON as a store and the snapshot compiled from it, mapped back."""
+    store = load_json_store(SAMPLE_DATA)
+    compile_snapshot(store, tmp_path)
+    return store, open_snapshot(tmp_path), tmp_path / read_manifest(tmp_path)["data_dir"]
+
+
+def test_snapshot_round_trip(compiled):
+    store, mapped, _ = compiled
+    assert mapped.version == store.version
+    assert mapped.metadata == store.metadata
+    assert list(mapped.tables) == list(store.tables)
+    for name, table in store.tables.items():
+        assert mapped.table(name).to_records() == table.to_records()
+        assert {k: c.kind for k, c in mapped.table(name).columns.items()} == {
+            k: c.kind for k, c in table.columns.items()
+        }
+    for name, links in store.contract_rows.items():
+        assert mapped.contract_rows[name].tolist() == links.tolist()
+
+
+def test_snapshot_is_arrays_only_and_mapped(compiled):
+    _, mapped, directory = compiled
+    assert {p.suffix for p in directory.iterdir()} == {".npy"}
+    columns = [c for t in mapped.tables.values() for c in t.columns.values()]
+    aggregates = mapped.derived["aggregates"]
+    arrays = [c.values for c in columns] + [g.count for g in aggregates.grids.values()]
+    arrays += [r.rows for r in mapped.derived["validation"].results]
+    arrays += [d._offsets for d in mapped.dictionaries.values()]
+    assert all(isinstance(a.base, np.memmap) for a in arrays)
+
+
+def test_snapshot_aggregates_and_validation_match_a_rebuild(compiled):
+    store, mapped, _ = compiled
+    mapped_aggregates, rebuilt = mapped.derived["aggregates"], build_aggregates(store)
+    for key in ("version", "portfolios", "cohorts", "by_portfolio", "summary", "liability_trend", "csm_trend",
+                "portfolio_comparison"):
+        assert getattr(mapped_aggregates, key) == getattr(rebuilt, key)
+    for name, grid in rebuilt.grids.items():
+        assert mapped_aggregates.grids[name].count.tolist() == grid.count.tolist()
+        assert {c: s.tolist() for c, s in mapped_aggregates.grids[name].sums.items()} == {
+            c: s.tolist() for c, s in grid.sums.items()
+        }
+        assert mapped_aggregates.lineage[name].order.tolist() == rebuilt.lineage[name].order.tolist()
+    report = get_validation(store)
+    assert mapped.derived["validation"].summary() == report.summary()
+    assert mapped.derived["validation"].page(mapped) == report.page(store)
+
+
+def test_mapped_dictionaries_look_up_without_decoding(compiled):
+    store, mapped, _ = compiled
+    ids = mapped.dictionaries["contract_id"]
+    assert isinstance(ids, MappedDictionary)
+    for value in store.dictionaries["contract_id"].values:
+        assert ids.code(value) == store.dictionaries["contract_id"].code(value)
+    assert ids.code("NOPE-0001") == -1
+    assert ids.code(None) == -1
+    assert ids.decode(np.array([1, -1, 0])) == ["MTR-2023-002", None, "MTR-2023-001"]
+    assert ids._values is None
+
+
+def test_appends_to_a_mapped_snapshot(compiled):
+    store, mapped, _ = compiled
+    rows = [{"contract_id": "LIF-2022-001", "period": "2025", "gross_premium": 500, "ceded_premium": 0,
+             "net_premium": 500, "received_date": "2024-12-01"}]
+    batch, links = prepare_batch(mapped, "premiums", rows)
+    appended = apply_batch(mapped, batch, links, "next")
+    assert appended.table("premiums").to_records()[-1] == rows[0]
+    assert appended.contract_rows["premiums"][-1] == store.dictionaries["contract_id"].code("LIF-2022-001")
+    assert mapped.dictionaries["period"].code("2025") == len(store.dictionaries["period"])
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 3, 65536])
+def test_csv_store_matches_json_store_in_any_chunk_size(monkeypatch, chunk_rows):
+    monkeypatch.setattr(ifrs17_snapshot, "CSV_CHUNK_ROWS", chunk_rows)
+    csv_store, json_store = load_csv_store(CSV_DIR), load_json_store(SAMPLE_DATA)
+    assert csv_store.metadata == {**json_store.metadata, "description": None}
+    for name, table in json_store.tables.items():
+        assert csv_store.table(name).to_records() == table.to_records()
+    for name, links in json_store.contract_rows.items():
+        assert csv_store.contract_rows[name].tolist() == links.tolist()
+
+
+COLUMNS = {
+    # name: (CSV cells, expected kind)
+    "counts": (["", "1", "", "2", "3"], INT),
+    "amounts": (["1", "", "2", "2.5", "3"], FLOAT),
+    "codes": (["", "1", "2", "x", "3"], CATEGORY),
+    "paid_date": (["", "", "2024-01-01", "", "2024-02-01"], DATE),
+    "bad_date": (["", "2024-01-01", "2024-02-01", "soon", ""], CATEGORY),
+    "empty_date": (["", "", "", "", ""], DATE),
+    "empty": (["", "", "", "", ""], CATEGORY),
+}
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 4])
+def test_csv_columns_change_kind_across_chunks(tmp_path, monkeypatch, chunk_rows):
+    monkeypatch.setattr(ifrs17_snapshot, "CSV_CHUNK_ROWS", chunk_rows)
+    path = tmp_path / "extra.csv"
+    lines = [",".join(COLUMNS)] + [",".join(cells[i] for cells, _ in COLUMNS.values()) for i in range(5)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    table = ifrs17_snapshot.read_csv_table("extra", path, {})
+    records = [{k: ifrs17_snapshot._csv_number(v[0][i]) for k, v in COLUMNS.items()} for i in range(5)]
+    expected = build_table("extra", records, {})
+    assert {k: c.kind for k, c in table.columns.items()} == {k: kind for k, (_, kind) in COLUMNS.items()}
+    assert table.to_records() == expected.to_records()
+    assert table.columns["codes"].dictionary.values == expected.columns["codes"].dictionary.values
+
@@ -0,0 +1,43 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from services import ifrs17_sql
+
+_CONTRACTS = json.loads(Path(os.environ["IFRS17_DATA_PATH"]).read_text())["contracts"]
+_PORTFOLIOS = sorted({c["portfolio"] for c in _CONTRACTS})
+_COHORTS = sorted({c["cohort_year"] for c in _CONTRACTS})
+
+# Every filter combination of the sample data, one test case each
+FILTERS: list[dict] = [{}]
+FILTERS += [{"portfolio": p} for p in _PORTFOLIOS]
+FILTERS += [{"cohort_year": y} for y in _COHORTS]
+FILTERS += [{"portfolio": p, "cohort_year": y} for p in _PORTFOLIOS for y in _COHORTS]
+FILTERS += [{"contract_id": c["contract_id"]} for c in _CONTRACTS]
+
+
+def _id(filters: dict) -> str:
+    return ",".join(f"{k}={v}" for k, v in filters.items()) or "unfiltered"
+
+
+@pytest.mark.parametrize("filters", FILTERS, ids=_id)
+def test_sql_backend_matches_memory(sql_engine, sample_data, filters):
+    assert ifrs17_sql.compare_backends([filters]) == []
+
+
+def test_check_covers_every_filter_combination(sql_engine):
+    assert all(f in FILTERS for f in ifrs17_sql.filter_sets())
+    assert {} in ifrs17_sql.filter_sets()
+
+
+def test_sql_backend_matches_memory_everywhere(sql_engine, sample_data):
+    assert ifrs17_sql.compare_backends() == []
+
+
+def test_compare_backends_reports_differences(sql_engine, sample_data):
+    with sql_engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE ifrs17_premiums SET gross_premium = gross_premium + 1")
+    assert any("gross_premium" in d for d in ifrs17_sql.compare_backends())
+    assert any("gross_premium" in d for d in ifrs17_sql.compare_backends([{"portfolio": _PORTFOLIOS[0]}]))
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from services.ifrs17_store import build_store
+from services.ifrs17_triangles import build_triangles, chain_ladder
+
+# Cumulative incurred by cohort (2022-2024) and development year, valued at 2024-12-31:
+#   2022: 100  150  165
+#   2023: 200  320
+#   2024: 300
+# Link ratios: (150 + 320) / (100 + 200) = 1.5667 and 165 / 150 = 1.1; CDFs 1.7233, 1.1, 1.
+# Ultimates: 165, 320 * 1.1 = 352 and 300 * 1.7233 = 517, so IBNR = 0 + 32 + 217 = 249.
+CUMULATIVE = np.array([[100.0, 150.0, 165.0], [200.0, 320.0, 0.0], [300.0, 0.0, 0.0]])
+OBSERVED = np.array([[True, True, True], [True, True, False], [True, False, False]])
+
+# (contract, incurred date, amount) giving the triangle above, plus one claim after the valuation date
+CLAIMS = [
+    ("LIF-2022-001", "2022-03-01", 100),
+    ("LIF-2022-001", "2023-06-15", 50),
+    ("LIF-2022-001", "2024-11-30", 15),
+    ("MTR-2023-001", "2023-08-01", 150),
+    ("LIF-2023-001", "2023-12-31", 50),
+    ("MTR-2023-002", "2024-02-10", 120),
+    ("MTR-2024-001", "2024-05-01", 300),
+    ("MTR-2024-001", "2025-01-02", 999),
+]
+
+
+def test_chain_ladder_by_hand():
+    projection = chain_ladder(CUMULATIVE, OBSERVED)
+    assert projection["link_ratios"].tolist() == pytest.approx([470 / 300, 1.1])
+    assert projection["cdf"].tolist() == pytest.approx([470 / 300 * 1.1, 1.1, 1.0])
+    assert projection["latest"].tolist() == [165, 320, 300]
+    assert projection["ultimate"].tolist() == pytest.approx([165, 352, 517])
+    assert projection["reserve"].tolist() == pytest.approx([0, 32, 217])
+
+
+def test_chain_ladder_without_history_keeps_latest():
+    # A single development column has no link ratio to estimate: factor 1, no reserve
+    projection = chain_ladder(np.array([[10.0], [20.0]]), np.array([[True], [True]]), tail=1.05)
+    assert projection["cdf"].tolist() == pytest.approx([1.05])
+    assert projection["ultimate"].tolist() == pytest.approx([10.5, 21.0])
+
+
+def test_triangles_and_ibnr_from_claims(raw_data):
+    raw_data["claims"] = [
+        {"contract_id": contract, "claim_id": f"CLM-T{i}", "incurred_date": day, "paid_date": day,
+         "incurred_amount": amount, "paid_amount": amount / 2, "outstanding_reserve": amount / 2}
+        for i, (contract, day, amount) in enumerate(CLAIMS)
+    ]
+    result = build_triangles(build_store(raw_data, version="test"), origin="cohort", period="year")
+    assert result["origins"] == ["2022", "2023", "2024"]
+    assert result["claims"] == len(CLAIMS)
+    incurred, paid = result["incurred"], result["paid"]
+    assert incurred["cumulative"] == [[100, 150, 165], [200, 320, None], [300, None, None]]
+    assert incurred["incremental"] == [[100, 50, 15], [200, 120, None], [300, None, None]]
+    assert incurred["link_ratios"] == [1.5667, 1.1]
+    assert incurred["cdf"] == [1.7233, 1.1, 1.0]
+    assert incurred["ultimate"] == [165, 352, 517]
+    assert result["ibnr"] == [0, 32, 217]
+    assert result["ibnr_total"] == 249
+    # Half of each claim is paid when incurred: same factors, half the reserve
+    assert paid["link_ratios"] == incurred["link_ratios"]
+    assert paid["reserve"] == [0, 16, 108.5]
@@ -0,0 +1,90 @@
+import pytest
+
+from services.ifrs17_store import build_store
+from services.ifrs17_validation import DATE_RANGE, REFERENCE, ROLL_FORWARD, ROLL_FORWARDS, validate
+
+
+def failures(raw):
+    """(check, dataset, rule) -> violating row ids, for the rules that fail."""
+    report = validate(build_store(raw, version="test"))
+    return {(r.check, r.dataset, r.rule): r.rows.tolist() for r in report.results if len(r)}
+
+
+@pytest.fixture
+def clean(raw_data):
+    """Sample data with its roll-forwards made to add up, so every rule passes."""
+    for dataset, (opening, movements, closing) in ROLL_FORWARDS.items():
+        for row in raw_data[dataset]:
+            row[closing] = round(row[opening] + sum(row[m] for m in movements), 2)
+    return raw_data
+
+
+def test_sample_data_roll_forward_violations(raw_data):
+    found = failures(raw_data)
+    assert {key[:2] for key in found} == {(ROLL_FORWARD, "liability_movements"), (ROLL_FORWARD, "csm_movements")}
+    assert sum(len(rows) for rows in found.values()) == 6
+
+
+def test_clean_data_passes(clean):
+    assert failures(clean) == {}
+
+
+def _set(raw, dataset, row, **values):
+    raw[dataset][row].update(values)
+
+
+FAULTS = [
+    # (dataset, row, values, check, rule)
+    ("premiums", 2, {"contract_id": "NOPE-0001"}, REFERENCE, "contract_id exists in contracts"),
+    ("reinsurance", 0, {"contract_id": "NOPE-0001"}, REFERENCE, "contract_id exists in contracts"),
+    ("contracts", 3, {"portfolio": "Marine"}, REFERENCE, "portfolio is one of metadata.portfolios"),
+    ("assumptions", 1, {"portfolio": "Marine"}, REFERENCE, "portfolio is one of metadata.portfolios"),
+    ("premiums", 1, {"received_date": "2025-01-01"}, DATE_RANGE, "received_date <= reporting_date 2024-12-31"),
+    ("claims", 0, {"paid_date": "2023-07-01"}, DATE_RANGE, "paid_date >= incurred_date"),
+    ("contracts", 0, {"coverage_end_date": "2022-12-31"}, DATE_RANGE, "coverage_end_date >= inception_date"),
+    ("claims", 0, {"incurred_date": "2024-06-01", "paid_date": "2024-07-01"}, DATE_RANGE,
+     "incurred_date within the contract's coverage period"),
+    ("contracts", 1, {"cohort_year": 2019}, DATE_RANGE, "cohort_year is the year of inception_date"),
+]
+
+
+@pytest.mark.parametrize("dataset, row, values, check, rule", FAULTS)
+def test_injected_fault_is_reported(clean, dataset, row, values, check, rule):
+    _set(clean, dataset, row, **values)
+    found = failures(clean)
+    assert found.get((check, dataset, rule)) == [row]
+
+
+def test_duplicate_contract_id(clean):
+    clean["contracts"].append(dict(clean["contracts"][0]))
+    found = failures(clean)
+    assert found[(REFERENCE, "contracts", "contract_id is unique")] == [len(clean["contracts"]) - 1]
+
+
+@pytest.mark.parametrize("dataset", list(ROLL_FORWARDS))
+@pytest.mark.parametrize("cents, fails", [(1, False), (2, True), (-2, True)])
+def test_roll_forward_tolerance_is_one_cent(clean, dataset, cents, fails):
+    opening, movements, closing = ROLL_FORWARDS[dataset]
+    row = clean[dataset][0]
+    # Amounts whose float sum is not exact, so the check must compare in cents
+    row.update({opening: 207767.63, movements[0]: 163645.17, movements[1]: 66651.66})
+    for m in movements[2:]:
+        row[m] = 0
+    row[closing] = round(438064.46 - cents / 100, 2)
+    found = [rows for (check, ds, _), rows in failures(clean).items() if check == ROLL_FORWARD and ds == dataset]
+    assert found == ([[0]] if fails else [])
+
+
+def test_null_dates_never_fail(clean):
+    _set(clean, "claims", 0, paid_date=None)
+    assert failures(clean) == {}
+
+
+def test_validation_endpoint_pages_violations(client):
+    r = client.get("/api/v1/ifrs17/validation", params={"check": ROLL_FORWARD, "limit": 4})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["total"] == 6 and len(body["rows"]) == 4 and body["valid"] is False
+    rest = client.get("/api/v1/ifrs17/validation", params={"check": ROLL_FORWARD, "offset": 4}).json()
+    assert len(rest["rows"]) == 2
+    assert client.get("/api/v1/ifrs17/validation", params={"check": "spelling"}).status_code == 400
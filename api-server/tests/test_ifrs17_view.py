@@ -0,0 +1,94 @@
+import json
+
+import pytest
+
+from services import ifrs17_data
+
+PATHS = [
+    "/api/v1/ifrs17/metadata",
+    "/api/v1/ifrs17/dashboard",
+    "/api/v1/ifrs17/reconciliations/liability",
+    "/api/v1/ifrs17/data?portfolio=Motor",
+    "/api/v1/ifrs17/data?dataset=premiums&limit=2",
+    "/api/v1/ifrs17/validation",
+]
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_matching_etag_gets_304(client, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+    assert client.get(path, headers={"If-None-Match": '"stale"'}).status_code == 200
+    # Weak comparison: the strong form of the same tag matches too
+    strong = etag.removeprefix("W/")
+    assert client.get(path, headers={"If-None-Match": f'"other", {strong}'}).status_code == 304
+
+
+def test_gzip_and_identity_share_a_weak_etag(client):
+    path = "/api/v1/ifrs17/data"
+    plain = client.get(path, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(path, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert plain.headers["etag"] == gzipped.headers["etag"]
+    assert plain.headers["etag"].startswith('W/"')
+    revalidated = client.get(path, headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_etag_depends_on_query_and_format(client):
+    tags = {
+        client.get(path, headers=headers).headers["etag"]
+        for path, headers in [
+            ("/api/v1/ifrs17/data?portfolio=Motor", {}),
+            ("/api/v1/ifrs17/data?portfolio=Life", {}),
+            ("/api/v1/ifrs17/data?portfolio=Motor", {"Accept": "application/x-ndjson"}),
+        ]
+    }
+    assert len(tags) == 3
+
+
+def test_etag_changes_with_the_data(client):
+    path = "/api/v1/ifrs17/dashboard"
+    etag = client.get(path).headers["etag"]
+    ifrs17_data.append_rows("premiums", [{
+        "contract_id": "MTR-2023-001",
+        "period": "2024-Q4",
+        "gross_premium": 100,
+        "ceded_premium": 0,
+        "net_premium": 100,
+        "received_date": "2024-10-01",
+    }])
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_ndjson_streams_one_line_per_row(client, sample_data):
+    r = client.get("/api/v1/ifrs17/data", params={"format": "ndjson", "dataset": "premiums"})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0]["dataset"] == "metadata"
+    assert [line["row"] for line in lines[1:]] == sample_data.table("premiums").to_records()
+
+
+@pytest.mark.parametrize(
+    "params, message",
+    [
+        ({"format": "ndjson", "dataset": "nope"}, "Unknown dataset"),
+        ({"format": "ndjson", "cursor": "anything"}, "cursor cannot be combined with NDJSON"),
+        ({"dataset": "nope"}, "Unknown dataset"),
+    ],
+)
+def test_bad_data_requests_are_400(client, params, message):
+    r = client.get("/api/v1/ifrs17/data", params=params)
+    assert r.status_code == 400
+    assert message in r.json()["detail"]
@@ -0,0 +1,63 @@
+import pytest
+
+from api import middleware
+from auth import dependencies
+
+PATH = "/api/v1/ifrs17/dashboard"
+
+
+@pytest.mark.parametrize(
+    "access, who, status",
+    [
+        ("admin", None, 401),
+        ("admin", "user", 403),
+        ("admin", "admin", 200),
+        ("token", None, 401),
+        ("token", "admin", 401),
+        ("token", "scraper", 200),
+        ("public", None, 200),
+    ],
+)
+def test_metrics_access(client, admin_headers, user_headers, monkeypatch, access, who, status):
+    monkeypatch.setattr(dependencies, "METRICS_ACCESS", access)
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "scrape-secret")
+    headers = {
+        None: {},
+        "user": user_headers,
+        "admin": admin_headers,
+        "scraper": {"Authorization": "Bearer scrape-secret"},
+    }[who]
+    r = client.get("/metrics", headers=headers)
+    assert r.status_code == status
+    if status == 200:
+        assert "http_requests_total" in r.text
+
+
+def test_metrics_token_mode_needs_a_token(client, monkeypatch):
+    monkeypatch.setattr(dependencies, "METRICS_ACCESS", "token")
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "")
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+
+
+@pytest.mark.parametrize(
+    "mode, who, profiled",
+    [
+        ("admin", None, False),
+        ("admin", "user", False),
+        ("admin", "admin", True),
+        ("all", None, True),
+        ("off", "admin", False),
+    ],
+)
+def test_profile_header_is_gated(client, admin_headers, user_headers, monkeypatch, mode, who, profiled):
+    monkeypatch.setattr(middleware, "PROFILE_REQUESTS", mode)
+    headers = {None: {}, "user": user_headers, "admin": admin_headers}[who]
+    r = client.get(PATH, headers={"X-Profile": "1", **headers})
+    assert r.status_code == 200
+    assert ("server-timing" in r.headers) is profiled
+    if profiled:
+        assert "ifrs17_engine.get_dashboard" in r.headers["server-timing"]
+
+
+def test_no_profile_without_the_header(client, admin_headers):
+    assert "server-timing" not in client.get(PATH, headers=admin_headers).headers
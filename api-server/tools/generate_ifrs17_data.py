@@ -0,0 +1,458 @@
+"""
+Synthetic IFRS 17 dataset generator, for measuring the engine at production volume.
+
+Produces the same layout as ifrs17_sample_data.json (and the
+IFRS17_sample_data_<dataset>.csv files) for any number of contracts:
+premiums, acquisition costs, claims and reinsurance reference generated
+contracts, and liability/CSM movements and claims development are rolled up
+from them, so every foreign key resolves and every roll-forward adds up.
+
+Contracts are generated in fixed chunks of CHUNK_CONTRACTS with one RNG per
+chunk (seeded from --seed and the chunk number), and each chunk is written out
+before the next is built: memory stays flat at any size, and the output
+depends only on the seed, the contract count and the reporting date.
+
+Usage (from api-server):
+    python -m tools.generate_ifrs17_data --contracts 1000000 --json /data/ifrs17_1m.json
+    python -m tools.generate_ifrs17_data --contracts 100000 --csv-dir /data/csv --seed 7
+"""
+import argparse
+import json
+from pathlib import Path
+import shutil
+import tempfile
+import time
+from typing import Any
+
+import numpy as np
+
+from services.ifrs17_ingest import csv_path
+from services.ifrs17_store import DATASETS
+
+# Contracts per generated chunk. Part of the output's identity: changing it changes the data for a seed.
+CHUNK_CONTRACTS = 50_000
+
+PORTFOLIOS = ("Motor", "Property", "Life")
+_PREFIX = ("MTR", "PRP", "LIF")
+_WEIGHTS = np.array([0.5, 0.3, 0.2])
+_PRODUCTS = (
+    ("Motor Comprehensive", "Motor Third Party"),
+    ("Fire and Theft", "Homeowners"),
+    ("Term Life", "Whole Life"),
+)
+_MODEL = ("PAA", "PAA", "GMM")
+_REINSURER = ("Reinsurer A", "Reinsurer B", None)
+# Per portfolio: median gross premium, premium spread (lognormal sigma), ceded share,
+# claims per contract, median claim, commission and underwriting cost (share of premium)
+_PREMIUM = np.array([1000.0, 2500.0, 500.0])
+_PREMIUM_SIGMA = np.array([0.35, 0.4, 0.3])
+_CEDED = np.array([0.15, 0.15, 0.0])
+_CLAIM_FREQ = np.array([0.25, 0.12, 0.01])
+_CLAIM_SIZE = np.array([2500.0, 6000.0, 50000.0])
+_COMMISSION = np.array([0.10, 0.10, 0.15])
+_UNDERWRITING = np.array([0.04, 0.035, 0.2])
+# Liability/CSM roll-up: opening liability and CSM per unit of cohort premium, yearly CSM
+# release share, and yearly run-off of the opening liability
+_OPENING_LIABILITY = np.array([0.35, 0.4, 8.0])
+_CSM_MARGIN = np.array([0.2, 0.18, 5.0])
+_CSM_RELEASE = np.array([1.0, 1.0, 0.1])
+_RUNOFF = np.array([0.3, 0.3, 0.9])
+_DEV_YEARS = 3
+
+_ASSUMPTIONS = (
+    ("Motor", "lapse_rate", 8, "Annual policy lapse rate"),
+    ("Motor", "claim_inflation", 5, "Expected claims inflation"),
+    ("Property", "lapse_rate", 6, "Annual policy lapse rate"),
+    ("Property", "claim_inflation", 4, "Expected claims inflation"),
+    ("Life", "mortality_rate_base", 0.12, "Base mortality per 1000"),
+    ("Life", "lapse_rate", 4, "Annual lapse rate"),
+)
+_DISCOUNT_CURVE = ((1, 4.5), (2, 4.6), (3, 4.7), (5, 4.8), (10, 5.0))
+
+# Column order per dataset (matches the sample JSON / CSV files)
+COLUMNS = {
+    "contracts": (
+        "contract_id", "portfolio", "product", "inception_date", "coverage_end_date",
+        "measurement_model", "cohort_year", "currency",
+    ),
+    "premiums": ("contract_id", "period", "gross_premium", "ceded_premium", "net_premium", "received_date"),
+    "claims": (
+        "contract_id", "claim_id", "incurred_date", "paid_date", "incurred_amount", "paid_amount",
+        "outstanding_reserve",
+    ),
+    "acquisition_costs": ("contract_id", "period", "commission", "underwriting_cost", "total"),
+    "assumptions": ("portfolio", "assumption_type", "value_pct", "effective_date", "description"),
+    "discount_rates": ("term_years", "rate_pct", "as_at_date"),
+    "reinsurance": ("contract_id", "reinsurer", "ceded_premium_ytd", "recoveries_ytd", "reinsurance_asset_balance"),
+    "liability_movements": (
+        "portfolio", "cohort_year", "opening_balance", "new_contracts", "premiums_received",
+        "claims_incurred", "csm_release", "experience_variance", "closing_balance",
+    ),
+    "csm_movements": (
+        "portfolio", "cohort_year", "opening_csm", "initial_recognition", "changes_in_estimates",
+        "csm_release_to_pl", "closing_csm",
+    ),
+    "claims_development": (
+        "cohort_year", *(f"development_year_{k}" for k in range(1, _DEV_YEARS + 1)), "incremental_claims",
+    ),
+}
+
+
+def _money(values: np.ndarray) -> np.ndarray:
+    return np.round(values, 2) + 0.0
+
+
+def _roll_forward(opening_and_movements: list[float]) -> list[float]:
+    """Rounded opening and movements, then the closing as their sum (so the row adds up to the cent)."""
+    row = [round(float(x), 2) + 0.0 for x in opening_and_movements]
+    return row + [round(sum(row), 2) + 0.0]
+
+
+def _dates(days: np.ndarray) -> list[str]:
+    return np.datetime_as_string(days.astype("datetime64[D]")).tolist()
+
+
+class _Totals:
+    """Per (portfolio, cohort year) running sums for the movement and development roll-ups."""
+
+    def __init__(self, first_year: int, n_years: int):
+        self.first_year = first_year
+        shape = (len(PORTFOLIOS), n_years)
+        self.gross = np.zeros(shape)
+        self.net_received = np.zeros(shape)
+        self.incurred = np.zeros(shape)
+        self.contracts = np.zeros(shape)
+        # cohort year x development year (paid claims; the last bucket takes later years)
+        self.development = np.zeros((n_years, _DEV_YEARS))
+
+    def cells(self, portfolio: np.ndarray, cohort: np.ndarray) -> np.ndarray:
+        return portfolio * self.gross.shape[1] + (cohort - self.first_year)
+
+    def add(self, target: np.ndarray, cells: np.ndarray, weights: np.ndarray) -> None:
+        target += np.bincount(cells, weights=weights, minlength=target.size).reshape(target.shape)
+
+
+def _chunk(
+    seed: int, chunk_no: int, lo: int, hi: int, first_claim: int, reporting: np.datetime64, totals: _Totals
+) -> tuple[dict[str, dict[str, Any]], int]:
+    """Columns of every contract-keyed dataset for contracts [lo, hi); returns (columns, claims generated)."""
+    rng = np.random.default_rng([seed, chunk_no])
+    n = hi - lo
+    reporting_year = int(str(reporting)[:4])
+    first_year = totals.first_year
+
+    portfolio = rng.choice(len(PORTFOLIOS), size=n, p=_WEIGHTS)
+    cohort = rng.integers(first_year, reporting_year + 1, size=n)
+    year_start = (cohort - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+    year_days = ((cohort + 1 - 1970).astype("datetime64[Y]").astype("datetime64[D]") - year_start).astype(np.int64)
+    inception = year_start + rng.integers(0, year_days)
+    # Keep inception on or before the reporting date
+    inception = np.minimum(inception, reporting)
+    life = portfolio == 2
+    term_days = np.where(life, 3652, 365)
+    coverage_end = inception + term_days - 1
+    product_pick = rng.integers(0, 2, size=n)
+    seq = np.arange(lo, hi)
+
+    ids = [f"{_PREFIX[p]}-{c}-{s:07d}" for p, c, s in zip(portfolio.tolist(), cohort.tolist(), seq.tolist())]
+    contracts = {
+        "contract_id": ids,
+        "portfolio": [PORTFOLIOS[p] for p in portfolio.tolist()],
+        "product": [_PRODUCTS[p][k] for p, k in zip(portfolio.tolist(), product_pick.tolist())],
+        "inception_date": _dates(inception),
+        "coverage_end_date": _dates(coverage_end),
+        "measurement_model": [_MODEL[p] for p in portfolio.tolist()],
+        "cohort_year": cohort.tolist(),
+        "currency": ["USD"] * n,
+    }
+
+    # One premium per contract: single up-front premium (PAA) or the reporting year's premium (GMM)
+    gross = _money(_PREMIUM[portfolio] * rng.lognormal(0.0, _PREMIUM_SIGMA[portfolio]))
+    ceded = _money(gross * _CEDED[portfolio])
+    net = _money(gross - ceded)
+    life_received = np.datetime64(f"{reporting_year}-01-01") + rng.integers(0, 28, size=n)
+    received = np.where(life, life_received, inception)
+    quarter = (inception.astype("datetime64[M]").astype(np.int64) % 12) // 3 + 1
+    periods = [
+        str(reporting_year) if is_life else f"{c}-Q{q}"
+        for is_life, c, q in zip(life.tolist(), cohort.tolist(), quarter.tolist())
+    ]
+    premiums = {
+        "contract_id": ids,
+        "period": periods,
+        "gross_premium": gross.tolist(),
+        "ceded_premium": ceded.tolist(),
+        "net_premium": net.tolist(),
+        "received_date": _dates(received),
+    }
+
+    commission = _money(gross * _COMMISSION[portfolio])
+    underwriting = _money(gross * _UNDERWRITING[portfolio])
+    acquisition_costs = {
+        "contract_id": ids,
+        "period": cohort.astype(str).tolist(),
+        "commission": commission.tolist(),
+        "underwriting_cost": underwriting.tolist(),
+        "total": _money(commission + underwriting).tolist(),
+    }
+
+    # Claims: Poisson count per contract, incurred within cover and before the reporting date
+    counts = rng.poisson(_CLAIM_FREQ[portfolio])
+    owner = np.repeat(np.arange(n), counts)
+    m = len(owner)
+    exposure_end = np.minimum(coverage_end[owner], reporting)
+    exposure = np.maximum((exposure_end - inception[owner]).astype(np.int64), 0)
+    incurred_date = inception[owner] + (rng.random(m) * (exposure + 1)).astype(np.int64)
+    incurred = _money(_CLAIM_SIZE[portfolio[owner]] * rng.lognormal(0.0, 0.8, size=m))
+    settle = incurred_date + rng.exponential(90.0, size=m).astype(np.int64)
+    settled = settle <= reporting
+    partly = rng.random(m) * 0.5
+    paid = np.where(settled, incurred, _money(incurred * partly))
+    outstanding = _money(incurred - paid)
+    claims = {
+        "contract_id": [ids[i] for i in owner.tolist()],
+        "claim_id": [f"CLM-{first_claim + i:09d}" for i in range(m)],
+        "incurred_date": _dates(incurred_date),
+        "paid_date": [d if s else None for d, s in zip(_dates(settle), settled.tolist())],
+        "incurred_amount": incurred.tolist(),
+        "paid_amount": paid.tolist(),
+        "outstanding_reserve": outstanding.tolist(),
+    }
+
+    # Reinsurance on every contract with a ceded share
+    ceded_rows = np.flatnonzero(ceded > 0)
+    paid_by_contract = np.bincount(owner, weights=paid, minlength=n)
+    outstanding_by_contract = np.bincount(owner, weights=outstanding, minlength=n)
+    reinsurance = {
+        "contract_id": [ids[i] for i in ceded_rows.tolist()],
+        "reinsurer": [_REINSURER[p] for p in portfolio[ceded_rows].tolist()],
+        "ceded_premium_ytd": ceded[ceded_rows].tolist(),
+        "recoveries_ytd": _money(paid_by_contract[ceded_rows] * _CEDED[portfolio[ceded_rows]]).tolist(),
+        "reinsurance_asset_balance": _money(
+            outstanding_by_contract[ceded_rows] * _CEDED[portfolio[ceded_rows]] + ceded[ceded_rows] * 0.25
+        ).tolist(),
+    }
+
+    cells = totals.cells(portfolio, cohort)
+    totals.add(totals.gross, cells, gross)
+    received_now = received.astype("datetime64[Y]").astype(np.int64) + 1970 == reporting_year
+    totals.add(totals.net_received, cells, np.where(received_now, net, 0.0))
+    totals.add(totals.contracts, cells, np.ones(n))
+    incurred_now = incurred_date.astype("datetime64[Y]").astype(np.int64) + 1970 == reporting_year
+    totals.add(totals.incurred, cells[owner], np.where(incurred_now, incurred, 0.0))
+    paid_year = np.where(settled, settle, incurred_date).astype("datetime64[Y]").astype(np.int64) + 1970
+    dev = np.clip(paid_year - cohort[owner], 0, _DEV_YEARS - 1)
+    dev_cells = (cohort[owner] - first_year) * _DEV_YEARS + dev
+    totals.add(totals.development, dev_cells, paid)
+
+    return {
+        "contracts": contracts,
+        "premiums": premiums,
+        "acquisition_costs": acquisition_costs,
+        "claims": claims,
+        "reinsurance": reinsurance,
+    }, m
+
+
+def _rollups(seed: int, reporting: np.datetime64, totals: _Totals) -> dict[str, dict[str, list]]:
+    """Assumptions, discount curve, liability/CSM movements and claims development (small tables)."""
+    rng = np.random.default_rng([seed, 1 << 30])
+    reporting_year = int(str(reporting)[:4])
+    reporting_str = str(reporting)
+    liability: dict[str, list] = {c: [] for c in COLUMNS["liability_movements"]}
+    csm: dict[str, list] = {c: [] for c in COLUMNS["csm_movements"]}
+    for p, portfolio in enumerate(PORTFOLIOS):
+        for j in range(totals.gross.shape[1]):
+            if not totals.contracts[p, j]:
+                continue
+            year = totals.first_year + j
+            premium = totals.gross[p, j]
+            new = year == reporting_year
+            # CSM: recognised in the cohort's first year, released by coverage over the years since
+            initial = premium * _CSM_MARGIN[p] * (1.0 - _CEDED[p])
+            released_before = min(1.0, _CSM_RELEASE[p] * (reporting_year - year))
+            opening_csm = 0.0 if new else initial * (1.0 - released_before)
+            recognised = initial if new else 0.0
+            changes = float(rng.normal(0.0, 0.02)) * initial
+            release = (opening_csm + recognised + changes) * min(1.0, _CSM_RELEASE[p] * (0.5 if new else 1.0))
+            csm_row = _roll_forward([opening_csm, recognised, changes, -release])
+            for c, v in zip(COLUMNS["csm_movements"], [portfolio, year, *csm_row]):
+                csm[c].append(v)
+
+            # Opening liability runs off with the cohort's age
+            age = reporting_year - year
+            opening = 0.0 if new else premium * _OPENING_LIABILITY[p] * _RUNOFF[p] ** (age - 1)
+            new_business = premium * 0.55 if new else 0.0
+            variance = float(rng.normal(0.0, 0.01)) * premium
+            liability_row = _roll_forward(
+                [opening, new_business, -totals.net_received[p, j], totals.incurred[p, j], -release, variance]
+            )
+            for c, v in zip(COLUMNS["liability_movements"], [portfolio, year, *liability_row]):
+                liability[c].append(v)
+
+    development: dict[str, list] = {c: [] for c in COLUMNS["claims_development"]}
+    for j in range(totals.development.shape[0]):
+        year = totals.first_year + j
+        observed = [
+            round(float(v), 2) + 0.0 if year + k <= reporting_year else None
+            for k, v in enumerate(totals.development[j])
+        ]
+        development["cohort_year"].append(year)
+        for k, v in enumerate(observed, start=1):
+            development[f"development_year_{k}"].append(v)
+        development["incremental_claims"].append(round(sum(v for v in observed if v is not None), 2) + 0.0)
+
+    return {
+        "assumptions": {
+            "portfolio": [a[0] for a in _ASSUMPTIONS],
+            "assumption_type": [a[1] for a in _ASSUMPTIONS],
+            "value_pct": [a[2] for a in _ASSUMPTIONS],
+            "effective_date": [f"{reporting_year}-01-01"] * len(_ASSUMPTIONS),
+            "description": [a[3] for a in _ASSUMPTIONS],
+        },
+        "discount_rates": {
+            "term_years": [t for t, _ in _DISCOUNT_CURVE],
+            "rate_pct": [r for _, r in _DISCOUNT_CURVE],
+            "as_at_date": [reporting_str] * len(_DISCOUNT_CURVE),
+        },
+        "liability_movements": liability,
+        "csm_movements": csm,
+        "claims_development": development,
+    }
+
+
+def _json_value(v: Any) -> str:
+    if v is None:
+        return "null"
+    if isinstance(v, str):
+        return json.dumps(v)
+    return repr(v)
+
+
+def _csv_value(v: Any) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, str) and any(ch in v for ch in ',"\n'):
+        return '"' + v.replace('"', '""') + '"'
+    return str(v)
+
+
+class _DatasetWriter:
+    """Appends row chunks of one dataset to a JSON array body and/or a CSV file."""
+
+    def __init__(self, name: str, json_part: Path | None, csv_file: Path | None):
+        self.columns = COLUMNS[name]
+        self.rows = 0
+        self._json = json_part.open("w", encoding="utf-8") if json_part else None
+        self._csv = csv_file.open("w", encoding="utf-8", newline="") if csv_file else None
+        if self._csv:
+            self._csv.write(",".join(self.columns) + "\n")
+        keys = [json.dumps(c) for c in self.columns]
+        self._template = "{{" + ", ".join(f"{k}: {{}}" for k in keys) + "}}"
+
+    def write(self, columns: dict[str, list]) -> None:
+        cols = [columns[c] for c in self.columns]
+        if not cols or not cols[0]:
+            return
+        if self._json:
+            template = self._template
+            lines = (template.format(*map(_json_value, row)) for row in zip(*cols))
+            self._json.write(("" if self.rows == 0 else ",\n") + ",\n".join(lines))
+        if self._csv:
+            self._csv.write("".join(",".join(map(_csv_value, row)) + "\n" for row in zip(*cols)))
+        self.rows += len(cols[0])
+
+    def close(self) -> None:
+        for f in (self._json, self._csv):
+            if f:
+                f.close()
+
+
+def generate(
+    contracts: int,
+    seed: int = 0,
+    json_path: Path | None = None,
+    csv_dir: Path | None = None,
+    reporting_date: str = "2024-12-31",
+    years: int = 5,
+) -> dict[str, int]:
+    """
+    Generate `contracts` contracts (and everything that hangs off them) as one JSON
+    file and/or one CSV per dataset. Returns row counts per dataset.
+    """
+    if json_path is None and csv_dir is None:
+        raise ValueError("Give a JSON path and/or a CSV directory")
+    reporting = np.datetime64(reporting_date, "D")
+    reporting_year = int(reporting_date[:4])
+    totals = _Totals(reporting_year - years + 1, years)
+    if csv_dir is not None:
+        csv_dir.mkdir(parents=True, exist_ok=True)
+    work = tempfile.TemporaryDirectory(dir=json_path.parent if json_path else None) if json_path else None
+    try:
+        writers = {
+            name: _DatasetWriter(
+                name,
+                Path(work.name) / f"{name}.part" if work else None,
+                csv_path(csv_dir, name) if csv_dir is not None else None,
+            )
+            for name in DATASETS
+        }
+        claims_so_far = 0
+        for chunk_no, lo in enumerate(range(0, contracts, CHUNK_CONTRACTS)):
+            hi = min(lo + CHUNK_CONTRACTS, contracts)
+            columns, n_claims = _chunk(seed, chunk_no, lo, hi, claims_so_far + 1, reporting, totals)
+            claims_so_far += n_claims
+            for name, cols in columns.items():
+                writers[name].write(cols)
+        for name, cols in _rollups(seed, reporting, totals).items():
+            writers[name].write(cols)
+        for w in writers.values():
+            w.close()
+        if json_path is not None:
+            metadata = {
+                "description": f"Synthetic IFRS 17 data: {contracts} contracts, seed {seed}",
+                "reporting_date": reporting_date,
+                "currency": "USD",
+                "portfolios": list(PORTFOLIOS),
+            }
+            _assemble_json(json_path, metadata, [(name, Path(work.name) / f"{name}.part") for name in DATASETS])
+        return {name: w.rows for name, w in writers.items()}
+    finally:
+        if work is not None:
+            work.cleanup()
+
+
+def _assemble_json(path: Path, metadata: dict[str, Any], parts: list[tuple[str, Path]]) -> None:
+    """Write {"metadata": ..., "<dataset>": [...], ...} by streaming each dataset's part file."""
+    with path.open("w", encoding="utf-8") as out:
+        out.write('{\n"metadata": ' + json.dumps(metadata))
+        for name, part in parts:
+            out.write(f',\n{json.dumps(name)}: [\n')
+            with part.open("r", encoding="utf-8") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+            out.write("\n]")
+        out.write("\n}\n")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic, referentially consistent IFRS 17 dataset.")
+    parser.add_argument("--contracts", type=int, default=10_000, help="Number of contracts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Write one JSON file (same shape as ifrs17_sample_data.json)")
+    parser.add_argument("--csv-dir", type=Path, help="Write IFRS17_sample_data_<dataset>.csv files here")
+    parser.add_argument("--reporting-date", default="2024-12-31")
+    parser.add_argument("--years", type=int, default=5, help="Cohort years up to the reporting year")
+    args = parser.parse_args(argv)
+    if args.json is None and args.csv_dir is None:
+        parser.error("give --json and/or --csv-dir")
+
+    start = time.perf_counter()
+    counts = generate(args.contracts, args.seed, args.json, args.csv_dir, args.reporting_date, args.years)
+    elapsed = time.perf_counter() - start
+    for name, n in counts.items():
+        print(f"{name}: {n} rows")
+    print(f"Generated {sum(counts.values())} rows in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()